@@ -0,0 +1,207 @@
+"""Compares the RequestsTransport (HTTP/1.1) with the HTTP2Transport.
+
+Starts a local TLS server speaking HTTP/2 and HTTP/1.1, which answers
+`GET /instances` after a simulated API latency, then sends the same
+concurrent `instances.get()` calls through both transports.
+
+Requires the http2 extra and the openssl command:
+
+    pip install lambdalabs-python[http2]
+    python benchmarks/http2_transport.py --requests 2000 --concurrency 64
+"""
+import argparse
+import json
+import os
+import socket
+import socketserver
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import h2.config
+import h2.connection
+import h2.events
+import requests
+from requests.adapters import HTTPAdapter
+
+from lambdalabs import LambdaLabsClient
+from lambdalabs.http_client.transport import HTTP2Transport, RequestsTransport
+
+
+def _instance(index: int) -> dict:
+    return {'id': f'{index:032x}', 'name': f'worker-{index}', 'ip': f'10.0.{index // 256}.{index % 256}',
+            'status': 'active', 'hostname': f'10-0-0-{index}.cloud.lambdalabs.com',
+            'region': {'name': 'us-tx-1', 'description': 'Austin, Texas'},
+            'instance_type': {'name': 'gpu_1x_a100', 'price_cents_per_hour': 110, 'description': '1x A100 (40 GB)',
+                              'specs': {'vcpus': 30, 'memory_gib': 200, 'storage_gib': 512}},
+            'ssh_key_names': ['key'], 'file_system_names': [], 'jupyter_token': None, 'jupyter_url': None}
+
+
+class BenchmarkServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """Answers every request after `latency` seconds, over HTTP/2 or HTTP/1.1 as negotiated with ALPN"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, certificate: str, key: str, latency: float, instances: int) -> None:
+        super().__init__(('127.0.0.1', 0), None)
+        self.latency = latency
+        self.body = json.dumps({'data': [_instance(index) for index in range(instances)]}).encode('utf-8')
+        self.connections = {'h2': 0, 'http/1.1': 0}
+        self._lock = threading.Lock()
+        self._context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self._context.load_cert_chain(certificate, key)
+        self._context.set_alpn_protocols(['h2', 'http/1.1'])
+
+    def finish_request(self, request: socket.socket, client_address) -> None:
+        try:
+            connection = self._context.wrap_socket(request, server_side=True)
+        except (ssl.SSLError, OSError):
+            return
+        protocol = connection.selected_alpn_protocol() or 'http/1.1'
+        with self._lock:
+            self.connections[protocol] += 1
+        try:
+            if protocol == 'h2':
+                self._serve_h2(connection)
+            else:
+                self._serve_http1(connection)
+        except (ssl.SSLError, OSError):
+            pass
+        finally:
+            connection.close()
+
+    def _serve_http1(self, connection: ssl.SSLSocket) -> None:
+        stream = connection.makefile('rb')
+        while True:
+            request_line = stream.readline()
+            if not request_line:
+                return
+            while stream.readline() not in (b'\r\n', b'\n', b''):
+                pass
+            time.sleep(self.latency)
+            connection.sendall(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                               b'Content-Length: ' + str(len(self.body)).encode() + b'\r\n\r\n' + self.body)
+
+    def _serve_h2(self, connection: ssl.SSLSocket) -> None:
+        _H2Connection(connection, self.body, self.latency).serve()
+
+
+class _H2Connection:
+    """One HTTP/2 connection, answering its streams concurrently"""
+
+    def __init__(self, connection: ssl.SSLSocket, body: bytes, latency: float) -> None:
+        self._connection = connection
+        self._body = body
+        self._latency = latency
+        self._h2 = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False))
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def serve(self) -> None:
+        with self._lock:
+            self._h2.initiate_connection()
+            self._connection.sendall(self._h2.data_to_send())
+        while True:
+            data = self._connection.recv(65536)
+            if not data:
+                return
+            with self._lock:
+                for event in self._h2.receive_data(data):
+                    if isinstance(event, h2.events.RequestReceived):
+                        threading.Thread(target=self._respond, args=(event.stream_id,), daemon=True).start()
+                    elif isinstance(event, h2.events.WindowUpdated):
+                        self._flush()
+                self._connection.sendall(self._h2.data_to_send())
+
+    def _respond(self, stream_id: int) -> None:
+        time.sleep(self._latency)
+        with self._lock:
+            self._h2.send_headers(stream_id, [(':status', '200'), ('content-type', 'application/json'),
+                                              ('content-length', str(len(self._body)))])
+            self._pending[stream_id] = self._body
+            self._flush()
+            self._connection.sendall(self._h2.data_to_send())
+
+    def _flush(self) -> None:
+        """Send the pending bodies as far as the flow-control windows allow"""
+        for stream_id, body in list(self._pending.items()):
+            while body:
+                size = min(self._h2.local_flow_control_window(stream_id), self._h2.max_outbound_frame_size, len(body))
+                if size <= 0:
+                    break
+                self._h2.send_data(stream_id, body[:size])
+                body = body[size:]
+            if body:
+                self._pending[stream_id] = body
+            else:
+                self._h2.end_stream(stream_id)
+                del self._pending[stream_id]
+
+
+def _self_signed_certificate(directory: str) -> tuple:
+    certificate = os.path.join(directory, 'certificate.pem')
+    key = os.path.join(directory, 'key.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=localhost',
+                    '-addext', 'subjectAltName=DNS:localhost,IP:127.0.0.1', '-keyout', key, '-out', certificate],
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return certificate, key
+
+
+def _run(name: str, client: LambdaLabsClient, server: BenchmarkServer, requests_count: int, concurrency: int) -> None:
+    before = dict(server.connections)
+    latencies = []
+
+    def call(_) -> None:
+        start = time.monotonic()
+        client.instances.get()
+        latencies.append(time.monotonic() - start)
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(call, range(requests_count)))
+    elapsed = time.monotonic() - start
+    client.close()
+
+    latencies.sort()
+    connections = sum(server.connections.values()) - sum(before.values())
+    print(f'{name:<10} {requests_count / elapsed:8.0f} req/s   '
+          f'p50 {latencies[len(latencies) // 2] * 1000:7.1f} ms   '
+          f'p99 {latencies[int(len(latencies) * 0.99)] * 1000:7.1f} ms   '
+          f'{connections:4d} connections')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=1000, help='number of instances.get() calls')
+    parser.add_argument('--concurrency', type=int, default=32, help='concurrent calls')
+    parser.add_argument('--latency', type=float, default=0.02, help='simulated API latency in seconds')
+    parser.add_argument('--instances', type=int, default=20, help='instances in every response')
+    parser.add_argument('--max-connections', type=int, default=4, help='connections of the HTTP/2 transport')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        certificate, key = _self_signed_certificate(directory)
+        # both requests and httpx trust the certificate through these variables
+        os.environ['REQUESTS_CA_BUNDLE'] = certificate
+        os.environ['SSL_CERT_FILE'] = certificate
+
+        server = BenchmarkServer(certificate, key, args.latency, args.instances)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f'https://localhost:{server.server_address[1]}/api/v1'
+
+        session = requests.Session()
+        session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=args.concurrency))
+        _run('HTTP/1.1', LambdaLabsClient('benchmark', base_url=base_url, transport=RequestsTransport(session)),
+             server, args.requests, args.concurrency)
+        _run('HTTP/2', LambdaLabsClient('benchmark', base_url=base_url,
+                                        transport=HTTP2Transport(max_connections=args.max_connections)),
+             server, args.requests, args.concurrency)
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
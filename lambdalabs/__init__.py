@@ -1 +1,11 @@
-from lambdalabs.lambdalabs import LambdaLabsClient
+import sys
+
+if sys.version_info >= (3, 7):
+    # imported on first use, so that e.g. the CLI can import lambdalabs.exceptions without requests
+    def __getattr__(name: str):
+        if name == 'LambdaLabsClient':
+            from lambdalabs.lambdalabs import LambdaLabsClient as client_class
+            return client_class
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+else:
+    from lambdalabs.lambdalabs import LambdaLabsClient  # noqa: F401
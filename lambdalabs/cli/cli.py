@@ -0,0 +1,222 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+from lambdalabs.exceptions import APIException
+from lambdalabs.cli import daemon_client
+
+
+# columns of the table output, the JSON output contains every field
+TABLE_COLUMNS = {
+    'instances.ls': ['id', 'name', 'status', 'ip', 'region', 'instance_type'],
+    'instances.get': ['id', 'name', 'status', 'ip', 'region', 'instance_type', 'hostname', 'jupyter_url'],
+    'instance-types.ls': ['name', 'price_cents_per_hour', 'vcpus', 'memory_gib', 'storage_gib',
+                          'regions_with_capacity_available'],
+    'ssh-keys.ls': ['id', 'name', 'public_key'],
+    'ssh-keys.add': ['id', 'name', 'public_key', 'private_key'],
+    'file-systems.ls': ['id', 'name', 'region', 'mount_point', 'is_in_use', 'bytes_used'],
+}
+
+
+def _actions(parser: argparse.ArgumentParser) -> argparse._SubParsersAction:
+    # add_subparsers(required=True) needs Python 3.7
+    actions = parser.add_subparsers(dest='action')
+    actions.required = True
+    return actions
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='lambdalabs', description='Lambda Labs command-line interface')
+    parser.add_argument('--output', '-o', choices=['table', 'json'], default='table', help='output format')
+    parser.add_argument('--base-url', default=os.environ.get('LAMBDALABS_BASE_URL', daemon_client.DEFAULT_BASE_URL))
+    parser.add_argument('--socket', default=daemon_client.default_socket_path(), help='path of the daemon socket')
+    parser.add_argument('--no-daemon', action='store_true', help='call the API directly even if a daemon runs')
+    resources = parser.add_subparsers(dest='resource')
+    resources.required = True
+
+    instances = _actions(resources.add_parser('instances', help='manage instances'))
+    instances.add_parser('ls', help='list instances')
+    get = instances.add_parser('get', help='show an instance')
+    get.add_argument('id')
+    launch = instances.add_parser('launch', help='launch instances')
+    launch.add_argument('--region', required=True)
+    launch.add_argument('--instance-type', required=True)
+    launch.add_argument('--ssh-key', dest='ssh_keys', action='append', required=True)
+    launch.add_argument('--file-system', dest='file_systems', action='append')
+    launch.add_argument('--quantity', type=int, default=1)
+    launch.add_argument('--name')
+    for action in ('terminate', 'restart'):
+        parser_action = instances.add_parser(action, help=f'{action} instances')
+        parser_action.add_argument('ids', nargs='+')
+
+    instance_types = _actions(resources.add_parser('instance-types', help='list instance types'))
+    ls = instance_types.add_parser('ls', help='list instance types')
+    ls.add_argument('--available', action='store_true', help='only types with capacity')
+
+    ssh_keys = _actions(resources.add_parser('ssh-keys', help='manage ssh-keys'))
+    ssh_keys.add_parser('ls', help='list ssh-keys')
+    add = ssh_keys.add_parser('add', help='add an ssh-key, generates a key pair without --public-key-file')
+    add.add_argument('name')
+    add.add_argument('--public-key-file')
+    delete = ssh_keys.add_parser('delete', help='delete an ssh-key')
+    delete.add_argument('id')
+
+    file_systems = _actions(resources.add_parser('file-systems', help='list file systems'))
+    file_systems.add_parser('ls', help='list file systems')
+
+    daemon_actions = _actions(resources.add_parser('daemon', help='manage the background daemon'))
+    start = daemon_actions.add_parser('start', help='start the daemon')
+    start.add_argument('--foreground', action='store_true')
+    daemon_actions.add_parser('stop', help='stop the daemon')
+    daemon_actions.add_parser('status', help='show whether the daemon runs')
+    return parser
+
+
+def _command_args(args: argparse.Namespace) -> Dict[str, Any]:
+    command_args = {key: value for key, value in vars(args).items()
+                    if key not in ('output', 'base_url', 'socket', 'no_daemon', 'resource', 'action', 'foreground',
+                                   'public_key_file')}
+    if getattr(args, 'public_key_file', None):
+        with open(os.path.expanduser(args.public_key_file)) as public_key_file:
+            command_args['public_key'] = public_key_file.read().strip()
+    return command_args
+
+
+def _cell(value: Any) -> str:
+    if isinstance(value, dict):
+        value = value.get('name', value)
+    if isinstance(value, list):
+        return ','.join(_cell(item) for item in value)
+    return '' if value is None else str(value)
+
+
+def _print_table(rows: List[Dict[str, Any]], columns: List[str]) -> None:
+    cells = [[_cell(row.get(column)) for column in columns] for row in rows]
+    widths = [max([len(column)] + [len(row[index]) for row in cells]) for index, column in enumerate(columns)]
+    print('  '.join(column.upper().ljust(width) for column, width in zip(columns, widths)).rstrip())
+    for row in cells:
+        print('  '.join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip())
+
+
+def _print(command: str, data: Any, output: str) -> None:
+    if output == 'json':
+        print(json.dumps(data, indent=2))
+    elif isinstance(data, dict):
+        _print_table([data], TABLE_COLUMNS.get(command, list(data)))
+    elif isinstance(data, list) and data and isinstance(data[0], dict):
+        _print_table(data, TABLE_COLUMNS.get(command, list(data[0])))
+    elif isinstance(data, list):
+        for item in data:
+            print(item)
+    elif data is not None:
+        print(data)
+
+
+def _run(command: str, command_args: Dict[str, Any], args: argparse.Namespace, api_key: str) -> Any:
+    """Run a command on the daemon if one serves this account, locally otherwise
+
+    The SDK, and requests with it, is only imported to run the command locally.
+    """
+    if not args.no_daemon and os.path.exists(args.socket):
+        try:
+            reply = daemon_client.request(args.socket, {'command': command,
+                                                        'args': command_args,
+                                                        'key': daemon_client.key_digest(api_key, args.base_url)})
+        except daemon_client.DaemonNotRunningError:
+            # nothing was sent, running the command locally can't run it twice
+            reply = None
+        except OSError as e:
+            raise APIException('daemon/no-reply', f'the daemon did not answer, the command may have run: {e}')
+        if reply is not None and (reply['ok'] or reply['error']['code'] != 'daemon/wrong-account'):
+            if not reply['ok']:
+                raise APIException(reply['error']['code'], reply['error']['message'])
+            return reply['data']
+
+    from lambdalabs.lambdalabs import LambdaLabsClient
+    from lambdalabs.cli.commands import run_command
+    return run_command(LambdaLabsClient(api_key, base_url=args.base_url), command, command_args)
+
+
+def _daemon_command(args: argparse.Namespace, api_key: str) -> int:
+    ping = {'command': 'daemon.ping'}
+    if args.action == 'status':
+        try:
+            print(f"daemon running, pid {daemon_client.request(args.socket, ping, timeout=5)['data']['pid']}")
+            return 0
+        except OSError:
+            print('daemon not running')
+            return 1
+
+    if args.action == 'stop':
+        try:
+            reply = daemon_client.request(args.socket, {'command': 'daemon.stop',
+                                                        'key': daemon_client.key_digest(api_key, args.base_url)},
+                                          timeout=5)
+        except OSError:
+            print('daemon not running')
+            return 1
+        if not reply['ok']:
+            print(reply['error']['message'], file=sys.stderr)
+            return 1
+        return 0
+
+    try:
+        reply = daemon_client.request(args.socket, ping, timeout=5)
+        print(f"daemon already running, pid {reply['data']['pid']}", file=sys.stderr)
+        return 1
+    except OSError:
+        pass
+    if args.foreground:
+        from lambdalabs.cli.daemon import Daemon
+        try:
+            Daemon(api_key, base_url=args.base_url, socket_path=args.socket).serve_forever()
+        except RuntimeError as e:
+            print(e, file=sys.stderr)
+            return 1
+        return 0
+    subprocess.Popen([sys.executable, '-m', 'lambdalabs.cli.daemon', '--base-url', args.base_url, '--socket', args.socket],
+                     env=dict(os.environ, LAMBDALABS_API_KEY=api_key), start_new_session=True,
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            daemon_client.request(args.socket, ping, timeout=1)
+            return 0
+        except OSError:
+            time.sleep(0.1)
+    print('daemon did not start', file=sys.stderr)
+    return 1
+
+
+def main(argv: List[str] = None) -> int:
+    """Entry point of the `lambdalabs` command
+
+    :param argv: command-line arguments, defaults to None (sys.argv)
+    :type argv: List[str], optional
+    :return: exit code
+    :rtype: int
+    """
+    args = _build_parser().parse_args(argv)
+    api_key = os.environ.get('LAMBDALABS_API_KEY')
+    if api_key is None:
+        print('the LAMBDALABS_API_KEY environment variable is not set', file=sys.stderr)
+        return 2
+
+    if args.resource == 'daemon':
+        return _daemon_command(args, api_key)
+
+    command = f'{args.resource}.{args.action}'
+    try:
+        data = _run(command, _command_args(args), args, api_key)
+    except APIException as e:
+        print(e, file=sys.stderr)
+        return 1
+    _print(command, data, args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
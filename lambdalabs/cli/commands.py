@@ -0,0 +1,131 @@
+from typing import Any, Callable, Dict
+
+from lambdalabs.lambdalabs import LambdaLabsClient
+
+
+def to_dict(obj: Any) -> Any:
+    """Convert model objects to JSON serializable values, using their properties
+
+    :param obj: a model object, a list of them, or a plain value
+    :type obj: Any
+    :return: JSON serializable value
+    :rtype: Any
+    """
+    if isinstance(obj, (list, tuple)):
+        return [to_dict(item) for item in obj]
+    if isinstance(obj, dict):
+        return {key: to_dict(value) for key, value in obj.items()}
+    if obj is None or isinstance(obj, (str, int, float, bool)):
+        return obj
+    properties = [name for klass in reversed(type(obj).__mro__)
+                  for name, value in vars(klass).items() if isinstance(value, property)]
+    return {name: to_dict(getattr(obj, name)) for name in dict.fromkeys(properties)}
+
+
+def _read(client: LambdaLabsClient, resource: str, fetch: Callable[[], Any]) -> Any:
+    """Read a resource from the client's refresher if it runs, from the API otherwise"""
+    if client.refresher is not None:
+        return client.refresher.get(resource)
+    return fetch()
+
+
+def _invalidate(client: LambdaLabsClient, resource: str) -> None:
+    """Refetch a resource after it was changed, so the next read sees the change.
+
+    Best effort: the change already happened, a failed refetch must not turn
+    it into an error, the refresher retries on its next tick.
+    """
+    if client.refresher is not None:
+        try:
+            client.refresher.get(resource, max_age=0)
+        except Exception:
+            pass
+
+
+def _instances_ls(client: LambdaLabsClient, args: Dict[str, Any]) -> Any:
+    return _read(client, 'instances', client.instances.get)
+
+
+def _instances_get(client: LambdaLabsClient, args: Dict[str, Any]) -> Any:
+    return client.instances.get_by_id(args['id'])
+
+
+def _instances_launch(client: LambdaLabsClient, args: Dict[str, Any]) -> Any:
+    instance_ids = client.instances.launch(region_name=args['region'],
+                                           instance_type_name=args['instance_type'],
+                                           ssh_key_names=args['ssh_keys'],
+                                           file_system_names=args.get('file_systems') or [],
+                                           quantity=args.get('quantity', 1),
+                                           name=args.get('name') or '')
+    _invalidate(client, 'instances')
+    return instance_ids
+
+
+def _instances_terminate(client: LambdaLabsClient, args: Dict[str, Any]) -> Any:
+    terminated = client.instances.terminate(args['ids'])
+    _invalidate(client, 'instances')
+    return terminated
+
+
+def _instances_restart(client: LambdaLabsClient, args: Dict[str, Any]) -> Any:
+    restarted = client.instances.restart(args['ids'])
+    _invalidate(client, 'instances')
+    return restarted
+
+
+def _instance_types_ls(client: LambdaLabsClient, args: Dict[str, Any]) -> Any:
+    instance_types = _read(client, 'instance_types', client.instance_types.get)
+    if args.get('available'):
+        instance_types = [instance_type for instance_type in instance_types
+                          if instance_type.regions_with_capacity_available]
+    return instance_types
+
+
+def _ssh_keys_ls(client: LambdaLabsClient, args: Dict[str, Any]) -> Any:
+    return _read(client, 'ssh_keys', client.ssh_keys.get)
+
+
+def _ssh_keys_add(client: LambdaLabsClient, args: Dict[str, Any]) -> Any:
+    ssh_key = client.ssh_keys.add(args['name'], args.get('public_key'))
+    _invalidate(client, 'ssh_keys')
+    return ssh_key
+
+
+def _ssh_keys_delete(client: LambdaLabsClient, args: Dict[str, Any]) -> Any:
+    client.ssh_keys.delete(args['id'])
+    _invalidate(client, 'ssh_keys')
+    return None
+
+
+def _file_systems_ls(client: LambdaLabsClient, args: Dict[str, Any]) -> Any:
+    return _read(client, 'file_systems', client.file_systems.get)
+
+
+COMMANDS: Dict[str, Callable[[LambdaLabsClient, Dict[str, Any]], Any]] = {
+    'instances.ls': _instances_ls,
+    'instances.get': _instances_get,
+    'instances.launch': _instances_launch,
+    'instances.terminate': _instances_terminate,
+    'instances.restart': _instances_restart,
+    'instance-types.ls': _instance_types_ls,
+    'ssh-keys.ls': _ssh_keys_ls,
+    'ssh-keys.add': _ssh_keys_add,
+    'ssh-keys.delete': _ssh_keys_delete,
+    'file-systems.ls': _file_systems_ls,
+}
+
+
+def run_command(client: LambdaLabsClient, command: str, args: Dict[str, Any]) -> Any:
+    """Run a CLI command with a client
+
+    :param client: the client to run the command with
+    :type client: LambdaLabsClient
+    :param command: command name, e.g. 'instances.ls'
+    :type command: str
+    :param args: command arguments
+    :type args: Dict[str, Any]
+    :raises APIException: an api exception with message and error type code
+    :return: the JSON serializable command result
+    :rtype: Any
+    """
+    return to_dict(COMMANDS[command](client, args))
@@ -0,0 +1,131 @@
+import argparse
+import json
+import os
+import socketserver
+import sys
+import threading
+from typing import Any, Dict
+
+import requests
+
+from lambdalabs.lambdalabs import LambdaLabsClient
+from lambdalabs.exceptions import APIException
+from lambdalabs.instances.instance_cache import InstanceCache
+from lambdalabs.cli.commands import run_command
+from lambdalabs.cli.daemon_client import DEFAULT_BASE_URL, default_socket_path, key_digest, request
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Handles one request per connection"""
+
+    def handle(self) -> None:
+        line = self.rfile.readline()
+        if not line:
+            return
+        reply = self.server.daemon.handle(json.loads(line))
+        self.wfile.write(json.dumps(reply).encode('utf-8') + b'\n')
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class Daemon:
+    """Serves CLI commands from a warm client over a Unix socket.
+
+    The daemon keeps one client with a connection pool, an instance cache
+    and a background refresher, so commands sent by the CLI are answered
+    without interpreter start-up, imports or TLS handshakes.
+    """
+
+    def __init__(self, api_key: str, base_url: str = DEFAULT_BASE_URL, socket_path: str = None) -> None:
+        """Initialize the daemon
+
+        :param api_key: API key
+        :type api_key: str
+        :param base_url: base url for all the endpoints, optional, defaults to "https://cloud.lambdalabs.com/api/v1"
+        :type base_url: str, optional
+        :param socket_path: path of the socket, defaults to None (`default_socket_path()`)
+        :type socket_path: str, optional
+        """
+        self._digest = key_digest(api_key, base_url)
+        self._socket_path = socket_path or default_socket_path()
+        self._session = requests.Session()
+        self._client = LambdaLabsClient(api_key,
+                                        base_url=base_url,
+                                        session=self._session,
+                                        instance_cache=InstanceCache())
+        self._server: _Server = None
+
+    def handle(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Handle a request
+
+        :param message: the request, with 'command', 'args' and the 'key' digest
+        :type message: Dict[str, Any]
+        :return: the reply, with 'ok' and either 'data' or 'error'
+        :rtype: Dict[str, Any]
+        """
+        command = message.get('command')
+        if command == 'daemon.ping':
+            return {'ok': True, 'data': {'pid': os.getpid(), 'socket': self._socket_path}}
+        if message.get('key') != self._digest:
+            return {'ok': False, 'error': {'code': 'daemon/wrong-account',
+                                           'message': 'the daemon serves a different API key'}}
+        if command == 'daemon.stop':
+            threading.Thread(target=self._server.shutdown, daemon=True).start()
+            return {'ok': True, 'data': None}
+
+        try:
+            return {'ok': True, 'data': run_command(self._client, command, message.get('args') or {})}
+        except APIException as e:
+            return {'ok': False, 'error': {'code': e.code, 'message': e.message}}
+        except Exception as e:
+            return {'ok': False, 'error': {'code': 'daemon/error', 'message': f'{type(e).__name__}: {e}'}}
+
+    def serve_forever(self) -> None:
+        """Listen on the socket until the daemon is stopped
+
+        :raises RuntimeError: if another daemon already listens on the socket
+        """
+        os.makedirs(os.path.dirname(self._socket_path), exist_ok=True)
+        if os.path.exists(self._socket_path):
+            try:
+                request(self._socket_path, {'command': 'daemon.ping'}, timeout=5)
+            except OSError:
+                # left behind by a daemon that didn't exit cleanly
+                os.unlink(self._socket_path)
+            else:
+                raise RuntimeError(f'a daemon already listens on {self._socket_path}')
+
+        self._client.start_refresher(instances=10.0, instance_types=60.0, ssh_keys=60.0, file_systems=60.0)
+        previous_umask = os.umask(0o177)
+        try:
+            self._server = _Server(self._socket_path, _Handler)
+        finally:
+            os.umask(previous_umask)
+        self._server.daemon = self
+
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            if os.path.exists(self._socket_path):
+                os.unlink(self._socket_path)
+            self._client.close()
+            self._session.close()
+
+
+def main() -> None:
+    """Run the daemon in the foreground, reading the API key from LAMBDALABS_API_KEY"""
+    parser = argparse.ArgumentParser(description='Lambda Labs CLI daemon')
+    parser.add_argument('--base-url', default=os.environ.get('LAMBDALABS_BASE_URL', DEFAULT_BASE_URL))
+    parser.add_argument('--socket', default=default_socket_path())
+    args = parser.parse_args()
+    try:
+        Daemon(os.environ['LAMBDALABS_API_KEY'], base_url=args.base_url, socket_path=args.socket).serve_forever()
+    except RuntimeError as e:
+        sys.exit(str(e))
+
+
+if __name__ == '__main__':
+    main()
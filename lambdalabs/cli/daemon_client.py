@@ -0,0 +1,65 @@
+import hashlib
+import json
+import os
+import socket
+from typing import Any, Dict
+
+
+# the CLI imports this module on every run, it must only import the standard library
+
+DEFAULT_BASE_URL = "https://cloud.lambdalabs.com/api/v1"
+
+
+def default_socket_path() -> str:
+    """Get the default path of the daemon socket
+
+    :return: socket path in $XDG_RUNTIME_DIR, or in ~/.lambdalabs
+    :rtype: str
+    """
+    directory = os.environ.get('XDG_RUNTIME_DIR') or os.path.join(os.path.expanduser('~'), '.lambdalabs')
+    return os.path.join(directory, 'lambdalabs-daemon.sock')
+
+
+def key_digest(api_key: str, base_url: str) -> str:
+    """Identify an account without sending its API key over the socket
+
+    :param api_key: API key
+    :type api_key: str
+    :param base_url: base url for all the endpoints
+    :type base_url: str
+    :return: hex digest
+    :rtype: str
+    """
+    return hashlib.sha256(f'{base_url}\n{api_key}'.encode('utf-8')).hexdigest()
+
+
+class DaemonNotRunningError(OSError):
+    """Raised when no daemon accepts connections on the socket, nothing was sent"""
+
+
+def request(socket_path: str, message: Dict[str, Any], timeout: float = 300.0) -> Dict[str, Any]:
+    """Send a request to the daemon and wait for its reply
+
+    :param socket_path: path of the daemon socket
+    :type socket_path: str
+    :param message: the request
+    :type message: Dict[str, Any]
+    :param timeout: seconds to wait for the reply, defaults to 300.0
+    :type timeout: float, optional
+    :raises DaemonNotRunningError: if the daemon is not reachable, the request was not sent
+    :raises OSError: if the connection fails after the request may have been sent
+    :return: the reply
+    :rtype: Dict[str, Any]
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.settimeout(timeout)
+        try:
+            connection.connect(socket_path)
+        except OSError as e:
+            raise DaemonNotRunningError(f'no daemon listens on {socket_path}: {e}') from e
+        connection.sendall(json.dumps(message).encode('utf-8') + b'\n')
+        with connection.makefile('rb') as reply:
+            line = reply.readline()
+    if not line:
+        raise ConnectionError('the daemon closed the connection')
+    return json.loads(line)
@@ -0,0 +1,185 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from lambdalabs.lambdalabs import LambdaLabsClient
+from lambdalabs.http_client.circuit_breaker import CircuitBreaker
+from lambdalabs.http_client.rate_limiter import RateLimiter
+
+
+class AccountItem:
+    """An item returned by a fan-out query, tagged with the account it belongs to"""
+
+    def __init__(self, account: str, item: Any) -> None:
+        """Initialize the account item object
+
+        :param account: account name
+        :type account: str
+        :param item: the model object, e.g. an Instance
+        :type item: Any
+        """
+        self._account = account
+        self._item = item
+
+    @property
+    def account(self) -> str:
+        """Get the account name
+
+        :return: account name
+        :rtype: str
+        """
+        return self._account
+
+    @property
+    def item(self) -> Any:
+        """Get the model object
+
+        :return: model object
+        :rtype: Any
+        """
+        return self._item
+
+    def __str__(self) -> str:
+        """Print the account item
+
+        :return: account item string representation
+        :rtype: str
+        """
+        return (f'account: {self._account}\n'
+                f'{self._item}'
+                )
+
+
+class ClientPool:
+    """A pool of clients for several accounts sharing one transport.
+
+    All clients send their requests through the same connection pool and the
+    same rate limiter, and queries are fanned out to all accounts concurrently.
+    """
+
+    def __init__(self,
+                 api_keys: Dict[str, str],
+                 base_url: str = "https://cloud.lambdalabs.com/api/v1",
+                 max_workers: int = 8,
+                 rate_limiter: RateLimiter = None,
+                 circuit_breaker: CircuitBreaker = None,
+                 cache_responses: bool = False
+                 ) -> None:
+        """Initialize the client pool
+
+        :param api_keys: API key of every account, keyed by account name
+        :type api_keys: Dict[str, str]
+        :param base_url: base url for all the endpoints, optional, defaults to "https://cloud.lambdalabs.com/api/v1"
+        :type base_url: str, optional
+        :param max_workers: maximum number of concurrent requests of a fan-out, defaults to 8
+        :type max_workers: int, optional
+        :param rate_limiter: rate limiter shared by all accounts, defaults to None (no limit)
+        :type rate_limiter: RateLimiter, optional
+        :param circuit_breaker: circuit breaker shared by all accounts, defaults to None (disabled)
+        :type circuit_breaker: CircuitBreaker, optional
+        :param cache_responses: serve the last successful GET response while an endpoint's circuit is open,
+                defaults to False
+        :type cache_responses: bool, optional
+        """
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._clients: Dict[str, LambdaLabsClient] = {
+            account: LambdaLabsClient(api_key,
+                                      base_url=base_url,
+                                      circuit_breaker=circuit_breaker,
+                                      cache_responses=cache_responses,
+                                      session=self._session,
+                                      rate_limiter=rate_limiter)
+            for account, api_key in api_keys.items()
+        }
+
+    @property
+    def accounts(self) -> List[str]:
+        """Get the account names
+
+        :return: account names
+        :rtype: List[str]
+        """
+        return list(self._clients)
+
+    def client(self, account: str) -> LambdaLabsClient:
+        """Get the client of an account
+
+        :param account: account name
+        :type account: str
+        :return: the account's client
+        :rtype: LambdaLabsClient
+        """
+        return self._clients[account]
+
+    def fan_out(self,
+                func: Callable[[LambdaLabsClient], Any],
+                return_exceptions: bool = False
+                ) -> Dict[str, Any]:
+        """Call a function with the client of every account concurrently.
+
+        :param func: function to call with each client
+        :type func: Callable[[LambdaLabsClient], Any]
+        :param return_exceptions: return the exception raised for an account as its result
+                instead of raising it, defaults to False
+        :type return_exceptions: bool, optional
+        :return: result of every account, keyed by account name
+        :rtype: Dict[str, Any]
+        """
+        futures = {account: self._executor.submit(func, client) for account, client in self._clients.items()}
+
+        results = {}
+        for account, future in futures.items():
+            try:
+                results[account] = future.result()
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results[account] = e
+        return results
+
+    def instances(self) -> List[AccountItem]:
+        """Get the instances of all accounts
+
+        :return: instances tagged with their account
+        :rtype: List[AccountItem]
+        """
+        return self._merge(self.fan_out(lambda client: client.instances.get()))
+
+    def instance_types(self) -> List[AccountItem]:
+        """Get the instance types available to all accounts
+
+        :return: instance types tagged with their account
+        :rtype: List[AccountItem]
+        """
+        return self._merge(self.fan_out(lambda client: client.instance_types.get()))
+
+    def ssh_keys(self) -> List[AccountItem]:
+        """Get the ssh-keys of all accounts
+
+        :return: ssh-keys tagged with their account
+        :rtype: List[AccountItem]
+        """
+        return self._merge(self.fan_out(lambda client: client.ssh_keys.get()))
+
+    def file_systems(self) -> List[AccountItem]:
+        """Get the file systems of all accounts
+
+        :return: file systems tagged with their account
+        :rtype: List[AccountItem]
+        """
+        return self._merge(self.fan_out(lambda client: client.file_systems.get()))
+
+    def close(self) -> None:
+        """Stop the fan-out workers and close the shared connection pool"""
+        self._executor.shutdown(wait=True)
+        self._session.close()
+
+    def _merge(self, results: Dict[str, List[Any]]) -> List[AccountItem]:
+        return [AccountItem(account, item) for account, items in results.items() for item in items]
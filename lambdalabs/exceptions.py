@@ -5,7 +5,7 @@ class APIException(Exception):
     Raised when an API HTTP call response has a status code >= 400
     """
 
-    def __init__(self, code: str, message: str) -> None:
+    def __init__(self, code: str, message: str, status_code: int = None) -> None:
         """
         Initialize an APIException object
 
@@ -13,9 +13,12 @@ class APIException(Exception):
         :type code: str
         :param message: error message
         :type message: str
+        :param status_code: HTTP status code of the response, defaults to None
+        :type status_code: int, optional
         """
         self.code = code
         self.message = message
+        self.status_code = status_code
 
     def __str__(self) -> str:
         msg = ""
@@ -24,3 +27,25 @@ class APIException(Exception):
         msg += f'message: {self.message}'
 
         return msg
+
+
+class CircuitOpenException(APIException):
+    """This exception is raised when a call is rejected by an open circuit breaker.
+
+    No request is sent to the API, the call fails fast until the breaker's
+    cool-down has elapsed.
+    """
+
+    def __init__(self, endpoint: str, retry_after: float) -> None:
+        """
+        Initialize a CircuitOpenException object
+
+        :param endpoint: the endpoint whose circuit is open
+        :type endpoint: str
+        :param retry_after: seconds until the circuit allows a trial call
+        :type retry_after: float
+        """
+        super().__init__('circuit_open',
+                         f'circuit open for {endpoint}, retry in {retry_after:.1f}s')
+        self.endpoint = endpoint
+        self.retry_after = retry_after
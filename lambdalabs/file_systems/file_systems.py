@@ -1,4 +1,6 @@
-from typing import List
+from typing import Dict, List
+
+from lambdalabs.tracing.tracing import traced
 
 
 class FileSystem:
@@ -131,27 +133,127 @@ class FileSystem:
                 )
 
 
+class FileSystemDiff:
+    """The difference between the file systems of an account and a desired set, per region"""
+
+    def __init__(self, missing: Dict[str, List[str]], extra: Dict[str, List[FileSystem]]) -> None:
+        """Initialize the file-system diff object
+
+        :param missing: names of the desired file systems that don't exist, keyed by region name
+        :type missing: Dict[str, List[str]]
+        :param extra: existing file systems that are not desired, keyed by region name
+        :type extra: Dict[str, List[FileSystem]]
+        """
+        self._missing = missing
+        self._extra = extra
+
+    @property
+    def missing(self) -> Dict[str, List[str]]:
+        """Get the desired file systems that don't exist
+
+        :return: file-system names keyed by region name
+        :rtype: Dict[str, List[str]]
+        """
+        return self._missing
+
+    @property
+    def extra(self) -> Dict[str, List[FileSystem]]:
+        """Get the existing file systems that are not desired
+
+        :return: file-system objects keyed by region name
+        :rtype: Dict[str, List[FileSystem]]
+        """
+        return self._extra
+
+    def __bool__(self) -> bool:
+        return bool(self._missing or self._extra)
+
+    def __str__(self) -> str:
+        """Print the file-system diff
+
+        :return: file-system diff string representation
+        :rtype: str
+        """
+        extra = {region: [file_system.name for file_system in file_systems]
+                 for region, file_systems in self._extra.items()}
+        return (f'missing: {self._missing}\n'
+                f'extra: {extra}\n'
+                )
+
+
 class FileSystemsService:
     """A service for interacting with the file systems endpoint"""
 
     def __init__(self, http_client) -> None:
         self._http_client = http_client
 
+    @traced
     def get(self) -> List[FileSystem]:
         """Retrieve the list of file systems
 
         :return: list of file-system objects
         :rtype: List[FileSystem]
         """
-        file_systems_dict = self._http_client.get('/file-systems').json()
-        file_system_objects = list(map(lambda file_systems_dict: FileSystem(
-            id=file_systems_dict['id'],
-            name=file_systems_dict['name'],
-            created=file_systems_dict['created'],
-            created_by=file_systems_dict['created_by'],
-            mount_point=file_systems_dict['mount_point'],
-            region=file_systems_dict['region'],
-            is_in_use=file_systems_dict['is_in_use'],
-            bytes_used=file_systems_dict['bytes_used'],
-        ), file_systems_dict['data']))
+        file_systems_dict = self._http_client.decode(self._http_client.get('/file-systems'))
+        with self._http_client.tracer.span('model.build') as span:
+            file_system_objects = list(map(lambda file_systems_dict: FileSystem(
+                id=file_systems_dict['id'],
+                name=file_systems_dict['name'],
+                created=file_systems_dict['created'],
+                created_by=file_systems_dict['created_by'],
+                mount_point=file_systems_dict['mount_point'],
+                region=file_systems_dict['region'],
+                is_in_use=file_systems_dict['is_in_use'],
+                bytes_used=file_systems_dict['bytes_used'],
+            ), file_systems_dict['data']))
+            span.set_attribute('item_count', len(file_system_objects))
         return file_system_objects
+
+    def by_region(self, file_systems: List[FileSystem] = None) -> Dict[str, List[FileSystem]]:
+        """Group the file systems by region name
+
+        :param file_systems: file systems to group, defaults to None (retrieve them)
+        :type file_systems: List[FileSystem], optional
+        :return: file-system objects keyed by region name
+        :rtype: Dict[str, List[FileSystem]]
+        """
+        if file_systems is None:
+            file_systems = self.get()
+
+        regions = {}
+        for file_system in file_systems:
+            region = file_system.region.get('name') if isinstance(file_system.region, dict) else file_system.region
+            regions.setdefault(region, []).append(file_system)
+        return regions
+
+    def diff(self, desired: Dict[str, List[str]], file_systems: List[FileSystem] = None) -> FileSystemDiff:
+        """Compare the file systems against the desired file systems of every region.
+
+        Useful as a pre-launch check: `diff({region_name: file_system_names}).missing`
+        is empty if all file systems to attach exist in the launch region.
+
+        :param desired: names of the desired file systems, keyed by region name
+        :type desired: Dict[str, List[str]]
+        :param file_systems: file systems to compare, defaults to None (retrieve them)
+        :type file_systems: List[FileSystem], optional
+        :return: the missing and the extra file systems per region
+        :rtype: FileSystemDiff
+        """
+        regions = self.by_region(file_systems)
+
+        missing = {}
+        for region, names in desired.items():
+            existing_names = {file_system.name for file_system in regions.get(region, [])}
+            missing_names = [name for name in names if name not in existing_names]
+            if missing_names:
+                missing[region] = missing_names
+
+        extra = {}
+        for region, region_file_systems in regions.items():
+            desired_names = set(desired.get(region, []))
+            extra_file_systems = [file_system for file_system in region_file_systems
+                                  if file_system.name not in desired_names]
+            if extra_file_systems:
+                extra[region] = extra_file_systems
+
+        return FileSystemDiff(missing, extra)
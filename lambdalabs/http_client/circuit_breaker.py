@@ -0,0 +1,135 @@
+import threading
+import time
+from typing import Dict
+
+from lambdalabs.exceptions import CircuitOpenException
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class _EndpointState:
+    """The breaker state of a single endpoint"""
+
+    def __init__(self) -> None:
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_calls = 0
+
+
+class CircuitBreaker:
+    """A circuit breaker that tracks the health of every endpoint separately.
+
+    An endpoint starts closed and every call goes through. After
+    `failure_threshold` consecutive failures the endpoint is opened and calls
+    fail fast with a CircuitOpenException. Once `recovery_timeout` seconds have
+    passed the endpoint is half-open and lets up to `half_open_max_calls` trial
+    calls through; a successful trial closes it again, a failed one re-opens it,
+    and a call that ends without a result gives its trial back with `release()`.
+    """
+
+    def __init__(self,
+                 failure_threshold: int = 5,
+                 recovery_timeout: float = 30.0,
+                 half_open_max_calls: int = 1
+                 ) -> None:
+        """Initialize the circuit breaker
+
+        :param failure_threshold: consecutive failures before an endpoint is opened, defaults to 5
+        :type failure_threshold: int, optional
+        :param recovery_timeout: cool-down in seconds before an open endpoint is tried again, defaults to 30.0
+        :type recovery_timeout: float, optional
+        :param half_open_max_calls: number of concurrent trial calls in the half-open state, defaults to 1
+        :type half_open_max_calls: int, optional
+        """
+        self._failure_threshold = failure_threshold
+        self._recovery_timeout = recovery_timeout
+        self._half_open_max_calls = half_open_max_calls
+        self._endpoints: Dict[str, _EndpointState] = {}
+        self._lock = threading.Lock()
+
+    def state(self, endpoint: str) -> str:
+        """Get the current state of an endpoint
+
+        :param endpoint: endpoint name
+        :type endpoint: str
+        :return: one of 'closed', 'open' or 'half_open'
+        :rtype: str
+        """
+        with self._lock:
+            endpoint_state = self._endpoints.get(endpoint)
+            if endpoint_state is None:
+                return CLOSED
+            if endpoint_state.state == OPEN and self._cooled_down(endpoint_state):
+                return HALF_OPEN
+            return endpoint_state.state
+
+    def before_call(self, endpoint: str) -> None:
+        """Check whether a call to the endpoint may be sent.
+
+        :param endpoint: endpoint name
+        :type endpoint: str
+        :raises CircuitOpenException: if the endpoint is open, or half-open with all trial calls in flight
+        """
+        with self._lock:
+            endpoint_state = self._endpoints.setdefault(endpoint, _EndpointState())
+
+            if endpoint_state.state == OPEN:
+                if not self._cooled_down(endpoint_state):
+                    retry_after = endpoint_state.opened_at + self._recovery_timeout - time.monotonic()
+                    raise CircuitOpenException(endpoint, retry_after)
+                endpoint_state.state = HALF_OPEN
+                endpoint_state.trial_calls = 0
+
+            if endpoint_state.state == HALF_OPEN:
+                if endpoint_state.trial_calls >= self._half_open_max_calls:
+                    raise CircuitOpenException(endpoint, 0.0)
+                endpoint_state.trial_calls += 1
+
+    def record_success(self, endpoint: str) -> None:
+        """Record a successful call, closing the endpoint
+
+        :param endpoint: endpoint name
+        :type endpoint: str
+        """
+        with self._lock:
+            endpoint_state = self._endpoints.setdefault(endpoint, _EndpointState())
+            endpoint_state.state = CLOSED
+            endpoint_state.failures = 0
+            endpoint_state.trial_calls = 0
+
+    def record_failure(self, endpoint: str) -> None:
+        """Record a failed call, opening the endpoint once the threshold is reached
+
+        :param endpoint: endpoint name
+        :type endpoint: str
+        """
+        with self._lock:
+            endpoint_state = self._endpoints.setdefault(endpoint, _EndpointState())
+            endpoint_state.failures += 1
+            if endpoint_state.state == HALF_OPEN or endpoint_state.failures >= self._failure_threshold:
+                endpoint_state.state = OPEN
+                endpoint_state.opened_at = time.monotonic()
+                endpoint_state.trial_calls = 0
+
+    def release(self, endpoint: str) -> None:
+        """Give back the trial call of a call that ended without a result, e.g. interrupted
+
+        :param endpoint: endpoint name
+        :type endpoint: str
+        """
+        with self._lock:
+            endpoint_state = self._endpoints.get(endpoint)
+            if endpoint_state is not None and endpoint_state.state == HALF_OPEN and endpoint_state.trial_calls > 0:
+                endpoint_state.trial_calls -= 1
+
+    def reset(self) -> None:
+        """Close all endpoints and forget their failure counts"""
+        with self._lock:
+            self._endpoints.clear()
+
+    def _cooled_down(self, endpoint_state: _EndpointState) -> bool:
+        return time.monotonic() - endpoint_state.opened_at >= self._recovery_timeout
@@ -0,0 +1,160 @@
+import gzip
+import threading
+from typing import Dict
+
+import requests
+from urllib3.util.request import ACCEPT_ENCODING
+
+
+def accept_encoding() -> str:
+    """Get the content codings the client can decode.
+
+    gzip and deflate are always supported, br when brotli is installed and
+    zstd when zstandard is installed (with urllib3 2).
+
+    :return: value of the Accept-Encoding header
+    :rtype: str
+    """
+    return ', '.join(ACCEPT_ENCODING.split(','))
+
+
+def compress_body(body: bytes) -> bytes:
+    """Compress a request body with gzip
+
+    :param body: request body
+    :type body: bytes
+    :return: compressed request body
+    :rtype: bytes
+    """
+    return gzip.compress(body, compresslevel=6)
+
+
+def wire_bytes(response: requests.Response) -> int:
+    """Get the number of body bytes received over the wire, before decompression
+
+    :param response: Response object, with its content already read
+    :type response: requests.Response
+    :return: wire bytes, or the decoded size if the transport doesn't report it
+    :rtype: int
+    """
+    raw = response.raw
+    if raw is not None and hasattr(raw, 'tell'):
+        try:
+            return raw.tell()
+        except (OSError, ValueError):
+            pass
+    return getattr(response, 'wire_bytes', len(response.content))
+
+
+class CompressionStats:
+    """Response sizes of an endpoint, on the wire and decoded"""
+
+    def __init__(self, responses: int = 0, wire_bytes: int = 0, decoded_bytes: int = 0) -> None:
+        """Initialize the compression stats object
+
+        :param responses: number of responses, defaults to 0
+        :type responses: int, optional
+        :param wire_bytes: body bytes received over the wire, defaults to 0
+        :type wire_bytes: int, optional
+        :param decoded_bytes: body bytes after decompression, defaults to 0
+        :type decoded_bytes: int, optional
+        """
+        self._responses = responses
+        self._wire_bytes = wire_bytes
+        self._decoded_bytes = decoded_bytes
+
+    @property
+    def responses(self) -> int:
+        """Get the number of responses
+
+        :return: number of responses
+        :rtype: int
+        """
+        return self._responses
+
+    @property
+    def wire_bytes(self) -> int:
+        """Get the body bytes received over the wire
+
+        :return: wire bytes
+        :rtype: int
+        """
+        return self._wire_bytes
+
+    @property
+    def decoded_bytes(self) -> int:
+        """Get the body bytes after decompression
+
+        :return: decoded bytes
+        :rtype: int
+        """
+        return self._decoded_bytes
+
+    @property
+    def ratio(self) -> float:
+        """Get the compression ratio
+
+        :return: decoded bytes per wire byte, 1.0 without responses
+        :rtype: float
+        """
+        return self._decoded_bytes / self._wire_bytes if self._wire_bytes else 1.0
+
+    def __str__(self) -> str:
+        """Print the compression stats
+
+        :return: compression stats string representation
+        :rtype: str
+        """
+        return (f'responses: {self._responses}\n'
+                f'wire_bytes: {self._wire_bytes}\n'
+                f'decoded_bytes: {self._decoded_bytes}\n'
+                f'ratio: {self.ratio:.2f}\n'
+                )
+
+
+class CompressionMetrics:
+    """Counts the wire and decoded response bytes of every endpoint"""
+
+    def __init__(self) -> None:
+        """Initialize the compression metrics"""
+        self._endpoints: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, wire_bytes: int, decoded_bytes: int) -> None:
+        """Count a response
+
+        :param endpoint: endpoint name
+        :type endpoint: str
+        :param wire_bytes: body bytes received over the wire
+        :type wire_bytes: int
+        :param decoded_bytes: body bytes after decompression
+        :type decoded_bytes: int
+        """
+        with self._lock:
+            counters = self._endpoints.setdefault(endpoint, [0, 0, 0])
+            counters[0] += 1
+            counters[1] += wire_bytes
+            counters[2] += decoded_bytes
+
+    def by_endpoint(self) -> Dict[str, CompressionStats]:
+        """Get the stats of every endpoint
+
+        :return: stats keyed by endpoint
+        :rtype: Dict[str, CompressionStats]
+        """
+        with self._lock:
+            return {endpoint: CompressionStats(*counters) for endpoint, counters in self._endpoints.items()}
+
+    def total(self) -> CompressionStats:
+        """Get the stats of all endpoints together
+
+        :return: total stats
+        :rtype: CompressionStats
+        """
+        with self._lock:
+            return CompressionStats(*(sum(column) for column in zip([0, 0, 0], *self._endpoints.values())))
+
+    def reset(self) -> None:
+        """Forget all counted responses"""
+        with self._lock:
+            self._endpoints.clear()
@@ -1,8 +1,15 @@
 import requests
 import json
+import threading
+from collections import OrderedDict
 
-from lambdalabs.exceptions import APIException
+from lambdalabs.exceptions import APIException, CircuitOpenException
 from lambdalabs.__version__ import VERSION
+from lambdalabs.http_client.circuit_breaker import CircuitBreaker
+from lambdalabs.http_client.rate_limiter import RateLimiter
+from lambdalabs.http_client.transport import Transport, RequestsTransport
+from lambdalabs.http_client.compression import CompressionMetrics, compress_body, wire_bytes
+from lambdalabs.tracing.tracing import Tracer
 
 
 def handle_error(response: requests.Response) -> None:
@@ -15,7 +22,32 @@ def handle_error(response: requests.Response) -> None:
         data = json.loads(response.text)
         code = data['code'] if 'code' in data else None
         message = data['message'] if 'message' in data else None
-        raise APIException(code, message)
+        raise APIException(code, message, response.status_code)
+
+
+# number of GET responses kept by the response cache, least recently used first out
+RESPONSE_CACHE_SIZE = 256
+
+# collections whose sub-paths are resource ids
+_ID_COLLECTIONS = ('/instances/', '/ssh-keys/', '/file-systems/')
+
+
+def route(method: str, url: str) -> str:
+    """Get the route template of a request, e.g. 'GET /instances/{id}'
+
+    :param method: HTTP method
+    :type method: str
+    :param url: relative url of the API endpoint
+    :type url: str
+    :return: method and url, with the resource id replaced by '{id}' and without the query string
+    :rtype: str
+    """
+    path = url.split('?', 1)[0]
+    for collection in _ID_COLLECTIONS:
+        if path.startswith(collection) and len(path) > len(collection):
+            path = collection + '{id}'
+            break
+    return f'{method} {path}'
 
 
 class HTTPClient:
@@ -26,18 +58,75 @@ class HTTPClient:
     Also checks the response status code and raises an exception if needed.
     """
 
-    def __init__(self, api_key, base_url: str) -> None:
+    def __init__(self,
+                 api_key,
+                 base_url: str,
+                 circuit_breaker: CircuitBreaker = None,
+                 cache_responses: bool = False,
+                 session: requests.Session = None,
+                 rate_limiter: RateLimiter = None,
+                 transport: Transport = None,
+                 tracer: Tracer = None,
+                 compress_requests_over: int = None
+                 ) -> None:
         """The Lambda Labs client
 
         :param api_key: API key
         :type api_key: str
         :param base_url: base url for all the endpoints, optional, defaults to "https://cloud.lambdalabs.com/api/v1/"
         :type base_url: str, optional
+        :param circuit_breaker: circuit breaker guarding every endpoint, defaults to None (disabled)
+        :type circuit_breaker: CircuitBreaker, optional
+        :param cache_responses: keep the last successful GET response of the RESPONSE_CACHE_SIZE
+                most recently used urls and serve it while the endpoint's circuit is open, defaults to False
+        :type cache_responses: bool, optional
+        :param session: requests session to send the requests through, may be shared between clients,
+                defaults to None (a new connection for every request)
+        :type session: requests.Session, optional
+        :param rate_limiter: rate limiter to acquire before every request, may be shared between clients,
+                defaults to None (no limit)
+        :type rate_limiter: RateLimiter, optional
+        :param transport: transport sending the requests, e.g. a RecordingTransport or ReplayTransport,
+                defaults to None (a RequestsTransport using `session`)
+        :type transport: Transport, optional
+        :param tracer: tracer creating spans around every request, defaults to None (no tracing)
+        :type tracer: Tracer, optional
+        :param compress_requests_over: gzip JSON request bodies of at least this many bytes,
+                defaults to None (never)
+        :type compress_requests_over: int, optional
         """
 
         self._version = VERSION
         self._api_key = api_key
         self._base_url = base_url
+        self._circuit_breaker = circuit_breaker
+        self._cache_responses = cache_responses
+        self._response_cache = OrderedDict()
+        self._response_cache_lock = threading.Lock()
+        self._rate_limiter = rate_limiter
+        self._transport = transport if transport is not None else RequestsTransport(session)
+        self._tracer = tracer if tracer is not None else Tracer()
+        self._compress_requests_over = compress_requests_over
+        self._compression_metrics = CompressionMetrics()
+        self._accept_encoding = self._transport.accept_encoding()
+
+    @property
+    def tracer(self) -> Tracer:
+        """Get the tracer used by the client and its services
+
+        :return: tracer
+        :rtype: Tracer
+        """
+        return self._tracer
+
+    @property
+    def compression_metrics(self) -> CompressionMetrics:
+        """Get the wire and decoded response sizes of every endpoint
+
+        :return: compression metrics
+        :rtype: CompressionMetrics
+        """
+        return self._compression_metrics
 
     def post(self, url: str, json: dict = None, params: dict = None, **kwargs) -> requests.Response:
         """Sends a POST request.
@@ -57,13 +146,7 @@ class HTTPClient:
         :rtype: requests.Response
         """
 
-        url = self._add_base_url(url)
-        headers = self._generate_headers()
-
-        response = requests.post(url, json=json, headers=headers, params=params, **kwargs)
-        handle_error(response)
-
-        return response
+        return self._request('POST', url, json=json, params=params, **kwargs)
 
     def get(self, url: str, params: dict = None, **kwargs) -> requests.Response:
         """Sends a GET request.
@@ -80,13 +163,7 @@ class HTTPClient:
         :return: Response object
         :rtype: requests.Response
         """
-        headers = self._generate_headers()
-        url = self._add_base_url(url)
-
-        response = requests.get(url, headers=headers)
-        handle_error(response)
-
-        return response
+        return self._request('GET', url, params=params, **kwargs)
 
     def delete(self, url: str, json: dict = None, params: dict = None, **kwargs) -> requests.Response:
         """Sends a DELETE request.
@@ -105,14 +182,139 @@ class HTTPClient:
         :return: Response object
         :rtype: requests.Response
         """
-        headers = self._generate_headers()
-        url = self._add_base_url(url)
+        return self._request('DELETE', url, json=json, params=params, **kwargs)
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Sends a request through the circuit breaker, if one is configured.
+
+        Connection errors and 5xx responses count as failures of the endpoint's
+        route, so all instance ids share the circuit of 'GET /instances/{id}';
+        a call failing in any other way gives its half-open trial back.
+        While the route's circuit is open, GET requests are answered from the
+        response cache if caching is enabled, other requests fail fast.
+
+        :param method: HTTP method
+        :type method: str
+        :param url: relative url of the API endpoint
+        :type url: str
+
+        :raises CircuitOpenException: if the endpoint's circuit is open and no cached response is available
+        :raises APIException: an api exception with message and error type code
+
+        :return: Response object
+        :rtype: requests.Response
+        """
+        endpoint = route(method, url)
+        if self._circuit_breaker is not None:
+            try:
+                self._circuit_breaker.before_call(endpoint)
+            except CircuitOpenException:
+                cached_response = self._cached_response(method, url)
+                if cached_response is None:
+                    raise
+                return cached_response
+
+        recorded = False
+        try:
+            if self._rate_limiter is not None:
+                self._rate_limiter.acquire()
+
+            headers = self._generate_headers()
+            self._compress_body(headers, kwargs)
+
+            try:
+                with self._tracer.span('http.send', **{'http.method': method, 'endpoint': url}) as span:
+                    response = self._transport.send(method, self._add_base_url(url), headers, **kwargs)
+                    span.set_attribute('http.status_code', response.status_code)
+                with self._tracer.span('http.download', endpoint=url) as span:
+                    decoded_bytes = len(response.content)
+                    received_bytes = wire_bytes(response)
+                    span.set_attribute('bytes', decoded_bytes)
+                    span.set_attribute('wire_bytes', received_bytes)
+                self._compression_metrics.record(endpoint, received_bytes, decoded_bytes)
+            except requests.exceptions.RequestException:
+                if self._circuit_breaker is not None:
+                    recorded = True
+                    self._circuit_breaker.record_failure(endpoint)
+                raise
+
+            if self._circuit_breaker is not None:
+                recorded = True
+                if response.status_code >= 500:
+                    self._circuit_breaker.record_failure(endpoint)
+                else:
+                    self._circuit_breaker.record_success(endpoint)
+        finally:
+            # any other error, or an interrupt, says nothing about the endpoint's health
+            if self._circuit_breaker is not None and not recorded:
+                self._circuit_breaker.release(endpoint)
+
+        if response.status_code == 429 and self._rate_limiter is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after is not None and retry_after.isdigit():
+                self._rate_limiter.pause(float(retry_after))
 
-        response = requests.delete(url, headers=headers, json=json, params=params, **kwargs)
         handle_error(response)
 
+        if self._cache_responses and method == 'GET':
+            with self._response_cache_lock:
+                self._response_cache[url] = response
+                self._response_cache.move_to_end(url)
+                if len(self._response_cache) > RESPONSE_CACHE_SIZE:
+                    self._response_cache.popitem(last=False)
+
         return response
 
+    def _compress_body(self, headers: dict, kwargs: dict) -> None:
+        """Replace a large JSON body with its gzip'd serialization
+
+        :param headers: request headers, updated in place
+        :type headers: dict
+        :param kwargs: request arguments, updated in place
+        :type kwargs: dict
+        """
+        if self._compress_requests_over is None or kwargs.get('json') is None:
+            return
+        body = json.dumps(kwargs['json']).encode('utf-8')
+        if len(body) < self._compress_requests_over:
+            return
+        del kwargs['json']
+        kwargs['data'] = compress_body(body)
+        headers['Content-Encoding'] = 'gzip'
+
+    def _cached_response(self, method: str, url: str) -> requests.Response:
+        """Get the last successful response of a GET endpoint
+
+        :param method: HTTP method
+        :type method: str
+        :param url: relative url of the API endpoint
+        :type url: str
+        :return: the cached response, or None
+        :rtype: requests.Response
+        """
+        if not self._cache_responses or method != 'GET':
+            return None
+        with self._response_cache_lock:
+            response = self._response_cache.get(url)
+            if response is not None:
+                self._response_cache.move_to_end(url)
+            return response
+
+    def decode(self, response: requests.Response) -> dict:
+        """Decode the JSON body of a response
+
+        :param response: Response object
+        :type response: requests.Response
+        :return: the decoded body
+        :rtype: dict
+        """
+        with self._tracer.span('json.decode', bytes=len(response.content)):
+            return response.json()
+
+    def close(self) -> None:
+        """Close the transport"""
+        self._transport.close()
+
     def _generate_headers(self) -> dict:
         """Generate the default headers for every request
 
@@ -121,6 +323,7 @@ class HTTPClient:
         """
         headers = {
             'User-Agent': self._generate_user_agent(),
+            'Accept-Encoding': self._accept_encoding,
             'Content-Type': 'application/json',
             'Authorization': f"Bearer {self._api_key}"
         }
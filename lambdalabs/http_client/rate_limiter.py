@@ -0,0 +1,47 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """A thread-safe token bucket limiting the request rate of one or more HTTP clients.
+
+    Clients sharing a rate limiter share its budget, and a `Retry-After`
+    received by any of them pauses all of them.
+    """
+
+    def __init__(self, rate: float, burst: int = None) -> None:
+        """Initialize the rate limiter
+
+        :param rate: sustained number of requests per second
+        :type rate: float
+        :param burst: maximum number of requests sent back to back, defaults to `rate`
+        :type burst: int, optional
+        """
+        self._rate = rate
+        self._capacity = float(burst if burst is not None else max(1, int(rate)))
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until a request may be sent"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = max(self._paused_until - now, (1 - self._tokens) / self._rate)
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every request for the given number of seconds
+
+        :param seconds: pause duration in seconds
+        :type seconds: float
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
@@ -0,0 +1,301 @@
+import abc
+import base64
+import gzip
+import importlib.util
+import json
+import re
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from lambdalabs.http_client.compression import accept_encoding
+
+
+def build_response(status_code: int, headers: dict, content: bytes, url: str) -> requests.Response:
+    """Create a requests response object from its parts
+
+    :param status_code: HTTP status code
+    :type status_code: int
+    :param headers: response headers
+    :type headers: dict
+    :param content: response body
+    :type content: bytes
+    :param url: request url
+    :type url: str
+    :return: Response object
+    :rtype: requests.Response
+    """
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers = CaseInsensitiveDict(headers)
+    response._content = content
+    response.url = url
+    response.encoding = 'utf-8'
+    return response
+
+
+class Transport(abc.ABC):
+    """Sends the requests of an HTTPClient.
+
+    Subclasses implement `send()`, which takes the same arguments as
+    `requests.request()` and returns a `requests.Response`.
+    """
+
+    @abc.abstractmethod
+    def send(self, method: str, url: str, headers: dict, **kwargs) -> requests.Response:
+        """Send a request
+
+        :param method: HTTP method
+        :type method: str
+        :param url: absolute url
+        :type url: str
+        :param headers: request headers
+        :type headers: dict
+        :return: Response object
+        :rtype: requests.Response
+        """
+
+    def accept_encoding(self) -> str:
+        """Get the content codings the transport can decode
+
+        :return: value of the Accept-Encoding header
+        :rtype: str
+        """
+        return accept_encoding()
+
+    def close(self) -> None:
+        """Release the resources held by the transport"""
+
+
+class RequestsTransport(Transport):
+    """Sends requests with the requests library.
+
+    Responses are streamed, so that the HTTPClient can time sending the
+    request and downloading the body separately.
+    """
+
+    def __init__(self, session: requests.Session = None) -> None:
+        """Initialize the requests transport
+
+        :param session: session to send the requests through, defaults to None (a new connection for every request)
+        :type session: requests.Session, optional
+        """
+        self._session = session
+
+    def send(self, method: str, url: str, headers: dict, **kwargs) -> requests.Response:
+        sender = self._session if self._session is not None else requests
+        kwargs.setdefault('stream', True)
+        return sender.request(method, url, headers=headers, **kwargs)
+
+
+def _request_key(method: str, url: str, params: dict, body) -> Tuple[str, str, str, str]:
+    return (method, url, json.dumps(params, sort_keys=True), json.dumps(body, sort_keys=True))
+
+
+# response fields holding secrets, and the query parameter carrying the jupyter token
+REDACTED_FIELDS = {'private_key', 'jupyter_token'}
+_REDACTED_URL_FIELDS = {'jupyter_url'}
+REDACTED = '<redacted>'
+
+
+def _redact(value: Any) -> Any:
+    """Replace the secrets of a decoded JSON response"""
+    if isinstance(value, list):
+        return [_redact(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+    redacted = {}
+    for key, item in value.items():
+        if key in REDACTED_FIELDS and item is not None:
+            redacted[key] = REDACTED
+        elif key in _REDACTED_URL_FIELDS and isinstance(item, str):
+            parts = urlsplit(item)
+            query = [(name, REDACTED if name == 'token' else query_value)
+                     for name, query_value in parse_qsl(parts.query, keep_blank_values=True)]
+            redacted[key] = urlunsplit(parts._replace(query=urlencode(query)))
+        else:
+            redacted[key] = _redact(item)
+    return redacted
+
+
+class RecordingTransport(Transport):
+    """Records the requests sent by another transport, with their responses and latencies.
+
+    Records are written as gzip'd JSON lines. The Authorization header is
+    never recorded. Response bodies are, so by default the secrets they hold
+    (`private_key` of generated ssh-keys, `jupyter_token` and the token in
+    `jupyter_url`) are replaced by '<redacted>'. Recordings made with
+    `redact=False` contain these secrets and must be kept private.
+    """
+
+    def __init__(self, transport: Transport, path: str, redact: bool = True) -> None:
+        """Initialize the recording transport
+
+        :param transport: the transport sending the requests
+        :type transport: Transport
+        :param path: path of the recording
+        :type path: str
+        :param redact: replace the secrets in response bodies, defaults to True
+        :type redact: bool, optional
+        """
+        self._transport = transport
+        self._redact = redact
+        self._file = gzip.open(path, 'wt', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def send(self, method: str, url: str, headers: dict, **kwargs) -> requests.Response:
+        start = time.monotonic()
+        response = self._transport.send(method, url, headers, **kwargs)
+        content = response.content
+        latency = time.monotonic() - start
+        recorded_content = self._redacted(content) if self._redact else content
+
+        record = {
+            'method': method,
+            'url': url,
+            'params': kwargs.get('params'),
+            'json': kwargs.get('json'),
+            'status_code': response.status_code,
+            'headers': {key: value for key, value in response.headers.items()
+                        if key.lower() not in ('content-encoding', 'content-length', 'transfer-encoding')},
+            'content': base64.b64encode(recorded_content).decode('ascii'),
+            'latency': latency,
+        }
+        with self._lock:
+            self._file.write(json.dumps(record) + '\n')
+        return response
+
+    def accept_encoding(self) -> str:
+        return self._transport.accept_encoding()
+
+    def _redacted(self, content: bytes) -> bytes:
+        try:
+            body = json.loads(content)
+        except ValueError:
+            return content
+        return json.dumps(_redact(body)).encode('utf-8')
+
+    def close(self) -> None:
+        """Finish the recording and close the wrapped transport"""
+        with self._lock:
+            self._file.close()
+        self._transport.close()
+
+
+class ReplayTransport(Transport):
+    """Serves the responses of a recording instead of calling the API.
+
+    Requests are matched by method, url, query parameters and JSON body.
+    Matching responses are served in recorded order, starting over once all
+    of them have been served. With `realtime` every response is delayed by
+    its recorded latency, otherwise responses are served as fast as possible.
+    """
+
+    def __init__(self, path: str, realtime: bool = False, speed: float = 1.0) -> None:
+        """Initialize the replay transport
+
+        :param path: path of the recording
+        :type path: str
+        :param realtime: delay responses by their recorded latency, defaults to False
+        :type realtime: bool, optional
+        :param speed: divides the recorded latencies when replaying in realtime, defaults to 1.0
+        :type speed: float, optional
+        """
+        self._realtime = realtime
+        self._speed = speed
+        self._records: Dict[Tuple[str, str, str, str], List[dict]] = {}
+        self._positions: Dict[Tuple[str, str, str, str], int] = {}
+        self._lock = threading.Lock()
+
+        with gzip.open(path, 'rt', encoding='utf-8') as recording:
+            for line in recording:
+                record = json.loads(line)
+                key = _request_key(record['method'], record['url'], record['params'], record['json'])
+                self._records.setdefault(key, []).append(record)
+
+    def send(self, method: str, url: str, headers: dict, **kwargs) -> requests.Response:
+        key = _request_key(method, url, kwargs.get('params'), kwargs.get('json'))
+        with self._lock:
+            records = self._records.get(key)
+            if not records:
+                raise LookupError(f'no recorded response for {method} {url}')
+            position = self._positions.get(key, 0)
+            self._positions[key] = (position + 1) % len(records)
+        record = records[position]
+
+        if self._realtime:
+            time.sleep(record['latency'] / self._speed)
+        return build_response(record['status_code'], record['headers'],
+                              base64.b64decode(record['content']), url)
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def _version_tuple(version: str) -> Tuple[int, ...]:
+    return tuple(int(part) for part in re.findall(r'\d+', version)[:3])
+
+
+class HTTP2Transport(Transport):
+    """Multiplexes requests over a few HTTP/2 connections, requires `httpx[http2]`.
+
+    Concurrent requests to the API share a handful of connections instead of
+    opening one HTTP/1.1 connection per in-flight request. Connection errors
+    and timeouts are raised as their requests counterparts, so the HTTPClient
+    behaves the same as with the RequestsTransport.
+    """
+
+    def __init__(self, max_connections: int = 4, timeout: float = 60.0) -> None:
+        """Initialize the HTTP/2 transport
+
+        :param max_connections: maximum number of connections, defaults to 4
+        :type max_connections: int, optional
+        :param timeout: request timeout in seconds, defaults to 60.0
+        :type timeout: float, optional
+        :raises ImportError: if httpx or h2 is not installed
+        """
+        import httpx
+        self._httpx = httpx
+        self._client = httpx.Client(http2=True,
+                                    timeout=timeout,
+                                    limits=httpx.Limits(max_connections=max_connections))
+
+    def send(self, method: str, url: str, headers: dict, **kwargs) -> requests.Response:
+        kwargs.pop('stream', None)
+        try:
+            response = self._client.request(method, url, headers=headers, **kwargs)
+        except self._httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(str(e))
+        except self._httpx.TransportError as e:
+            raise requests.exceptions.ConnectionError(str(e))
+
+        # httpx already decoded the body
+        response_headers = {key: value for key, value in response.headers.items()
+                            if key.lower() not in ('content-encoding', 'content-length')}
+        built_response = build_response(response.status_code, response_headers, response.content, url)
+        built_response.wire_bytes = response.num_bytes_downloaded
+        return built_response
+
+    def accept_encoding(self) -> str:
+        """Get the content codings httpx can decode
+
+        br needs brotli or brotlicffi, zstd needs zstandard and httpx 0.27.1 or newer.
+
+        :return: value of the Accept-Encoding header
+        :rtype: str
+        """
+        codings = ['gzip', 'deflate']
+        if _installed('brotli') or _installed('brotlicffi'):
+            codings.append('br')
+        if _installed('zstandard') and _version_tuple(self._httpx.__version__) >= (0, 27, 1):
+            codings.append('zstd')
+        return ', '.join(codings)
+
+    def close(self) -> None:
+        """Close the connections"""
+        self._client.close()
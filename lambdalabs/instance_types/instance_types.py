@@ -1,5 +1,7 @@
 from typing import List
 
+from lambdalabs.tracing.tracing import traced
+
 
 class InstanceType:
     """A instance type class"""
@@ -128,13 +130,27 @@ class InstanceTypesService:
         """
         self._http_client = http_client
 
+    @traced
     def get(self) -> List[InstanceType]:
         """Returns a list of instance types
 
         :return: list of instance types
         :rtype: List[InstanceType]
         """
-        instance_types = self._http_client.get('/instance-types').json()["data"]
+        instance_types = self._http_client.decode(self._http_client.get('/instance-types'))["data"]
+        with self._http_client.tracer.span('model.build') as span:
+            instance_type_objects = self._build(instance_types)
+            span.set_attribute('item_count', len(instance_type_objects))
+        return instance_type_objects
+
+    def _build(self, instance_types: dict) -> List[InstanceType]:
+        """Create the instance type objects from their API representation
+
+        :param instance_types: instance types returned by the API, keyed by name
+        :type instance_types: dict
+        :return: list of instance types
+        :rtype: List[InstanceType]
+        """
         instance_type_objects = list(map(lambda instance_type: InstanceType(
             name=instance_type[1]['instance_type']['name'],
             price_cents_per_hour=instance_type[1]['instance_type']['price_cents_per_hour'],
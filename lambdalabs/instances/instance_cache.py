@@ -0,0 +1,174 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Set, Tuple
+
+from lambdalabs.exceptions import APIException
+
+if TYPE_CHECKING:
+    from lambdalabs.instances.instances import Instance
+
+
+class _CacheEntry:
+    """A cached instance and when it was last confirmed by the API"""
+
+    def __init__(self, instance: 'Instance', fetched_at: float, optimistic: bool) -> None:
+        self.instance = instance
+        self.fetched_at = fetched_at
+        self.optimistic = optimistic
+
+
+class InstanceCache:
+    """A write-through cache of instance states.
+
+    Entries younger than `refresh_after` seconds are served as is. Older
+    entries are served while a background refresh is running, until they are
+    `max_staleness` seconds old, after which they are evicted and the caller
+    has to fetch the instance again. Entries written optimistically after a
+    launch, terminate or restart are refreshed on their first read; an
+    instance the API no longer knows is evicted.
+    """
+
+    def __init__(self,
+                 max_staleness: float = 30.0,
+                 refresh_after: float = 5.0,
+                 max_workers: int = 4
+                 ) -> None:
+        """Initialize the instance cache
+
+        :param max_staleness: maximum age in seconds of an entry that is served, defaults to 30.0
+        :type max_staleness: float, optional
+        :param refresh_after: age in seconds after which a served entry is refreshed in the background,
+                defaults to 5.0
+        :type refresh_after: float, optional
+        :param max_workers: maximum number of concurrent background refreshes, defaults to 4
+        :type max_workers: int, optional
+        """
+        self._max_staleness = max_staleness
+        self._refresh_after = refresh_after
+        self._entries: Dict[str, _CacheEntry] = {}
+        self._refreshing: Set[str] = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def get(self, id: str) -> Tuple['Instance', bool]:
+        """Look up an instance
+
+        :param id: instance id
+        :type id: str
+        :return: the cached instance, or None if it is missing or too stale,
+                and whether the entry should be refreshed
+        :rtype: Tuple[Instance, bool]
+        """
+        with self._lock:
+            entry = self._entries.get(id)
+        if entry is None:
+            return None, False
+
+        age = time.monotonic() - entry.fetched_at
+        if age > self._max_staleness:
+            with self._lock:
+                if self._entries.get(id) is entry:
+                    del self._entries[id]
+            return None, False
+        return entry.instance, entry.optimistic or age > self._refresh_after
+
+    def put(self, instance: 'Instance', optimistic: bool = False, fetched_at: float = None) -> bool:
+        """Store an instance
+
+        A fetched instance is dropped if its entry was written after the fetch
+        started, e.g. by an optimistic update after terminate().
+
+        :param instance: instance object
+        :type instance: Instance
+        :param optimistic: the state is expected but not confirmed by the API yet, defaults to False
+        :type optimistic: bool, optional
+        :param fetched_at: `time.monotonic()` when the fetch of the instance started,
+                defaults to None (now, the instance is stored unconditionally)
+        :type fetched_at: float, optional
+        :return: whether the instance was stored
+        :rtype: bool
+        """
+        with self._lock:
+            if fetched_at is not None and self._is_newer(self._entries.get(instance.id), fetched_at):
+                return False
+            self._entries[instance.id] = _CacheEntry(instance, fetched_at or time.monotonic(), optimistic)
+            return True
+
+    def put_snapshot(self, instances: Iterable['Instance'], fetched_at: float = None) -> None:
+        """Store a complete list of instances.
+
+        Confirmed entries that are not part of the list are evicted. Optimistic
+        entries are kept until they are `max_staleness` seconds old, as the list
+        may not contain freshly launched instances yet. Entries written after
+        the list was requested are kept as well.
+
+        :param instances: all instances of the account
+        :type instances: Iterable[Instance]
+        :param fetched_at: `time.monotonic()` when the list was requested, defaults to None (now)
+        :type fetched_at: float, optional
+        """
+        fetched_at = fetched_at or time.monotonic()
+        with self._lock:
+            entries = {id: entry for id, entry in self._entries.items()
+                       if self._is_newer(entry, fetched_at)
+                       or (entry.optimistic and fetched_at - entry.fetched_at <= self._max_staleness)}
+            for instance in instances:
+                if not self._is_newer(entries.get(instance.id), fetched_at):
+                    entries[instance.id] = _CacheEntry(instance, fetched_at, False)
+            self._entries = entries
+
+    def evict(self, id: str) -> None:
+        """Remove an instance from the cache
+
+        :param id: instance id
+        :type id: str
+        """
+        with self._lock:
+            self._entries.pop(id, None)
+
+    def clear(self) -> None:
+        """Remove all instances from the cache"""
+        with self._lock:
+            self._entries.clear()
+
+    def refresh(self, id: str, fetch: Callable[[str], 'Instance']) -> None:
+        """Refresh an instance in the background, unless a refresh is already running
+
+        :param id: instance id
+        :type id: str
+        :param fetch: function fetching the instance from the API
+        :type fetch: Callable[[str], Instance]
+        """
+        with self._lock:
+            if id in self._refreshing:
+                return
+            self._refreshing.add(id)
+        self._executor.submit(self._refresh, id, fetch)
+
+    def close(self) -> None:
+        """Wait for running background refreshes and stop the workers"""
+        self._executor.shutdown(wait=True)
+
+    def _is_newer(self, entry: _CacheEntry, fetched_at: float) -> bool:
+        """Whether an entry was written after a fetch started"""
+        return entry is not None and entry.fetched_at > fetched_at
+
+    def _refresh(self, id: str, fetch: Callable[[str], 'Instance']) -> None:
+        try:
+            fetched_at = time.monotonic()
+            instance = fetch(id)
+            if instance is not None:
+                self.put(instance, fetched_at=fetched_at)
+        except APIException as e:
+            if e.status_code == 404:
+                # terminated and gone, unless written again since the fetch started
+                with self._lock:
+                    if not self._is_newer(self._entries.get(id), fetched_at):
+                        self._entries.pop(id, None)
+        except Exception:
+            # the entry ages out and the next synchronous read surfaces the error
+            pass
+        finally:
+            with self._lock:
+                self._refreshing.discard(id)
@@ -0,0 +1,282 @@
+from typing import TYPE_CHECKING, Dict, Iterable, List, Set
+
+if TYPE_CHECKING:
+    from lambdalabs.instances.instances import Instance
+
+
+def _region_name(instance: 'Instance') -> str:
+    region = instance.region
+    if isinstance(region, dict):
+        return region.get('name')
+    return region
+
+
+def _instance_type_name(instance: 'Instance') -> str:
+    return instance.instance_type.name if instance.instance_type is not None else None
+
+
+def _fingerprint(instance: 'Instance') -> tuple:
+    """The fields whose change makes an instance count as changed between two snapshots"""
+    return (instance.status, instance.ip, instance.hostname, instance.name, _region_name(instance),
+            _instance_type_name(instance), instance.jupyter_token, instance.jupyter_url,
+            tuple(instance.ssh_key_names or ()), tuple(instance.file_system_names or ()))
+
+
+class InstanceListDiff:
+    """The difference between two instance snapshots"""
+
+    def __init__(self,
+                 added: List['Instance'],
+                 removed: List['Instance'],
+                 changed: List['Instance']
+                 ) -> None:
+        """Initialize the instance list diff object
+
+        :param added: instances only in the new snapshot
+        :type added: List[Instance]
+        :param removed: instances only in the old snapshot
+        :type removed: List[Instance]
+        :param changed: instances of the new snapshot whose details changed
+        :type changed: List[Instance]
+        """
+        self._added = added
+        self._removed = removed
+        self._changed = changed
+
+    @property
+    def added(self) -> List['Instance']:
+        """Get the instances only in the new snapshot
+
+        :return: added instances
+        :rtype: List[Instance]
+        """
+        return self._added
+
+    @property
+    def removed(self) -> List['Instance']:
+        """Get the instances only in the old snapshot
+
+        :return: removed instances
+        :rtype: List[Instance]
+        """
+        return self._removed
+
+    @property
+    def changed(self) -> List['Instance']:
+        """Get the instances whose details changed
+
+        :return: changed instances, as found in the new snapshot
+        :rtype: List[Instance]
+        """
+        return self._changed
+
+    def __bool__(self) -> bool:
+        return bool(self._added or self._removed or self._changed)
+
+    def __str__(self) -> str:
+        """Print the instance list diff
+
+        :return: instance list diff string representation
+        :rtype: str
+        """
+        return (f'added: {[instance.id for instance in self._added]}\n'
+                f'removed: {[instance.id for instance in self._removed]}\n'
+                f'changed: {[instance.id for instance in self._changed]}\n'
+                )
+
+
+class InstanceList(list):
+    """A snapshot of instances with hash indexes for fast lookups.
+
+    It is a regular list of instances, so existing code keeps working, plus
+    lookups by id, ip and hostname, group-by views on name, region, status
+    and instance type, and set operations against another snapshot. The
+    indexes are maintained by `update()`; the list must not be mutated
+    through the regular list methods.
+    """
+
+    def __init__(self, instances: Iterable['Instance'] = ()) -> None:
+        """Initialize the instance list
+
+        :param instances: instances of the snapshot
+        :type instances: Iterable[Instance], optional
+        """
+        super().__init__(instances)
+        self._by_id: Dict[str, 'Instance'] = {}
+        self._by_ip: Dict[str, 'Instance'] = {}
+        self._by_hostname: Dict[str, 'Instance'] = {}
+        self._groups: Dict[str, Dict[str, Dict[str, 'Instance']]] = {
+            'name': {}, 'region': {}, 'status': {}, 'instance_type': {}
+        }
+        for instance in self:
+            self._index(instance)
+
+    def by_id(self, id: str) -> 'Instance':
+        """Get the instance with the given id
+
+        :param id: instance id
+        :type id: str
+        :return: the instance, or None
+        :rtype: Instance
+        """
+        return self._by_id.get(id)
+
+    def by_ip(self, ip: str) -> 'Instance':
+        """Get the instance with the given ip address
+
+        :param ip: instance ip address
+        :type ip: str
+        :return: the instance, or None
+        :rtype: Instance
+        """
+        return self._by_ip.get(ip)
+
+    def by_hostname(self, hostname: str) -> 'Instance':
+        """Get the instance with the given hostname
+
+        :param hostname: instance hostname
+        :type hostname: str
+        :return: the instance, or None
+        :rtype: Instance
+        """
+        return self._by_hostname.get(hostname)
+
+    def by_name(self, name: str) -> List['Instance']:
+        """Get the instances with the given name, names are not unique
+
+        :param name: user-provided instance name
+        :type name: str
+        :return: instances with that name
+        :rtype: List[Instance]
+        """
+        return list(self._groups['name'].get(name, {}).values())
+
+    def group_by_region(self) -> Dict[str, List['Instance']]:
+        """Group the instances by region name
+
+        :return: instances keyed by region name
+        :rtype: Dict[str, List[Instance]]
+        """
+        return self._group('region')
+
+    def group_by_status(self) -> Dict[str, List['Instance']]:
+        """Group the instances by status
+
+        :return: instances keyed by status
+        :rtype: Dict[str, List[Instance]]
+        """
+        return self._group('status')
+
+    def group_by_instance_type(self) -> Dict[str, List['Instance']]:
+        """Group the instances by instance type name
+
+        :return: instances keyed by instance type name
+        :rtype: Dict[str, List[Instance]]
+        """
+        return self._group('instance_type')
+
+    def ids(self) -> Set[str]:
+        """Get the ids of all instances
+
+        :return: instance ids
+        :rtype: Set[str]
+        """
+        return set(self._by_id)
+
+    def intersection(self, other: 'InstanceList') -> 'InstanceList':
+        """Get the instances that are also in another snapshot
+
+        :param other: the other snapshot
+        :type other: InstanceList
+        :return: instances of this snapshot whose id is in the other one
+        :rtype: InstanceList
+        """
+        return InstanceList(instance for instance in self if other.by_id(instance.id) is not None)
+
+    def difference(self, other: 'InstanceList') -> 'InstanceList':
+        """Get the instances that are not in another snapshot
+
+        :param other: the other snapshot
+        :type other: InstanceList
+        :return: instances of this snapshot whose id is not in the other one
+        :rtype: InstanceList
+        """
+        return InstanceList(instance for instance in self if other.by_id(instance.id) is None)
+
+    def diff(self, other: 'InstanceList') -> InstanceListDiff:
+        """Compare this snapshot against a newer one
+
+        :param other: the newer snapshot
+        :type other: InstanceList
+        :return: the instances added, removed and changed in the newer snapshot
+        :rtype: InstanceListDiff
+        """
+        added = []
+        changed = []
+        for instance in other:
+            previous = self._by_id.get(instance.id)
+            if previous is None:
+                added.append(instance)
+            elif _fingerprint(previous) != _fingerprint(instance):
+                changed.append(instance)
+        removed = [instance for instance in self if other.by_id(instance.id) is None]
+        return InstanceListDiff(added, removed, changed)
+
+    def update(self, snapshot: Iterable['Instance']) -> InstanceListDiff:
+        """Replace the contents with a newer snapshot.
+
+        Only the indexes of added, removed and changed instances are touched.
+
+        :param snapshot: the newer snapshot
+        :type snapshot: Iterable[Instance]
+        :return: the instances added, removed and changed in the newer snapshot
+        :rtype: InstanceListDiff
+        """
+        if not isinstance(snapshot, InstanceList):
+            snapshot = InstanceList(snapshot)
+        diff = self.diff(snapshot)
+
+        for instance in diff.removed:
+            self._unindex(instance)
+        for instance in diff.changed:
+            self._unindex(self._by_id[instance.id])
+            self._index(instance)
+        for instance in diff.added:
+            self._index(instance)
+
+        # unchanged instances keep their existing (identical) objects
+        super().__init__(self._by_id[instance.id] for instance in snapshot)
+        return diff
+
+    def _group(self, key: str) -> Dict[str, List['Instance']]:
+        return {value: list(instances.values()) for value, instances in self._groups[key].items()}
+
+    def _group_keys(self, instance: 'Instance') -> Dict[str, str]:
+        return {
+            'name': instance.name,
+            'region': _region_name(instance),
+            'status': instance.status,
+            'instance_type': _instance_type_name(instance),
+        }
+
+    def _index(self, instance: 'Instance') -> None:
+        self._by_id[instance.id] = instance
+        if instance.ip is not None:
+            self._by_ip[instance.ip] = instance
+        if instance.hostname is not None:
+            self._by_hostname[instance.hostname] = instance
+        for key, value in self._group_keys(instance).items():
+            self._groups[key].setdefault(value, {})[instance.id] = instance
+
+    def _unindex(self, instance: 'Instance') -> None:
+        self._by_id.pop(instance.id, None)
+        if self._by_ip.get(instance.ip) is instance:
+            del self._by_ip[instance.ip]
+        if self._by_hostname.get(instance.hostname) is instance:
+            del self._by_hostname[instance.hostname]
+        for key, value in self._group_keys(instance).items():
+            group = self._groups[key].get(value)
+            if group is not None:
+                group.pop(instance.id, None)
+                if not group:
+                    del self._groups[key][value]
@@ -1,5 +1,9 @@
+import time
 from typing import List, Union
 from lambdalabs.instance_types.instance_types import InstanceType
+from lambdalabs.instances.instance_index import InstanceList
+from lambdalabs.instances.instance_cache import InstanceCache
+from lambdalabs.tracing.tracing import traced
 
 
 class Instance:
@@ -15,7 +19,8 @@ class Instance:
                  file_system_names: List[str],
                  hostname: str,
                  jupyter_token: str,
-                 jupyter_url: str
+                 jupyter_url: str,
+                 name: str = None
                  ) -> None:
         """Initialize the instance object
 
@@ -39,6 +44,8 @@ class Instance:
         :type jupyter_token: str
         :param jupyter_url: instance jupyter url
         :type jupyter_url: str
+        :param name: user-provided instance name
+        :type name: str, optional
         """
         self._id = id
         self._region = region
@@ -50,6 +57,7 @@ class Instance:
         self._hostname = hostname
         self._jupyter_token = jupyter_token
         self._jupyter_url = jupyter_url
+        self._name = name
 
     @property
     def id(self) -> str:
@@ -60,6 +68,24 @@ class Instance:
         """
         return self._id
 
+    @property
+    def name(self) -> str:
+        """Get the user-provided instance name
+
+        :return: instance name
+        :rtype: str
+        """
+        return self._name
+
+    @property
+    def region(self) -> dict:
+        """Get the instance region details
+
+        :return: instance region details
+        :rtype: dict
+        """
+        return self._region
+
     @property
     def ip(self) -> str:
         """Get the instance ip address
@@ -139,6 +165,7 @@ class Instance:
         :rtype: str
         """
         return (f'id: {self._id}\n'
+                f'name: {self._name}\n'
                 f'region: {self._region}\n'
                 f'ip: {self._ip}\n'
                 f'instance_type: {self._instance_type}\n'
@@ -151,72 +178,128 @@ class Instance:
                 )
 
 
+def _instance_from_dict(instance_dict: dict) -> Instance:
+    """Create an instance object from its API representation
+
+    :param instance_dict: instance details returned by the API
+    :type instance_dict: dict
+    :return: instance object
+    :rtype: Instance
+    """
+    return Instance(
+        id=instance_dict['id'] if 'id' in instance_dict else None,
+        region=instance_dict['region'] if 'region' in instance_dict else None,
+        ip=instance_dict['ip'] if 'ip' in instance_dict else None,
+        instance_type=InstanceType(instance_dict['instance_type']['name'],
+                                   instance_dict['instance_type']['price_cents_per_hour'],
+                                   instance_dict['instance_type']['description'],
+                                   instance_dict['instance_type']['specs']['vcpus'],
+                                   instance_dict['instance_type']['specs']['memory_gib'],
+                                   instance_dict['instance_type']['specs']['storage_gib'],
+                                   None) if 'instance_type' in instance_dict else None,
+        status=instance_dict['status'] if 'status' in instance_dict else None,
+        ssh_key_names=instance_dict['ssh_key_names'] if 'ssh_key_names' in instance_dict else None,
+        file_system_names=instance_dict['file_system_names'] if 'file_system_names' in instance_dict else None,
+        hostname=instance_dict['hostname'] if 'hostname' in instance_dict else None,
+        jupyter_token=instance_dict['jupyter_token'] if 'jupyter_token' in instance_dict else None,
+        jupyter_url=instance_dict['jupyter_url'] if 'jupyter_url' in instance_dict else None,
+        name=instance_dict['name'] if 'name' in instance_dict else None
+    )
+
+
+def _with_status(instance: Instance, status: str) -> Instance:
+    """Copy an instance object with a different status
+
+    :param instance: instance object
+    :type instance: Instance
+    :param status: the new status
+    :type status: str
+    :return: instance object
+    :rtype: Instance
+    """
+    return Instance(id=instance.id,
+                    region=instance.region,
+                    ip=instance.ip,
+                    instance_type=instance.instance_type,
+                    status=status,
+                    ssh_key_names=instance.ssh_key_names,
+                    file_system_names=instance.file_system_names,
+                    hostname=instance.hostname,
+                    jupyter_token=instance.jupyter_token,
+                    jupyter_url=instance.jupyter_url,
+                    name=instance.name)
+
+
 class InstancesService:
     """A service for interacting with the instances endpoint"""
 
-    def __init__(self, http_client) -> None:
+    def __init__(self, http_client, cache: InstanceCache = None) -> None:
+        """Initialize the instances service object
+
+        :param http_client: http client to interact with the HTTP API
+        :type http_client: HTTPClient
+        :param cache: instance-state cache serving get_by_id(), defaults to None (disabled)
+        :type cache: InstanceCache, optional
+        """
         self._http_client = http_client
+        self._cache = cache
 
-    def get(self) -> List[Instance]:
+    @traced
+    def get(self) -> InstanceList:
         """Get all of the client's instances
 
-        :return: list of instance objects
-        :rtype: List[Instance]
+        :return: list of instance objects, indexed by id, ip, hostname and name
+        :rtype: InstanceList
         """
-        instances_dict = self._http_client.get('/instances').json()
-        instances = list(map(lambda instance_dict: Instance(
-            id=instance_dict['id'] if 'id' in instance_dict else None,
-            region=instance_dict['region'] if 'region' in instance_dict else None,
-            ip=instance_dict['ip'] if 'ip' in instance_dict else None,
-            instance_type=InstanceType(instance_dict['instance_type']['name'],
-                                       instance_dict['instance_type']['price_cents_per_hour'],
-                                       instance_dict['instance_type']['description'],
-                                       instance_dict['instance_type']['specs']['vcpus'],
-                                       instance_dict['instance_type']['specs']['memory_gib'],
-                                       instance_dict['instance_type']['specs']['storage_gib'],
-                                       None) if 'instance_type' in instance_dict else None,
-            status=instance_dict['status'] if 'status' in instance_dict else None,
-            ssh_key_names=instance_dict['ssh_key_names'] if 'ssh_key_names' in instance_dict else None,
-            file_system_names=instance_dict['file_system_names'] if 'file_system_names' in instance_dict else None,
-            hostname=instance_dict['hostname'] if 'hostname' in instance_dict else None,
-            jupyter_token=instance_dict['jupyter_token'] if 'jupyter_token' in instance_dict else None,
-            jupyter_url=instance_dict['jupyter_url'] if 'jupyter_url' in instance_dict else None
-        ), instances_dict['data']))
+        fetched_at = time.monotonic()
+        instances_dict = self._http_client.decode(self._http_client.get('/instances'))
+        with self._http_client.tracer.span('model.build') as span:
+            instances = InstanceList(map(_instance_from_dict, instances_dict['data']))
+            span.set_attribute('item_count', len(instances))
+        if self._cache is not None:
+            self._cache.put_snapshot(instances, fetched_at)
         return instances
 
+    @traced
     def get_by_id(self, id: str) -> Instance:
         """Get an instance with specified id.
 
+        If a cache is configured, the cached instance is returned while it is
+        within the cache's staleness bound, and refreshed in the background.
+
+        :param id: instance id
+        :type id: str
+        :return: instance details object
+        :rtype: Instance
+        """
+        if self._cache is not None:
+            instance, needs_refresh = self._cache.get(id)
+            if instance is not None:
+                if needs_refresh:
+                    self._cache.refresh(id, self._fetch_by_id)
+                return instance
+
+        fetched_at = time.monotonic()
+        instance = self._fetch_by_id(id)
+        if self._cache is not None and instance is not None:
+            self._cache.put(instance, fetched_at=fetched_at)
+        return instance
+
+    def _fetch_by_id(self, id: str) -> Instance:
+        """Fetch an instance with specified id from the API.
+
         :param id: instance id
         :type id: str
         :return: instance details object
         :rtype: Instance
         """
-        instance_dict = self._http_client.get('/instances' + f'/{id}').json()
-        print(instance_dict)
+        instance_dict = self._http_client.decode(self._http_client.get('/instances' + f'/{id}'))
         if 'data' not in instance_dict:
             return None
-        instance_dict = instance_dict['data']
-        instance = Instance(
-            id=instance_dict['id'] if 'id' in instance_dict else None,
-            region=instance_dict['region'] if 'region' in instance_dict else None,
-            ip=instance_dict['ip'] if 'ip' in instance_dict else None,
-            instance_type=InstanceType(instance_dict['instance_type']['name'],
-                                       instance_dict['instance_type']['price_cents_per_hour'],
-                                       instance_dict['instance_type']['description'],
-                                       instance_dict['instance_type']['specs']['vcpus'],
-                                       instance_dict['instance_type']['specs']['memory_gib'],
-                                       instance_dict['instance_type']['specs']['storage_gib'],
-                                       None) if 'instance_type' in instance_dict else None,
-            status=instance_dict['status'] if 'status' in instance_dict else None,
-            ssh_key_names=instance_dict['ssh_key_names'] if 'ssh_key_names' in instance_dict else None,
-            file_system_names=instance_dict['file_system_names'] if 'file_system_names' in instance_dict else None,
-            hostname=instance_dict['hostname'] if 'hostname' in instance_dict else None,
-            jupyter_token=instance_dict['jupyter_token'] if 'jupyter_token' in instance_dict else None,
-            jupyter_url=instance_dict['jupyter_url'] if 'jupyter_url' in instance_dict else None
-        )
-        return instance
+        with self._http_client.tracer.span('model.build', item_count=1):
+            return _instance_from_dict(instance_dict['data'])
 
+    @traced
     def launch(self,
                region_name: str,
                instance_type_name: str,
@@ -251,12 +334,27 @@ class InstancesService:
             "quantity": quantity,
             "name": name
         }
-        instance_ids = self._http_client.post('/instance-operations/launch', json=payload).json()
+        instance_ids = self._http_client.decode(self._http_client.post('/instance-operations/launch', json=payload))
 
         if 'data' in instance_ids and 'instance_ids' in instance_ids['data']:
+            if self._cache is not None:
+                for id in instance_ids['data']['instance_ids']:
+                    self._cache.put(Instance(id=id,
+                                             region={'name': region_name},
+                                             ip=None,
+                                             instance_type=InstanceType(instance_type_name,
+                                                                        None, None, None, None, None, None),
+                                             status='booting',
+                                             ssh_key_names=ssh_key_names,
+                                             file_system_names=file_system_names,
+                                             hostname=None,
+                                             jupyter_token=None,
+                                             jupyter_url=None,
+                                             name=name), optimistic=True)
             return instance_ids['data']['instance_ids']
         return None
 
+    @traced
     def terminate(self, instance_ids: Union[List[str], str]) -> List[str]:
         """Terminate a list of instances / single instance
 
@@ -267,12 +365,14 @@ class InstancesService:
             instance_ids = [instance_ids]
 
         payload = {"instance_ids": instance_ids}
-        instance_ids = self._http_client.post('/instance-operations/terminate', json=payload).json()
+        instance_ids = self._http_client.decode(self._http_client.post('/instance-operations/terminate', json=payload))
+        self._update_cached_status(payload['instance_ids'], 'terminating')
 
         if 'data' in instance_ids and 'terminated_instances' in instance_ids['data']:
             return instance_ids['data']['terminated_instances']
         return None
 
+    @traced
     def restart(self, instance_ids: Union[List[str], str]) -> List[str]:
         """Restart a list of instances / single instance
 
@@ -283,8 +383,24 @@ class InstancesService:
             instance_ids = [instance_ids]
 
         payload = {"instance_ids": instance_ids}
-        instance_ids = self._http_client.post('/instance-operations/restart', json=payload).json()
+        instance_ids = self._http_client.decode(self._http_client.post('/instance-operations/restart', json=payload))
+        self._update_cached_status(payload['instance_ids'], 'booting')
 
         if 'data' in instance_ids and 'restarted_instances' in instance_ids['data']:
             return instance_ids['data']['restarted_instances']
         return None
+
+    def _update_cached_status(self, instance_ids: List[str], status: str) -> None:
+        """Optimistically set the status of cached instances
+
+        :param instance_ids: list of instance ids
+        :type instance_ids: List[str]
+        :param status: the expected status
+        :type status: str
+        """
+        if self._cache is None:
+            return
+        for id in instance_ids:
+            instance, _ = self._cache.get(id)
+            if instance is not None:
+                self._cache.put(_with_status(instance, status), optimistic=True)
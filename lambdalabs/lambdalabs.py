@@ -1,23 +1,134 @@
+import requests
+
 from lambdalabs.http_client.http_client import HTTPClient
+from lambdalabs.http_client.circuit_breaker import CircuitBreaker
+from lambdalabs.http_client.rate_limiter import RateLimiter
+from lambdalabs.http_client.transport import Transport
+from lambdalabs.http_client.compression import CompressionMetrics
 from lambdalabs.instance_types.instance_types import InstanceTypesService
 from lambdalabs.instances.instances import InstancesService
+from lambdalabs.instances.instance_cache import InstanceCache
 from lambdalabs.ssh_keys.ssh_keys import SSHKeysService
 from lambdalabs.file_systems.file_systems import FileSystemsService
+from lambdalabs.refresher.refresher import Refresher
+from lambdalabs.tracing.tracing import Tracer
 
 
 class LambdaLabsClient:
     """Client for interacting with Lambda Labs's public API"""
 
-    def __init__(self, api_key: str, base_url: str = "https://cloud.lambdalabs.com/api/v1") -> None:
+    def __init__(self,
+                 api_key: str,
+                 base_url: str = "https://cloud.lambdalabs.com/api/v1",
+                 circuit_breaker: CircuitBreaker = None,
+                 cache_responses: bool = False,
+                 session: requests.Session = None,
+                 rate_limiter: RateLimiter = None,
+                 instance_cache: InstanceCache = None,
+                 transport: Transport = None,
+                 tracer: Tracer = None,
+                 compress_requests_over: int = None
+                 ) -> None:
         """The Lambda Labs client
 
         :param api_key: API key
         :type api_key: str
         :param base_url: base url for all the endpoints, optional, defaults to "https://cloud.lambdalabs.com/api/v1"
         :type base_url: str, optional
+        :param circuit_breaker: circuit breaker guarding every endpoint, defaults to None (disabled)
+        :type circuit_breaker: CircuitBreaker, optional
+        :param cache_responses: serve the last successful GET response while an endpoint's circuit is open,
+                defaults to False
+        :type cache_responses: bool, optional
+        :param session: requests session shared with other clients, defaults to None
+        :type session: requests.Session, optional
+        :param rate_limiter: rate limiter shared with other clients, defaults to None
+        :type rate_limiter: RateLimiter, optional
+        :param instance_cache: instance-state cache kept up to date by launch, terminate and restart,
+                and serving instances.get_by_id(), defaults to None (disabled)
+        :type instance_cache: InstanceCache, optional
+        :param transport: transport sending the requests, e.g. a RecordingTransport or ReplayTransport,
+                defaults to None
+        :type transport: Transport, optional
+        :param tracer: tracer creating spans around every operation, e.g. an OpenTelemetryTracer,
+                defaults to None (no tracing)
+        :type tracer: Tracer, optional
+        :param compress_requests_over: gzip JSON request bodies of at least this many bytes,
+                defaults to None (never)
+        :type compress_requests_over: int, optional
         """
-        self._http_client: HTTPClient = HTTPClient(api_key, base_url=base_url)
+        self._instance_cache = instance_cache
+        self._http_client: HTTPClient = HTTPClient(api_key,
+                                                   base_url=base_url,
+                                                   circuit_breaker=circuit_breaker,
+                                                   cache_responses=cache_responses,
+                                                   session=session,
+                                                   rate_limiter=rate_limiter,
+                                                   transport=transport,
+                                                   tracer=tracer,
+                                                   compress_requests_over=compress_requests_over)
         self.instance_types: InstanceTypesService = InstanceTypesService(self._http_client)
-        self.instances: InstancesService = InstancesService(self._http_client)
+        self.instances: InstancesService = InstancesService(self._http_client, cache=instance_cache)
         self.ssh_keys: SSHKeysService = SSHKeysService(self._http_client)
         self.file_systems: FileSystemsService = FileSystemsService(self._http_client)
+        self.refresher: Refresher = None
+
+    @property
+    def compression_metrics(self) -> CompressionMetrics:
+        """Get the wire and decoded response sizes of every endpoint
+
+        :return: compression metrics
+        :rtype: CompressionMetrics
+        """
+        return self._http_client.compression_metrics
+
+    def start_refresher(self,
+                        instances: float = 15.0,
+                        instance_types: float = 60.0,
+                        ssh_keys: float = 300.0,
+                        file_systems: float = 300.0,
+                        jitter: float = 0.1
+                        ) -> Refresher:
+        """Start refreshing the instances, instance types, ssh-keys and file systems in the background.
+
+        Afterwards `refresher.get('instances')` and friends return the latest
+        snapshot from memory instead of calling the API. Pass None as the
+        interval of a resource to not refresh it.
+
+        :param instances: instances refresh interval in seconds, defaults to 15.0
+        :type instances: float, optional
+        :param instance_types: instance types refresh interval in seconds, defaults to 60.0
+        :type instance_types: float, optional
+        :param ssh_keys: ssh-keys refresh interval in seconds, defaults to 300.0
+        :type ssh_keys: float, optional
+        :param file_systems: file systems refresh interval in seconds, defaults to 300.0
+        :type file_systems: float, optional
+        :param jitter: relative random variation of every interval, defaults to 0.1
+        :type jitter: float, optional
+        :return: the started refresher
+        :rtype: Refresher
+        """
+        if self.refresher is not None:
+            self.refresher.stop()
+
+        self.refresher = Refresher(jitter=jitter)
+        resources = {
+            'instances': (self.instances.get, instances),
+            'instance_types': (self.instance_types.get, instance_types),
+            'ssh_keys': (self.ssh_keys.get, ssh_keys),
+            'file_systems': (self.file_systems.get, file_systems),
+        }
+        for name, (fetch, interval) in resources.items():
+            if interval is not None:
+                self.refresher.add(name, fetch, interval)
+        self.refresher.start()
+        return self.refresher
+
+    def close(self) -> None:
+        """Stop the background refresher and the instance cache workers, and close the transport"""
+        if self.refresher is not None:
+            self.refresher.stop()
+            self.refresher = None
+        if self._instance_cache is not None:
+            self._instance_cache.close()
+        self._http_client.close()
@@ -0,0 +1,545 @@
+import contextlib
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterator, List
+
+from lambdalabs.exceptions import APIException, CircuitOpenException
+from lambdalabs.instances.instances import Instance, InstancesService
+from lambdalabs.instances.instance_index import InstanceList
+
+
+PENDING = 'pending'
+COMMITTED = 'committed'
+FAILED = 'failed'
+TERMINATED = 'terminated'
+
+# instances in these statuses are gone or going, they are never adopted
+GONE_STATUSES = {'terminating', 'terminated'}
+
+# seconds after which a pending launch with no listed instance is considered to have created none
+GRACE_PERIOD = 600.0
+
+
+def new_client_token() -> str:
+    """Generate a client token identifying one launch
+
+    :return: 16 hex characters
+    :rtype: str
+    """
+    return uuid.uuid4().hex[:16]
+
+
+def tagged_name(name: str, client_token: str) -> str:
+    """Embed a client token in an instance name
+
+    :param name: user-provided instance name
+    :type name: str
+    :param client_token: client token of the launch
+    :type client_token: str
+    :return: the name the instances are launched with
+    :rtype: str
+    """
+    return f'{name}-{client_token}' if name else client_token
+
+
+def _fsync_directory(path: str) -> None:
+    """Flush the directory entry of a file, so that creating or replacing it survives a crash"""
+    directory = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+
+class LaunchPendingError(Exception):
+    """Raised when a launch is retried while an earlier attempt with the same
+    client token may still create instances. `recover()` resolves the launch.
+    """
+
+    def __init__(self, client_token: str) -> None:
+        """
+        Initialize a LaunchPendingError object
+
+        :param client_token: client token of the launch
+        :type client_token: str
+        """
+        super().__init__(f'launch {client_token} is pending and none of its instances are listed yet')
+        self.client_token = client_token
+
+
+class JournalEntry:
+    """The latest state of a launch recorded in the journal"""
+
+    def __init__(self,
+                 client_token: str,
+                 status: str,
+                 name: str,
+                 parameters: Dict[str, Any],
+                 instance_ids: List[str],
+                 timestamp: float
+                 ) -> None:
+        """Initialize the journal entry object
+
+        :param client_token: client token of the launch
+        :type client_token: str
+        :param status: 'pending', 'committed', 'failed' or 'terminated'
+        :type status: str
+        :param name: the name the instances are launched with, including the client token
+        :type name: str
+        :param parameters: launch parameters
+        :type parameters: Dict[str, Any]
+        :param instance_ids: ids of the launched instances, None while pending
+        :type instance_ids: List[str]
+        :param timestamp: unix time of the latest record
+        :type timestamp: float
+        """
+        self._client_token = client_token
+        self._status = status
+        self._name = name
+        self._parameters = parameters
+        self._instance_ids = instance_ids
+        self._timestamp = timestamp
+
+    @property
+    def client_token(self) -> str:
+        """Get the client token
+
+        :return: client token
+        :rtype: str
+        """
+        return self._client_token
+
+    @property
+    def status(self) -> str:
+        """Get the status of the launch
+
+        :return: 'pending', 'committed', 'failed' or 'terminated'
+        :rtype: str
+        """
+        return self._status
+
+    @property
+    def name(self) -> str:
+        """Get the name the instances are launched with
+
+        :return: instance name, including the client token
+        :rtype: str
+        """
+        return self._name
+
+    @property
+    def parameters(self) -> Dict[str, Any]:
+        """Get the launch parameters
+
+        :return: region_name, instance_type_name, ssh_key_names, file_system_names and quantity
+        :rtype: Dict[str, Any]
+        """
+        return self._parameters
+
+    @property
+    def instance_ids(self) -> List[str]:
+        """Get the ids of the launched instances
+
+        :return: instance ids, None while pending
+        :rtype: List[str]
+        """
+        return self._instance_ids
+
+    @property
+    def timestamp(self) -> float:
+        """Get the time of the latest record
+
+        :return: unix time
+        :rtype: float
+        """
+        return self._timestamp
+
+    def __str__(self) -> str:
+        """Print the journal entry
+
+        :return: journal entry string representation
+        :rtype: str
+        """
+        return (f'client_token: {self._client_token}\n'
+                f'status: {self._status}\n'
+                f'name: {self._name}\n'
+                f'instance_ids: {self._instance_ids}\n'
+                )
+
+
+class LaunchJournal:
+    """An append-only journal of launches, one JSON record per line.
+
+    Every record is fsync'd before `append()` returns, so a launch is on
+    disk as pending before the API is called. A truncated last line, left
+    by a crash mid-write, is dropped when the journal is opened; a corrupt
+    line anywhere else is an error.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Open or create the launch journal
+
+        :param path: path of the journal file
+        :type path: str
+        :raises ValueError: if a complete line of the journal is corrupt
+        """
+        self._path = path
+        self._entries: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+        valid_size = 0
+        created = not os.path.exists(path)
+        if not created:
+            with open(path, 'rb') as journal_file:
+                for number, line in enumerate(journal_file, 1):
+                    if not line.endswith(b'\n'):
+                        # the last line, cut off by a crash mid-write
+                        break
+                    try:
+                        record = json.loads(line)
+                        self._entries.setdefault(record['client_token'], {}).update(record)
+                    except (ValueError, KeyError, TypeError, AttributeError):
+                        raise ValueError(f'corrupt launch journal {path} at line {number}')
+                    valid_size += len(line)
+        self._file = open(path, 'ab')
+        self._file.truncate(valid_size)
+        if created:
+            _fsync_directory(path)
+
+    @property
+    def path(self) -> str:
+        """Get the path of the journal file
+
+        :return: path of the journal file
+        :rtype: str
+        """
+        return self._path
+
+    def append(self, client_token: str, status: str, **fields) -> JournalEntry:
+        """Record a state of a launch and flush it to disk
+
+        :param client_token: client token of the launch
+        :type client_token: str
+        :param status: 'pending', 'committed', 'failed' or 'terminated'
+        :type status: str
+        :return: the updated entry
+        :rtype: JournalEntry
+        """
+        record = dict(fields, client_token=client_token, status=status, timestamp=time.time())
+        line = json.dumps(record).encode('utf-8') + b'\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            entry = self._entries.setdefault(client_token, {})
+            entry.update(record)
+            return self._entry(entry)
+
+    def get(self, client_token: str) -> JournalEntry:
+        """Get the latest state of a launch
+
+        :param client_token: client token of the launch
+        :type client_token: str
+        :return: the entry, or None
+        :rtype: JournalEntry
+        """
+        with self._lock:
+            entry = self._entries.get(client_token)
+            return self._entry(entry) if entry is not None else None
+
+    def entries(self, status: str = None) -> List[JournalEntry]:
+        """Get the latest state of every launch
+
+        :param status: only entries with this status, defaults to None (all)
+        :type status: str, optional
+        :return: entries, in the order of their first record
+        :rtype: List[JournalEntry]
+        """
+        with self._lock:
+            return [self._entry(entry) for entry in self._entries.values()
+                    if status is None or entry['status'] == status]
+
+    def compact(self) -> None:
+        """Rewrite the journal with only the pending launches
+
+        Retrying a finished launch after compaction launches it again.
+        """
+        with self._lock:
+            self._entries = {token: entry for token, entry in self._entries.items() if entry['status'] == PENDING}
+            temporary_path = self._path + '.tmp'
+            with open(temporary_path, 'wb') as journal_file:
+                for entry in self._entries.values():
+                    journal_file.write(json.dumps(entry).encode('utf-8') + b'\n')
+                journal_file.flush()
+                os.fsync(journal_file.fileno())
+            self._file.close()
+            os.replace(temporary_path, self._path)
+            _fsync_directory(self._path)
+            self._file = open(self._path, 'ab')
+
+    def close(self) -> None:
+        """Close the journal file"""
+        self._file.close()
+
+    def _entry(self, entry: dict) -> JournalEntry:
+        return JournalEntry(entry['client_token'], entry['status'], entry.get('name'),
+                            entry.get('parameters'), entry.get('instance_ids'), entry['timestamp'])
+
+
+class RecoveryResult:
+    """The outcome of reconciling pending launches with the instances list"""
+
+    def __init__(self,
+                 adopted: Dict[str, List[str]],
+                 terminated: List[str],
+                 missing: List[str],
+                 waiting: List[str]
+                 ) -> None:
+        """Initialize the recovery result object
+
+        :param adopted: ids of the adopted instances, keyed by client token
+        :type adopted: Dict[str, List[str]]
+        :param terminated: ids of the terminated orphans
+        :type terminated: List[str]
+        :param missing: client tokens of the launches that created no instance within the grace period
+        :type missing: List[str]
+        :param waiting: client tokens of the launches with no listed instance yet, left pending
+        :type waiting: List[str]
+        """
+        self._adopted = adopted
+        self._terminated = terminated
+        self._missing = missing
+        self._waiting = waiting
+
+    @property
+    def adopted(self) -> Dict[str, List[str]]:
+        """Get the adopted instances
+
+        :return: instance ids keyed by client token
+        :rtype: Dict[str, List[str]]
+        """
+        return self._adopted
+
+    @property
+    def terminated(self) -> List[str]:
+        """Get the terminated orphans
+
+        :return: instance ids
+        :rtype: List[str]
+        """
+        return self._terminated
+
+    @property
+    def missing(self) -> List[str]:
+        """Get the launches that created no instance within the grace period, journaled as failed
+
+        :return: client tokens
+        :rtype: List[str]
+        """
+        return self._missing
+
+    @property
+    def waiting(self) -> List[str]:
+        """Get the launches with no listed instance yet, still pending
+
+        :return: client tokens
+        :rtype: List[str]
+        """
+        return self._waiting
+
+    def __str__(self) -> str:
+        """Print the recovery result
+
+        :return: recovery result string representation
+        :rtype: str
+        """
+        return (f'adopted: {self._adopted}\n'
+                f'terminated: {self._terminated}\n'
+                f'missing: {self._missing}\n'
+                f'waiting: {self._waiting}\n'
+                )
+
+
+class IdempotentLauncher:
+    """Launches instances at most once per client token.
+
+    The client token is embedded in the instance name and the launch is
+    journaled as pending before, and as committed after the API call. A
+    launch retried with the same token returns the instances of the first
+    attempt, launches with the same token are serialized within a process.
+    After a crash or a timeout, `recover()` finds the instances of pending
+    launches by name in a single instances list call, and adopts them or
+    terminates them in a single terminate call. A launch with no listed
+    instance stays pending for a grace period, since instances show up in
+    the list some time after the launch call.
+    """
+
+    def __init__(self, instances_service: InstancesService, journal: LaunchJournal) -> None:
+        """Initialize the idempotent launcher
+
+        :param instances_service: service used to launch, list and terminate the instances
+        :type instances_service: InstancesService
+        :param journal: journal of the launches
+        :type journal: LaunchJournal
+        """
+        self._instances_service = instances_service
+        self._journal = journal
+        self._token_locks: Dict[str, list] = {}
+        self._token_locks_lock = threading.Lock()
+
+    def launch(self,
+               region_name: str,
+               instance_type_name: str,
+               ssh_key_names: List[str],
+               file_system_names: List[str] = [],
+               quantity: int = 1,
+               name: str = "",
+               client_token: str = None) -> List[str]:
+        """Launch instances, unless the launch with this client token already happened
+
+        :param region_name: short name of a region
+        :type region_name: str
+        :param instance_type_name: name of an instance type
+        :type instance_type_name: str
+        :param ssh_key_names: names of the SSH keys to allow access to the instances
+        :type ssh_key_names: List[str]
+        :param file_system_names: names of the file systems to attach to the instances
+        :type file_system_names: List[str], optional
+        :param quantity: number of instances to launch
+        :type quantity: int, optional
+        :param name: user-provided name for the instances, the client token is appended to it
+        :type name: str, optional
+        :param client_token: identifies the launch across retries, defaults to None (a new token)
+        :type client_token: str, optional
+        :raises APIException: if the launch call fails, a rejected launch is journaled as failed
+        :raises LaunchPendingError: if an earlier attempt is pending and none of its instances are listed
+        :return: ids of the launched instances
+        :rtype: List[str]
+        """
+        client_token = client_token or new_client_token()
+        with self._token_lock(client_token):
+            return self._launch(client_token, region_name, instance_type_name, ssh_key_names,
+                                file_system_names, quantity, name)
+
+    def _launch(self,
+                client_token: str,
+                region_name: str,
+                instance_type_name: str,
+                ssh_key_names: List[str],
+                file_system_names: List[str],
+                quantity: int,
+                name: str) -> List[str]:
+        entry = self._journal.get(client_token)
+        if entry is not None and entry.status == COMMITTED:
+            return entry.instance_ids
+        if entry is not None and entry.status in (PENDING, FAILED):
+            # an earlier attempt may have created the instances, even one failed by recover() after the grace period
+            instances = self._live_instances(self._instances_service.get(), entry.name)
+            if instances:
+                instance_ids = [instance.id for instance in instances]
+                return self._journal.append(client_token, COMMITTED, instance_ids=instance_ids).instance_ids
+            if entry.status == PENDING:
+                raise LaunchPendingError(client_token)
+
+        full_name = tagged_name(name, client_token)
+        parameters = {
+            'region_name': region_name,
+            'instance_type_name': instance_type_name,
+            'ssh_key_names': ssh_key_names,
+            'file_system_names': file_system_names,
+            'quantity': quantity,
+        }
+        self._journal.append(client_token, PENDING, name=full_name, parameters=parameters, instance_ids=None)
+        try:
+            instance_ids = self._instances_service.launch(name=full_name, **parameters)
+        except CircuitOpenException:
+            self._journal.append(client_token, FAILED)
+            raise
+        except APIException as e:
+            # a rejected launch created nothing, after a server error it may have
+            if e.status_code is not None and e.status_code < 500:
+                self._journal.append(client_token, FAILED)
+            raise
+        # any other error leaves the launch pending, for recover() to reconcile
+        self._journal.append(client_token, COMMITTED, instance_ids=instance_ids)
+        return instance_ids
+
+    def recover(self, adopt: bool = True, grace_period: float = GRACE_PERIOD) -> RecoveryResult:
+        """Reconcile the pending launches with the instances list
+
+        Launches in flight in this process are skipped. Instances may show up
+        in the list only some time after the launch call, so a launch with no
+        listed instance stays pending, and is journaled as failed only once it
+        is older than `grace_period`.
+
+        :param adopt: journal found instances as launched, otherwise terminate them, defaults to True
+        :type adopt: bool, optional
+        :param grace_period: seconds a launch may have no listed instance and stay pending, defaults to GRACE_PERIOD
+        :type grace_period: float, optional
+        :return: the adopted and terminated instances, and the launches that created none or none yet
+        :rtype: RecoveryResult
+        """
+        with contextlib.ExitStack() as stack:
+            pending = []
+            for entry in self._journal.entries(PENDING):
+                if stack.enter_context(self._token_lock(entry.client_token, blocking=False)):
+                    # re-read, the launch may have finished while waiting for the lock
+                    entry = self._journal.get(entry.client_token)
+                    if entry.status == PENDING:
+                        pending.append(entry)
+            return self._recover(pending, adopt, grace_period)
+
+    def _recover(self, pending: List[JournalEntry], adopt: bool, grace_period: float) -> RecoveryResult:
+        if not pending:
+            return RecoveryResult({}, [], [], [])
+
+        snapshot = self._instances_service.get()
+        now = time.time()
+        adopted = {}
+        orphans = {}
+        missing = []
+        waiting = []
+        for entry in pending:
+            instance_ids = [instance.id for instance in self._live_instances(snapshot, entry.name)]
+            if instance_ids and adopt:
+                adopted[entry.client_token] = instance_ids
+            elif instance_ids:
+                orphans[entry.client_token] = instance_ids
+            elif now - entry.timestamp >= grace_period:
+                missing.append(entry.client_token)
+            else:
+                waiting.append(entry.client_token)
+
+        terminated = [id for instance_ids in orphans.values() for id in instance_ids]
+        if terminated:
+            self._instances_service.terminate(terminated)
+        for client_token, instance_ids in adopted.items():
+            self._journal.append(client_token, COMMITTED, instance_ids=instance_ids)
+        for client_token, instance_ids in orphans.items():
+            self._journal.append(client_token, TERMINATED, instance_ids=instance_ids)
+        for client_token in missing:
+            self._journal.append(client_token, FAILED)
+        return RecoveryResult(adopted, terminated, missing, waiting)
+
+    @contextlib.contextmanager
+    def _token_lock(self, client_token: str, blocking: bool = True) -> Iterator[bool]:
+        """Hold the lock of a client token, yields whether it was acquired"""
+        with self._token_locks_lock:
+            holder = self._token_locks.setdefault(client_token, [threading.Lock(), 0])
+            holder[1] += 1
+        acquired = holder[0].acquire(blocking)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                holder[0].release()
+            with self._token_locks_lock:
+                holder[1] -= 1
+                if holder[1] == 0:
+                    del self._token_locks[client_token]
+
+    def _live_instances(self, snapshot: InstanceList, name: str) -> List[Instance]:
+        return [instance for instance in snapshot.by_name(name) if instance.status not in GONE_STATUSES]
@@ -0,0 +1,456 @@
+import bisect
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+import requests
+
+from lambdalabs.instances.instances import Instance, InstancesService
+from lambdalabs.instances.instance_index import InstanceList
+
+
+LAUNCH = 'launch'
+ACTIVE = 'active'
+REACHABLE = 'reachable'
+JUPYTER = 'jupyter'
+TOTAL = 'total'
+
+# an instance in one of these statuses never becomes active
+FAILED_STATUSES = {'unhealthy', 'terminating', 'terminated'}
+
+# upper bounds of the histogram buckets, in seconds
+BUCKET_BOUNDS = (1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1200.0, float('inf'))
+
+
+class StageHistogram:
+    """The durations of a pipeline stage"""
+
+    def __init__(self, durations: List[float] = None) -> None:
+        """Initialize the stage histogram object
+
+        :param durations: durations in seconds, defaults to None
+        :type durations: List[float], optional
+        """
+        self._durations = sorted(durations or [])
+
+    @property
+    def count(self) -> int:
+        """Get the number of instances that completed the stage
+
+        :return: number of durations
+        :rtype: int
+        """
+        return len(self._durations)
+
+    @property
+    def min(self) -> float:
+        """Get the shortest duration
+
+        :return: shortest duration in seconds, None without durations
+        :rtype: float
+        """
+        return self._durations[0] if self._durations else None
+
+    @property
+    def max(self) -> float:
+        """Get the longest duration
+
+        :return: longest duration in seconds, None without durations
+        :rtype: float
+        """
+        return self._durations[-1] if self._durations else None
+
+    @property
+    def mean(self) -> float:
+        """Get the mean duration
+
+        :return: mean duration in seconds, None without durations
+        :rtype: float
+        """
+        return sum(self._durations) / len(self._durations) if self._durations else None
+
+    @property
+    def buckets(self) -> List[Tuple[float, int]]:
+        """Get the number of durations per bucket
+
+        :return: (upper bound in seconds, number of durations) of every bucket
+        :rtype: List[Tuple[float, int]]
+        """
+        counts = [0] * len(BUCKET_BOUNDS)
+        for duration in self._durations:
+            counts[bisect.bisect_left(BUCKET_BOUNDS, duration)] += 1
+        return list(zip(BUCKET_BOUNDS, counts))
+
+    def percentile(self, percent: float) -> float:
+        """Get a percentile of the durations
+
+        :param percent: percentile, between 0 and 100
+        :type percent: float
+        :return: duration in seconds, None without durations
+        :rtype: float
+        """
+        if not self._durations:
+            return None
+        index = min(len(self._durations) - 1, int(len(self._durations) * percent / 100))
+        return self._durations[index]
+
+    def __str__(self) -> str:
+        """Print the stage histogram
+
+        :return: stage histogram string representation
+        :rtype: str
+        """
+        if not self._durations:
+            return 'count: 0\n'
+        return (f'count: {self.count}\n'
+                f'min: {self.min:.2f}\n'
+                f'p50: {self.percentile(50):.2f}\n'
+                f'p90: {self.percentile(90):.2f}\n'
+                f'p99: {self.percentile(99):.2f}\n'
+                f'max: {self.max:.2f}\n'
+                )
+
+
+class LaunchResult:
+    """How far an instance got through the launch pipeline"""
+
+    def __init__(self,
+                 instance_id: str,
+                 instance: Instance,
+                 stage: str,
+                 durations: Dict[str, float],
+                 error: Exception = None
+                 ) -> None:
+        """Initialize the launch result object
+
+        :param instance_id: instance id
+        :type instance_id: str
+        :param instance: the instance as last seen, None if it never showed up
+        :type instance: Instance
+        :param stage: the last completed stage
+        :type stage: str
+        :param durations: seconds spent in every completed stage
+        :type durations: Dict[str, float]
+        :param error: the error that stopped the instance in the next stage, defaults to None
+        :type error: Exception, optional
+        """
+        self._instance_id = instance_id
+        self._instance = instance
+        self._stage = stage
+        self._durations = durations
+        self._error = error
+
+    @property
+    def instance_id(self) -> str:
+        """Get the instance id
+
+        :return: instance id
+        :rtype: str
+        """
+        return self._instance_id
+
+    @property
+    def instance(self) -> Instance:
+        """Get the instance as last seen by the pipeline
+
+        :return: instance, None if it never showed up in the instances list
+        :rtype: Instance
+        """
+        return self._instance
+
+    @property
+    def stage(self) -> str:
+        """Get the last completed stage
+
+        :return: stage name
+        :rtype: str
+        """
+        return self._stage
+
+    @property
+    def durations(self) -> Dict[str, float]:
+        """Get the time spent in every completed stage
+
+        :return: seconds keyed by stage name
+        :rtype: Dict[str, float]
+        """
+        return self._durations
+
+    @property
+    def duration(self) -> float:
+        """Get the time spent in the pipeline
+
+        :return: seconds from the launch request to the last completed stage
+        :rtype: float
+        """
+        return sum(self._durations.values())
+
+    @property
+    def error(self) -> Exception:
+        """Get the error that stopped the instance
+
+        :return: the error, None if the instance went through every stage
+        :rtype: Exception
+        """
+        return self._error
+
+    @property
+    def ok(self) -> bool:
+        """Get whether the instance went through every stage
+
+        :return: True if no stage failed
+        :rtype: bool
+        """
+        return self._error is None
+
+    def __str__(self) -> str:
+        """Print the launch result
+
+        :return: launch result string representation
+        :rtype: str
+        """
+        return (f'instance_id: {self._instance_id}\n'
+                f'stage: {self._stage}\n'
+                f'duration: {self.duration:.2f}\n'
+                f'error: {self._error}\n'
+                )
+
+
+class LaunchPipeline:
+    """Brings launched instances up to usable, each one independently.
+
+    Every instance goes through the stages launch, active (status active
+    with an ip address), reachable (the TCP ports accept connections),
+    optionally jupyter (`jupyter_url` answers), then the hooks in the order
+    they were added. All instances wait for active together, with a single
+    `/instances` call per poll, and every instance is handed to a worker
+    for its probes and hooks as soon as it is active; a slow or failed
+    instance doesn't hold up the others. Stages are timed back to back, so
+    the time an instance queues for a worker counts towards its reachable
+    stage. The durations are collected into histograms across runs.
+    """
+
+    def __init__(self,
+                 instances_service: InstancesService,
+                 max_workers: int = 16,
+                 poll_interval: float = 5.0,
+                 active_timeout: float = 1200.0,
+                 reachable_timeout: float = 300.0,
+                 ports: List[int] = [22],
+                 probe_jupyter: bool = False,
+                 connect_timeout: float = 3.0,
+                 on_stage: Callable[[str, str, float], None] = None
+                 ) -> None:
+        """Initialize the launch pipeline
+
+        :param instances_service: service used to launch and poll the instances
+        :type instances_service: InstancesService
+        :param max_workers: maximum number of instances probed or running hooks concurrently, defaults to 16
+        :type max_workers: int, optional
+        :param poll_interval: seconds between two instances list calls, defaults to 5.0
+        :type poll_interval: float, optional
+        :param active_timeout: seconds to wait for an instance to become active, defaults to 1200.0
+        :type active_timeout: float, optional
+        :param reachable_timeout: seconds to wait for the ports and jupyter to answer, defaults to 300.0
+        :type reachable_timeout: float, optional
+        :param ports: TCP ports that must accept connections, defaults to [22]
+        :type ports: List[int], optional
+        :param probe_jupyter: wait for `jupyter_url` to answer, defaults to False
+        :type probe_jupyter: bool, optional
+        :param connect_timeout: timeout of a single probe in seconds, defaults to 3.0
+        :type connect_timeout: float, optional
+        :param on_stage: called with (instance id, stage, seconds) when an instance completes a stage, defaults to None
+        :type on_stage: Callable[[str, str, float], None], optional
+        """
+        self._instances_service = instances_service
+        self._max_workers = max_workers
+        self._active_timeout = active_timeout
+        self._reachable_timeout = reachable_timeout
+        self._ports = list(ports)
+        self._probe_jupyter = probe_jupyter
+        self._connect_timeout = connect_timeout
+        self._on_stage = on_stage
+        self._poll_interval = poll_interval
+        self._hooks: List[Tuple[str, Callable[[Instance], Any]]] = []
+        self._durations: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook: Callable[[Instance], Any], name: str = None) -> None:
+        """Add a stage that runs after the instance is reachable
+
+        :param hook: called with the instance, a raised exception fails the instance
+        :type hook: Callable[[Instance], Any]
+        :param name: stage name, defaults to None (the hook's function name)
+        :type name: str, optional
+        """
+        self._hooks.append((name or hook.__name__, hook))
+
+    def run(self,
+            region_name: str,
+            instance_type_name: str,
+            ssh_key_names: List[str],
+            file_system_names: List[str] = [],
+            quantity: int = 1,
+            name: str = "") -> List[LaunchResult]:
+        """Launch instances and bring every one of them through the stages
+
+        :param region_name: short name of a region
+        :type region_name: str
+        :param instance_type_name: name of an instance type
+        :type instance_type_name: str
+        :param ssh_key_names: names of the SSH keys to allow access to the instances
+        :type ssh_key_names: List[str]
+        :param file_system_names: names of the file systems to attach to the instances
+        :type file_system_names: List[str], optional
+        :param quantity: number of instances to launch
+        :type quantity: int, optional
+        :param name: user-provided name for the instances
+        :type name: str, optional
+        :raises APIException: if the launch call fails
+        :return: result of every instance, in launch order
+        :rtype: List[LaunchResult]
+        """
+        start = time.monotonic()
+        instance_ids = self._instances_service.launch(region_name=region_name,
+                                                      instance_type_name=instance_type_name,
+                                                      ssh_key_names=ssh_key_names,
+                                                      file_system_names=file_system_names,
+                                                      quantity=quantity,
+                                                      name=name) or []
+        launch_duration = time.monotonic() - start
+        return self._bring_up(instance_ids, {LAUNCH: launch_duration})
+
+    def bring_up(self, instance_ids: List[str]) -> List[LaunchResult]:
+        """Bring already launched instances through the stages after launch
+
+        :param instance_ids: instance ids
+        :type instance_ids: List[str]
+        :return: result of every instance, in the order of `instance_ids`
+        :rtype: List[LaunchResult]
+        """
+        return self._bring_up(instance_ids, {})
+
+    def histograms(self) -> Dict[str, StageHistogram]:
+        """Get the durations of every stage, across all runs
+
+        :return: histograms keyed by stage name, plus 'total' for complete bring-ups
+        :rtype: Dict[str, StageHistogram]
+        """
+        with self._lock:
+            return {stage: StageHistogram(durations) for stage, durations in self._durations.items()}
+
+    def reset(self) -> None:
+        """Forget the collected durations"""
+        with self._lock:
+            self._durations.clear()
+
+    def _bring_up(self, instance_ids: List[str], durations: Dict[str, float]) -> List[LaunchResult]:
+        for stage, duration in durations.items():
+            for instance_id in instance_ids:
+                self._record(instance_id, stage, duration)
+
+        start = time.monotonic()
+        deadline = start + self._active_timeout
+        waiting = list(instance_ids)
+        results: Dict[str, LaunchResult] = {}
+        futures = {}
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            while waiting:
+                try:
+                    snapshot = self._instances_service.get()
+                except Exception:
+                    # keep waiting, the next poll retries
+                    snapshot = InstanceList()
+                now = time.monotonic()
+                for instance_id in list(waiting):
+                    instance = snapshot.by_id(instance_id)
+                    if instance is None:
+                        continue
+                    if instance.status == 'active' and instance.ip:
+                        waiting.remove(instance_id)
+                        instance_durations = {**durations, ACTIVE: now - start}
+                        self._record(instance_id, ACTIVE, now - start)
+                        futures[instance_id] = executor.submit(self._advance, instance, instance_durations, now)
+                    elif instance.status in FAILED_STATUSES:
+                        waiting.remove(instance_id)
+                        results[instance_id] = self._failed(instance_id, instance, durations,
+                                                            RuntimeError(f'instance {instance_id} is {instance.status}'))
+                if waiting and now >= deadline:
+                    for instance_id in waiting:
+                        error = TimeoutError(f'instance {instance_id} not active after {self._active_timeout:.0f}s')
+                        results[instance_id] = self._failed(instance_id, snapshot.by_id(instance_id), durations, error)
+                    break
+                if waiting:
+                    time.sleep(min(self._poll_interval, max(0.0, deadline - time.monotonic())))
+            for instance_id, future in futures.items():
+                results[instance_id] = future.result()
+        return [results[instance_id] for instance_id in instance_ids]
+
+    def _failed(self, instance_id: str, instance: Instance, durations: Dict[str, float],
+                error: Exception) -> LaunchResult:
+        """The result of an instance that never became active"""
+        return LaunchResult(instance_id, instance, LAUNCH if LAUNCH in durations else None, dict(durations), error)
+
+    def _advance(self, instance: Instance, durations: Dict[str, float], active_at: float) -> LaunchResult:
+        """Move an active instance through the stages after active"""
+        stage = ACTIVE
+        stages = [(REACHABLE, self._wait_reachable)]
+        if self._probe_jupyter:
+            stages.append((JUPYTER, self._wait_jupyter))
+        stages += self._hooks
+
+        stage_start = active_at
+        for next_stage, run_stage in stages:
+            try:
+                run_stage(instance)
+            except Exception as e:
+                return LaunchResult(instance.id, instance, stage, durations, e)
+            stage = next_stage
+            now = time.monotonic()
+            durations[stage] = now - stage_start
+            stage_start = now
+            self._record(instance.id, stage, durations[stage])
+
+        self._record(instance.id, TOTAL, sum(durations.values()))
+        return LaunchResult(instance.id, instance, stage, durations)
+
+    def _record(self, instance_id: str, stage: str, duration: float) -> None:
+        with self._lock:
+            self._durations.setdefault(stage, []).append(duration)
+        if self._on_stage is not None and stage != TOTAL:
+            self._on_stage(instance_id, stage, duration)
+
+    def _wait_reachable(self, instance: Instance) -> None:
+        """Wait until every port of the instance accepts TCP connections
+
+        :raises TimeoutError: if a port doesn't accept connections within the reachable timeout
+        """
+        deadline = time.monotonic() + self._reachable_timeout
+        for port in self._ports:
+            while True:
+                try:
+                    with socket.create_connection((instance.ip, port), timeout=self._connect_timeout):
+                        break
+                except OSError:
+                    if time.monotonic() >= deadline:
+                        raise TimeoutError(f'{instance.ip}:{port} not reachable after {self._reachable_timeout:.0f}s')
+                    time.sleep(1.0)
+
+    def _wait_jupyter(self, instance: Instance) -> None:
+        """Wait until the jupyter url of the instance answers
+
+        :raises TimeoutError: if jupyter doesn't answer within the reachable timeout
+        """
+        deadline = time.monotonic() + self._reachable_timeout
+        while True:
+            try:
+                if instance.jupyter_url and requests.get(instance.jupyter_url, timeout=self._connect_timeout,
+                                                         allow_redirects=False).status_code < 500:
+                    return
+            except requests.exceptions.RequestException:
+                pass
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f'jupyter of instance {instance.id} not reachable after {self._reachable_timeout:.0f}s')
+            time.sleep(2.0)
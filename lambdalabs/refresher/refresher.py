@@ -0,0 +1,169 @@
+import random
+import threading
+import time
+from typing import Any, Callable, Dict
+
+
+class Snapshot:
+    """A value fetched by the refresher and when it was fetched"""
+
+    def __init__(self, value: Any, fetched_at: float) -> None:
+        """Initialize the snapshot object
+
+        :param value: the fetched value
+        :type value: Any
+        :param fetched_at: fetch time, in seconds of `time.monotonic()`
+        :type fetched_at: float
+        """
+        self._value = value
+        self._fetched_at = fetched_at
+
+    @property
+    def value(self) -> Any:
+        """Get the fetched value
+
+        :return: fetched value
+        :rtype: Any
+        """
+        return self._value
+
+    @property
+    def age(self) -> float:
+        """Get the age of the snapshot
+
+        :return: seconds since the value was fetched
+        :rtype: float
+        """
+        return time.monotonic() - self._fetched_at
+
+
+class _RefreshTask:
+    """A value refreshed on its own thread"""
+
+    def __init__(self, name: str, fetch: Callable[[], Any], interval: float) -> None:
+        self.name = name
+        self.fetch = fetch
+        self.interval = interval
+        self.snapshot: Snapshot = None
+        self.error: Exception = None
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread: threading.Thread = None
+
+    def run_fetch(self) -> Snapshot:
+        with self.lock:
+            try:
+                self.snapshot = Snapshot(self.fetch(), time.monotonic())
+                self.error = None
+            except Exception as e:
+                self.error = e
+                raise
+            return self.snapshot
+
+
+class Refresher:
+    """Keeps snapshots of API resources warm on background threads.
+
+    Every resource is refreshed on its own thread and interval, with jitter
+    so that several clients don't refresh in lockstep. Reads return the
+    latest snapshot; a read of a snapshot older than its interval returns it
+    anyway and wakes the refresh thread (stale-while-revalidate).
+    """
+
+    def __init__(self, jitter: float = 0.1) -> None:
+        """Initialize the refresher
+
+        :param jitter: relative random variation of every interval, defaults to 0.1
+        :type jitter: float, optional
+        """
+        self._jitter = jitter
+        self._tasks: Dict[str, _RefreshTask] = {}
+        self._stop = threading.Event()
+
+    def add(self, name: str, fetch: Callable[[], Any], interval: float) -> None:
+        """Register a resource to refresh
+
+        :param name: resource name used for reads, e.g. 'instances'
+        :type name: str
+        :param fetch: function fetching the resource from the API
+        :type fetch: Callable[[], Any]
+        :param interval: refresh interval in seconds
+        :type interval: float
+        """
+        self._tasks[name] = _RefreshTask(name, fetch, interval)
+
+    def start(self) -> None:
+        """Start a refresh thread for every registered resource"""
+        self._stop.clear()
+        for task in self._tasks.values():
+            if task.thread is None or not task.thread.is_alive():
+                task.thread = threading.Thread(target=self._run, args=(task,),
+                                               name=f'lambdalabs-refresher-{task.name}', daemon=True)
+                task.thread.start()
+
+    def stop(self, timeout: float = None) -> None:
+        """Stop all refresh threads and wait for them to finish
+
+        :param timeout: seconds to wait for every thread, defaults to None (no limit)
+        :type timeout: float, optional
+        """
+        self._stop.set()
+        for task in self._tasks.values():
+            task.wake.set()
+        for task in self._tasks.values():
+            if task.thread is not None:
+                task.thread.join(timeout)
+                task.thread = None
+
+    def get(self, name: str, max_age: float = None) -> Any:
+        """Read the latest snapshot of a resource.
+
+        The first read blocks until the resource has been fetched once, and so
+        does a read whose snapshot is older than `max_age`.
+
+        :param name: resource name
+        :type name: str
+        :param max_age: maximum accepted age in seconds, defaults to None (any age)
+        :type max_age: float, optional
+        :raises APIException: if a blocking fetch fails
+        :return: the resource value
+        :rtype: Any
+        """
+        task = self._tasks[name]
+        snapshot = task.snapshot
+        if snapshot is None or (max_age is not None and snapshot.age > max_age):
+            return task.run_fetch().value
+        if snapshot.age > task.interval:
+            task.wake.set()
+        return snapshot.value
+
+    def snapshot(self, name: str) -> Snapshot:
+        """Get the latest snapshot of a resource without fetching it
+
+        :param name: resource name
+        :type name: str
+        :return: the latest snapshot, or None if it was not fetched yet
+        :rtype: Snapshot
+        """
+        return self._tasks[name].snapshot
+
+    def last_error(self, name: str) -> Exception:
+        """Get the error of the latest refresh of a resource
+
+        :param name: resource name
+        :type name: str
+        :return: the exception raised by the latest refresh, or None if it succeeded
+        :rtype: Exception
+        """
+        return self._tasks[name].error
+
+    def _run(self, task: _RefreshTask) -> None:
+        while not self._stop.is_set():
+            try:
+                task.run_fetch()
+            except Exception:
+                # keep serving the previous snapshot, the error is exposed by last_error()
+                pass
+            delay = task.interval * (1 + random.uniform(-self._jitter, self._jitter))
+            task.wake.wait(delay)
+            task.wake.clear()
@@ -0,0 +1,321 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Union
+
+from lambdalabs.instances.instances import Instance, InstancesService
+
+
+class SSHResult:
+    """The result of a command or file copy on one instance"""
+
+    def __init__(self,
+                 instance_id: str,
+                 host: str,
+                 exit_code: int,
+                 stdout: str,
+                 stderr: str,
+                 duration: float,
+                 timed_out: bool = False
+                 ) -> None:
+        """Initialize the ssh result object
+
+        :param instance_id: instance id
+        :type instance_id: str
+        :param host: instance ip address
+        :type host: str
+        :param exit_code: exit code of the ssh/scp process, None if it timed out
+        :type exit_code: int
+        :param stdout: standard output
+        :type stdout: str
+        :param stderr: standard error
+        :type stderr: str
+        :param duration: run time in seconds
+        :type duration: float
+        :param timed_out: the command was killed after the per-host timeout, defaults to False
+        :type timed_out: bool, optional
+        """
+        self._instance_id = instance_id
+        self._host = host
+        self._exit_code = exit_code
+        self._stdout = stdout
+        self._stderr = stderr
+        self._duration = duration
+        self._timed_out = timed_out
+
+    @property
+    def instance_id(self) -> str:
+        """Get the instance id
+
+        :return: instance id
+        :rtype: str
+        """
+        return self._instance_id
+
+    @property
+    def host(self) -> str:
+        """Get the instance ip address
+
+        :return: instance ip address
+        :rtype: str
+        """
+        return self._host
+
+    @property
+    def exit_code(self) -> int:
+        """Get the exit code
+
+        :return: exit code, None if the command timed out
+        :rtype: int
+        """
+        return self._exit_code
+
+    @property
+    def stdout(self) -> str:
+        """Get the standard output
+
+        :return: standard output
+        :rtype: str
+        """
+        return self._stdout
+
+    @property
+    def stderr(self) -> str:
+        """Get the standard error
+
+        :return: standard error
+        :rtype: str
+        """
+        return self._stderr
+
+    @property
+    def duration(self) -> float:
+        """Get the run time
+
+        :return: run time in seconds
+        :rtype: float
+        """
+        return self._duration
+
+    @property
+    def timed_out(self) -> bool:
+        """Get whether the command timed out
+
+        :return: True if the command was killed after the per-host timeout
+        :rtype: bool
+        """
+        return self._timed_out
+
+    @property
+    def ok(self) -> bool:
+        """Get whether the command succeeded
+
+        :return: True if the command exited with code 0
+        :rtype: bool
+        """
+        return self._exit_code == 0
+
+    def __str__(self) -> str:
+        """Print the ssh result
+
+        :return: ssh result string representation
+        :rtype: str
+        """
+        return (f'instance_id: {self._instance_id}\n'
+                f'host: {self._host}\n'
+                f'exit_code: {self._exit_code}\n'
+                f'timed_out: {self._timed_out}\n'
+                f'duration: {self._duration:.2f}\n'
+                )
+
+
+class SSHExecutor:
+    """Runs commands and file copies on many instances concurrently over SSH.
+
+    Uses the OpenSSH client. The first connection to a host starts a
+    control master, later commands on the same host reuse its connection.
+    Output lines are passed to `on_output` as they arrive, tagged with the
+    host they came from. Instances without an ip address yet fail with exit
+    code 255, like ssh does when it can't connect.
+    """
+
+    def __init__(self,
+                 user: str = 'ubuntu',
+                 identity_file: str = None,
+                 max_workers: int = 16,
+                 timeout: float = 300.0,
+                 connect_timeout: int = 10,
+                 port: int = 22,
+                 ssh_options: List[str] = None,
+                 on_output: Callable[[str, str, str], None] = None,
+                 instances_service: InstancesService = None,
+                 ssh_command: str = 'ssh',
+                 scp_command: str = 'scp'
+                 ) -> None:
+        """Initialize the ssh executor
+
+        :param user: remote user name, defaults to 'ubuntu'
+        :type user: str, optional
+        :param identity_file: path of the private key, defaults to None (ssh's default keys)
+        :type identity_file: str, optional
+        :param max_workers: maximum number of hosts worked on concurrently, defaults to 16
+        :type max_workers: int, optional
+        :param timeout: per-host timeout in seconds, defaults to 300.0
+        :type timeout: float, optional
+        :param connect_timeout: ssh connect timeout in seconds, defaults to 10
+        :type connect_timeout: int, optional
+        :param port: ssh port, defaults to 22
+        :type port: int, optional
+        :param ssh_options: extra `-o` options, e.g. ['StrictHostKeyChecking=no'], defaults to None
+        :type ssh_options: List[str], optional
+        :param on_output: called with (host, 'stdout' or 'stderr', line) for every output line, defaults to None
+        :type on_output: Callable[[str, str, str], None], optional
+        :param instances_service: service used to resolve instance ids, defaults to None
+        :type instances_service: InstancesService, optional
+        :param ssh_command: ssh executable, defaults to 'ssh'
+        :type ssh_command: str, optional
+        :param scp_command: scp executable, defaults to 'scp'
+        :type scp_command: str, optional
+        """
+        self._user = user
+        self._timeout = timeout
+        self._on_output = on_output
+        self._instances_service = instances_service
+        self._ssh_command = ssh_command
+        self._scp_command = scp_command
+        self._max_workers = max_workers
+        self._control_dir = tempfile.mkdtemp(prefix='lambdalabs-ssh-')
+        self._hosts = set()
+        self._hosts_lock = threading.Lock()
+        self._output_lock = threading.Lock()
+
+        self._options = [
+            '-o', 'BatchMode=yes',
+            '-o', f'ConnectTimeout={connect_timeout}',
+            '-o', 'ControlMaster=auto',
+            '-o', f'ControlPath={os.path.join(self._control_dir, "%C")}',
+            '-o', 'ControlPersist=300',
+        ]
+        for option in ssh_options or []:
+            self._options += ['-o', option]
+        if identity_file is not None:
+            self._options += ['-i', identity_file]
+        self._port = port
+
+    def run(self, targets: List[Union[Instance, str]], command: str) -> List[SSHResult]:
+        """Run a shell command on every instance
+
+        :param targets: instances, or instance ids
+        :type targets: List[Union[Instance, str]]
+        :param command: shell command
+        :type command: str
+        :return: result of every instance, in the order of `targets`
+        :rtype: List[SSHResult]
+        """
+        return self._fan_out(targets, lambda host: [
+            self._ssh_command, *self._options, '-p', str(self._port), f'{self._user}@{host}', command
+        ])
+
+    def copy(self, targets: List[Union[Instance, str]], local_path: str, remote_path: str) -> List[SSHResult]:
+        """Copy a local file or directory to every instance
+
+        :param targets: instances, or instance ids
+        :type targets: List[Union[Instance, str]]
+        :param local_path: local file or directory
+        :type local_path: str
+        :param remote_path: destination path on the instances
+        :type remote_path: str
+        :return: result of every instance, in the order of `targets`
+        :rtype: List[SSHResult]
+        """
+        return self._fan_out(targets, lambda host: [
+            self._scp_command, *self._options, '-P', str(self._port), '-r', local_path,
+            f'{self._user}@{host}:{remote_path}'
+        ])
+
+    def close(self) -> None:
+        """Close the reused connections"""
+        with self._hosts_lock:
+            hosts = list(self._hosts)
+            self._hosts.clear()
+        for host in hosts:
+            subprocess.run([self._ssh_command, *self._options, '-p', str(self._port), '-O', 'exit',
+                            f'{self._user}@{host}'],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        shutil.rmtree(self._control_dir, ignore_errors=True)
+
+    def _resolve(self, targets: List[Union[Instance, str]]) -> List[Instance]:
+        """Resolve instance ids with a single instances list call
+
+        :param targets: instances, or instance ids
+        :type targets: List[Union[Instance, str]]
+        :raises ValueError: if an id can't be resolved
+        :return: instances
+        :rtype: List[Instance]
+        """
+        if all(isinstance(target, Instance) for target in targets):
+            return list(targets)
+        if self._instances_service is None:
+            raise ValueError('resolving instance ids requires an instances service')
+
+        snapshot = self._instances_service.get()
+        instances = []
+        for target in targets:
+            instance = target if isinstance(target, Instance) else snapshot.by_id(target)
+            if instance is None:
+                raise ValueError(f'unknown instance id: {target}')
+            instances.append(instance)
+        return instances
+
+    def _fan_out(self, targets: List[Union[Instance, str]], build_command: Callable[[str], List[str]]) -> List[SSHResult]:
+        instances = self._resolve(targets)
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            return list(executor.map(lambda instance: self._execute(instance, build_command(instance.ip)), instances))
+
+    def _execute(self, instance: Instance, args: List[str]) -> SSHResult:
+        host = instance.ip
+        if not host:
+            # booting instances have no ip address yet, fail like ssh does when it can't connect
+            return SSHResult(instance.id, host, 255, '', f'instance {instance.id} has no ip address '
+                             f'(status: {instance.status})\n', 0.0)
+        with self._hosts_lock:
+            self._hosts.add(host)
+
+        start = time.monotonic()
+        process = subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE, universal_newlines=True)
+        stdout = []
+        stderr = []
+        readers = [
+            threading.Thread(target=self._read, args=(host, 'stdout', process.stdout, stdout), daemon=True),
+            threading.Thread(target=self._read, args=(host, 'stderr', process.stderr, stderr), daemon=True),
+        ]
+        for reader in readers:
+            reader.start()
+
+        timed_out = False
+        try:
+            exit_code = process.wait(self._timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+            exit_code = None
+            timed_out = True
+        duration = time.monotonic() - start
+        for reader in readers:
+            # a control master started by this process may keep the pipes open
+            reader.join(1.0)
+
+        return SSHResult(instance.id, host, exit_code, ''.join(stdout), ''.join(stderr), duration, timed_out)
+
+    def _read(self, host: str, stream_name: str, stream, lines: List[str]) -> None:
+        for line in stream:
+            lines.append(line)
+            if self._on_output is not None:
+                with self._output_lock:
+                    self._on_output(host, stream_name, line.rstrip('\n'))
+        stream.close()
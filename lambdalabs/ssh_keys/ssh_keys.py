@@ -1,4 +1,28 @@
-from typing import List
+import base64
+import binascii
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from lambdalabs.tracing.tracing import traced
+
+
+def public_key_fingerprint(public_key: str) -> str:
+    """Compute the SHA256 fingerprint of a public key, as shown by `ssh-keygen -l`
+
+    :param public_key: public key in OpenSSH format, e.g. 'ssh-ed25519 AAAA... comment'
+    :type public_key: str
+    :return: fingerprint, e.g. 'SHA256:...'
+    :rtype: str
+    """
+    fields = (public_key or '').split()
+    try:
+        blob = base64.b64decode(fields[1], validate=True)
+    except (IndexError, binascii.Error):
+        # not in OpenSSH format, fall back to the key text
+        blob = ' '.join(fields).encode('utf-8')
+    digest = base64.b64encode(hashlib.sha256(blob).digest()).decode('ascii').rstrip('=')
+    return f'SHA256:{digest}'
 
 
 class SSHKey:
@@ -75,26 +99,129 @@ class SSHKey:
                 )
 
 
+class SSHKeySyncResult:
+    """The outcome of syncing a single ssh-key"""
+
+    def __init__(self,
+                 name: str,
+                 action: str,
+                 ssh_key: SSHKey = None,
+                 error: Exception = None,
+                 deleted: bool = False
+                 ) -> None:
+        """Initialize the ssh-key sync result object
+
+        :param name: ssh-key name
+        :type name: str
+        :param action: 'add', 'delete', 'replace', 'rename' or 'unchanged'
+        :type action: str
+        :param ssh_key: the added ssh-key, or the deleted / unchanged one, defaults to None
+        :type ssh_key: SSHKey, optional
+        :param error: the exception raised while applying the action, defaults to None
+        :type error: Exception, optional
+        :param deleted: whether the existing ssh-key was deleted, defaults to False
+        :type deleted: bool, optional
+        """
+        self._name = name
+        self._action = action
+        self._ssh_key = ssh_key
+        self._error = error
+        self._deleted = deleted
+
+    @property
+    def name(self) -> str:
+        """Get the ssh-key name
+
+        :return: ssh-key name
+        :rtype: str
+        """
+        return self._name
+
+    @property
+    def action(self) -> str:
+        """Get the action taken
+
+        :return: 'add', 'delete', 'replace', 'rename' or 'unchanged'
+        :rtype: str
+        """
+        return self._action
+
+    @property
+    def ssh_key(self) -> SSHKey:
+        """Get the ssh-key the action was applied to
+
+        :return: ssh-key object
+        :rtype: SSHKey
+        """
+        return self._ssh_key
+
+    @property
+    def error(self) -> Exception:
+        """Get the error of the action
+
+        :return: the exception raised, or None
+        :rtype: Exception
+        """
+        return self._error
+
+    @property
+    def deleted(self) -> bool:
+        """Get whether the existing ssh-key was deleted
+
+        A failed 'replace' or 'rename' with `deleted` set is half-applied:
+        the existing ssh-key is gone and the new one was not added.
+
+        :return: True if the existing ssh-key was deleted
+        :rtype: bool
+        """
+        return self._deleted
+
+    @property
+    def ok(self) -> bool:
+        """Get whether the action succeeded
+
+        :return: True if no error was raised
+        :rtype: bool
+        """
+        return self._error is None
+
+    def __str__(self) -> str:
+        """Print the ssh-key sync result
+
+        :return: ssh-key sync result string representation
+        :rtype: str
+        """
+        return (f'name: {self._name}\n'
+                f'action: {self._action}\n'
+                f'deleted: {self._deleted}\n'
+                f'error: {self._error}\n'
+                )
+
+
 class SSHKeysService:
     """A service for interacting with the ssh-keys endpoint"""
 
     def __init__(self, http_client) -> None:
         self._http_client = http_client
 
+    @traced
     def get(self) -> List[SSHKey]:
         """Retrieve the list of SSH keys
 
         :return: list of ssh-key objects
         :rtype: List[SSHKey]
         """
-        ssh_keys_dict = self._http_client.get('/ssh-keys').json()
-        ssh_key_objects = list(map(lambda ssh_keys_dict: SSHKey(
-            id=ssh_keys_dict['id'],
-            name=ssh_keys_dict['name'],
-            public_key=ssh_keys_dict['public_key']
-        ), ssh_keys_dict['data']))
+        ssh_keys_dict = self._http_client.decode(self._http_client.get('/ssh-keys'))
+        with self._http_client.tracer.span('model.build') as span:
+            ssh_key_objects = list(map(lambda ssh_keys_dict: SSHKey(
+                id=ssh_keys_dict['id'],
+                name=ssh_keys_dict['name'],
+                public_key=ssh_keys_dict['public_key']
+            ), ssh_keys_dict['data']))
+            span.set_attribute('item_count', len(ssh_key_objects))
         return ssh_key_objects
 
+    @traced
     def add(self, name: str, public_key: str = None) -> SSHKey:
         """Add an SSH key
 
@@ -114,7 +241,7 @@ class SSHKeysService:
                 "public_key": public_key
             }
 
-        ssh_key_dict = self._http_client.post('/ssh-keys', json=payload).json()
+        ssh_key_dict = self._http_client.decode(self._http_client.post('/ssh-keys', json=payload))
         if 'data' in ssh_key_dict:
             ssh_key_object = SSHKey(
                 id=ssh_key_dict['data']['id'],
@@ -125,6 +252,7 @@ class SSHKeysService:
             return ssh_key_object
         return None
 
+    @traced
     def delete(self, id: str) -> None:
         """Delete an ssh-key
 
@@ -132,3 +260,99 @@ class SSHKeysService:
         :type id: str
         """
         return self._http_client.delete(f'/ssh-keys/{id}').text
+
+    @traced
+    def sync(self,
+             desired_keys: Dict[str, str],
+             delete_extra: bool = True,
+             max_workers: int = 8,
+             dry_run: bool = False
+             ) -> List[SSHKeySyncResult]:
+        """Make the account's ssh-keys match a desired set.
+
+        Keys are compared by name and public key fingerprint. Missing keys are
+        added, keys whose public key changed are deleted and added again, and
+        keys that are not desired are deleted if `delete_extra` is set. A
+        desired key that exists under a name that is not desired is renamed,
+        i.e. deleted and added under the desired name, if `delete_extra` is
+        set. A desired public key of None keeps an existing key as is, and
+        lets the API generate a key pair if the key is missing. The adds and
+        deletes run concurrently.
+
+        :param desired_keys: public key of every desired ssh-key, or None, keyed by name
+        :type desired_keys: Dict[str, str]
+        :param delete_extra: delete the ssh-keys that are not desired, defaults to True
+        :type delete_extra: bool, optional
+        :param max_workers: maximum number of concurrent requests, defaults to 8
+        :type max_workers: int, optional
+        :param dry_run: only compute the actions, don't apply them, defaults to False
+        :type dry_run: bool, optional
+        :return: result of every desired and every deleted ssh-key
+        :rtype: List[SSHKeySyncResult]
+        """
+        current_keys = {ssh_key.name: ssh_key for ssh_key in self.get()}
+        keys_by_fingerprint = {}
+        for current_key in current_keys.values():
+            keys_by_fingerprint.setdefault(public_key_fingerprint(current_key.public_key), current_key)
+
+        actions = []
+        renamed = set()
+        for name, public_key in desired_keys.items():
+            current_key = current_keys.get(name)
+            fingerprint = public_key_fingerprint(public_key) if public_key is not None else None
+            if current_key is not None:
+                if fingerprint is None or public_key_fingerprint(current_key.public_key) == fingerprint:
+                    actions.append((name, 'unchanged', current_key, public_key))
+                else:
+                    actions.append((name, 'replace', current_key, public_key))
+                continue
+            other_key = keys_by_fingerprint.get(fingerprint)
+            if (delete_extra and other_key is not None and other_key.name not in desired_keys
+                    and other_key.name not in renamed):
+                renamed.add(other_key.name)
+                actions.append((name, 'rename', other_key, public_key))
+            else:
+                actions.append((name, 'add', None, public_key))
+        if delete_extra:
+            for name, current_key in current_keys.items():
+                if name not in desired_keys and name not in renamed:
+                    actions.append((name, 'delete', current_key, None))
+
+        if dry_run:
+            return [SSHKeySyncResult(name, action, current_key) for name, action, current_key, _ in actions]
+
+        # the workers continue this thread's span, so their add and delete spans are children of sync
+        tracer = self._http_client.tracer
+        span_context = tracer.context()
+
+        def apply(action: tuple) -> SSHKeySyncResult:
+            with tracer.activate(span_context):
+                return self._apply_sync_action(*action)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(apply, actions))
+
+    def _apply_sync_action(self, name: str, action: str, current_key: SSHKey, public_key: str) -> SSHKeySyncResult:
+        """Apply a single sync action
+
+        :param name: ssh-key name
+        :type name: str
+        :param action: 'add', 'delete', 'replace', 'rename' or 'unchanged'
+        :type action: str
+        :param current_key: the existing ssh-key, if any
+        :type current_key: SSHKey
+        :param public_key: the desired public key, if any
+        :type public_key: str
+        :return: the result of the action
+        :rtype: SSHKeySyncResult
+        """
+        deleted = False
+        try:
+            if action in ('delete', 'replace', 'rename'):
+                self.delete(current_key.id)
+                deleted = True
+            if action in ('add', 'replace', 'rename'):
+                return SSHKeySyncResult(name, action, self.add(name, public_key), deleted=deleted)
+        except Exception as e:
+            return SSHKeySyncResult(name, action, current_key, e, deleted=deleted)
+        return SSHKeySyncResult(name, action, current_key, deleted=deleted)
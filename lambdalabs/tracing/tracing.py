@@ -0,0 +1,246 @@
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List
+
+
+class Span:
+    """A finished or running span recorded by the InMemoryTracer"""
+
+    def __init__(self, name: str, parent: 'Span' = None, attributes: Dict[str, Any] = None) -> None:
+        """Initialize the span object
+
+        :param name: span name, e.g. 'InstancesService.get' or 'http.send'
+        :type name: str
+        :param parent: the enclosing span, defaults to None
+        :type parent: Span, optional
+        :param attributes: initial attributes, defaults to None
+        :type attributes: Dict[str, Any], optional
+        """
+        self._name = name
+        self._parent = parent
+        self._attributes = dict(attributes or {})
+        self._start = time.perf_counter()
+        self._end = None
+
+    @property
+    def name(self) -> str:
+        """Get the span name
+
+        :return: span name
+        :rtype: str
+        """
+        return self._name
+
+    @property
+    def parent(self) -> 'Span':
+        """Get the enclosing span
+
+        :return: parent span, or None for a root span
+        :rtype: Span
+        """
+        return self._parent
+
+    @property
+    def attributes(self) -> Dict[str, Any]:
+        """Get the span attributes
+
+        :return: span attributes
+        :rtype: Dict[str, Any]
+        """
+        return self._attributes
+
+    @property
+    def duration(self) -> float:
+        """Get the span duration
+
+        :return: duration in seconds, None while the span is running
+        :rtype: float
+        """
+        return None if self._end is None else self._end - self._start
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        """Set a span attribute
+
+        :param key: attribute name
+        :type key: str
+        :param value: attribute value
+        :type value: Any
+        """
+        self._attributes[key] = value
+
+    def _finish(self) -> None:
+        self._end = time.perf_counter()
+
+    def __str__(self) -> str:
+        """Print the span
+
+        :return: span string representation
+        :rtype: str
+        """
+        return (f'name: {self._name}\n'
+                f'parent: {self._parent.name if self._parent is not None else None}\n'
+                f'duration: {self.duration}\n'
+                f'attributes: {self._attributes}\n'
+                )
+
+
+class _NoopSpan:
+    """A span that ignores everything"""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def __enter__(self) -> '_NoopSpan':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """Creates spans around SDK operations.
+
+    The base tracer is the default and does nothing: `span()` returns a
+    shared context manager without recording anything.
+    """
+
+    def span(self, name: str, **attributes):
+        """Create a span
+
+        :param name: span name
+        :type name: str
+        :return: context manager yielding an object with `set_attribute(key, value)`
+        """
+        return _NOOP_SPAN
+
+    def context(self) -> Any:
+        """Get the current span context of this thread, to continue it in another thread
+
+        :return: opaque span context, passed to `activate()`
+        :rtype: Any
+        """
+        return None
+
+    def activate(self, context: Any):
+        """Make a span context current in this thread, so that new spans become its children
+
+        :param context: span context returned by `context()` in another thread
+        :type context: Any
+        :return: context manager restoring the previous span context on exit
+        """
+        return _NOOP_SPAN
+
+
+class InMemoryTracer(Tracer):
+    """Records finished spans in memory, e.g. for tests"""
+
+    def __init__(self) -> None:
+        """Initialize the in-memory tracer"""
+        self._spans: List[Span] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def spans(self) -> List[Span]:
+        """Get the finished spans
+
+        :return: finished spans, in the order they finished
+        :rtype: List[Span]
+        """
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self) -> None:
+        """Forget the finished spans"""
+        with self._lock:
+            self._spans.clear()
+
+    def context(self) -> Span:
+        stack = getattr(self._local, 'stack', None)
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def activate(self, context: Span):
+        previous = getattr(self._local, 'stack', None)
+        self._local.stack = [context] if context is not None else []
+        try:
+            yield
+        finally:
+            self._local.stack = previous
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        span = Span(name, stack[-1] if stack else None, attributes)
+        stack.append(span)
+        try:
+            yield span
+        except Exception as e:
+            span.set_attribute('error', type(e).__name__)
+            raise
+        finally:
+            stack.pop()
+            span._finish()
+            with self._lock:
+                self._spans.append(span)
+
+
+class OpenTelemetryTracer(Tracer):
+    """Creates OpenTelemetry spans, requires the opentelemetry-api package"""
+
+    def __init__(self, tracer_provider=None) -> None:
+        """Initialize the OpenTelemetry tracer
+
+        :param tracer_provider: tracer provider, defaults to None (the global provider)
+        :type tracer_provider: opentelemetry.trace.TracerProvider, optional
+        :raises ImportError: if opentelemetry-api is not installed
+        """
+        from opentelemetry import context, trace
+        self._context = context
+        self._tracer = trace.get_tracer('lambdalabs', tracer_provider=tracer_provider)
+
+    def span(self, name: str, **attributes):
+        return self._tracer.start_as_current_span(
+            name, attributes={key: value for key, value in attributes.items() if value is not None})
+
+    def context(self) -> Any:
+        return self._context.get_current()
+
+    @contextmanager
+    def activate(self, context: Any):
+        token = self._context.attach(context)
+        try:
+            yield
+        finally:
+            self._context.detach(token)
+
+
+def auto_tracer() -> Tracer:
+    """Get an OpenTelemetryTracer if OpenTelemetry is installed, a no-op tracer otherwise
+
+    :return: tracer
+    :rtype: Tracer
+    """
+    try:
+        return OpenTelemetryTracer()
+    except ImportError:
+        return Tracer()
+
+
+def traced(method):
+    """Decorate a service method to run inside a span named after it.
+
+    The service must hold its HTTPClient in `self._http_client`.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._http_client.tracer.span(method.__qualname__):
+            return method(self, *args, **kwargs)
+    return wrapper
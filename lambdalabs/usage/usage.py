@@ -0,0 +1,590 @@
+import json
+import os
+import struct
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+from lambdalabs.instances.instances import Instance
+
+
+NON_BILLABLE_STATUSES = frozenset(['terminated'])
+
+# record tags of the usage log
+_STRING = b'S'
+_TRANSITION = b'T'
+# string id, string length
+_STRING_HEADER = struct.Struct('<IH')
+# timestamp, instance id, status, instance type, region, name (string ids), price in cents per hour
+_TRANSITION_BODY = struct.Struct('<dIIIIII')
+
+
+def _month(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m')
+
+
+def _month_start_after(timestamp: float) -> float:
+    date = datetime.fromtimestamp(timestamp, timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    if date.month == 12:
+        return date.replace(year=date.year + 1, month=1).timestamp()
+    return date.replace(month=date.month + 1).timestamp()
+
+
+class Transition:
+    """A status change of an instance, as recorded in the usage log"""
+
+    def __init__(self,
+                 timestamp: float,
+                 instance_id: str,
+                 status: str,
+                 instance_type: str,
+                 region: str,
+                 name: str,
+                 price_cents_per_hour: int
+                 ) -> None:
+        """Initialize the transition object
+
+        :param timestamp: unix time of the snapshot the change was seen in
+        :type timestamp: float
+        :param instance_id: instance id
+        :type instance_id: str
+        :param status: the new status
+        :type status: str
+        :param instance_type: instance type name
+        :type instance_type: str
+        :param region: region name
+        :type region: str
+        :param name: user-provided instance name
+        :type name: str
+        :param price_cents_per_hour: price in cents per hour
+        :type price_cents_per_hour: int
+        """
+        self._timestamp = timestamp
+        self._instance_id = instance_id
+        self._status = status
+        self._instance_type = instance_type
+        self._region = region
+        self._name = name
+        self._price_cents_per_hour = price_cents_per_hour
+
+    @property
+    def timestamp(self) -> float:
+        """Get the unix time of the change
+
+        :return: unix time
+        :rtype: float
+        """
+        return self._timestamp
+
+    @property
+    def instance_id(self) -> str:
+        """Get the instance id
+
+        :return: instance id
+        :rtype: str
+        """
+        return self._instance_id
+
+    @property
+    def status(self) -> str:
+        """Get the new status
+
+        :return: instance status
+        :rtype: str
+        """
+        return self._status
+
+    @property
+    def instance_type(self) -> str:
+        """Get the instance type name
+
+        :return: instance type name
+        :rtype: str
+        """
+        return self._instance_type
+
+    @property
+    def region(self) -> str:
+        """Get the region name
+
+        :return: region name
+        :rtype: str
+        """
+        return self._region
+
+    @property
+    def name(self) -> str:
+        """Get the user-provided instance name
+
+        :return: instance name
+        :rtype: str
+        """
+        return self._name
+
+    @property
+    def price_cents_per_hour(self) -> int:
+        """Get the price in cents per hour
+
+        :return: price in cents per hour
+        :rtype: int
+        """
+        return self._price_cents_per_hour
+
+    def __str__(self) -> str:
+        """Print the transition
+
+        :return: transition string representation
+        :rtype: str
+        """
+        return (f'timestamp: {self._timestamp}\n'
+                f'instance_id: {self._instance_id}\n'
+                f'status: {self._status}\n'
+                f'instance_type: {self._instance_type}\n'
+                f'region: {self._region}\n'
+                f'name: {self._name}\n'
+                f'price_cents_per_hour: {self._price_cents_per_hour}\n'
+                )
+
+
+class UsageLog:
+    """An append-only binary log of instance status transitions.
+
+    Strings (ids, statuses, names, ...) are written once and referenced by
+    number afterwards, so a transition takes 32 bytes plus a one-byte tag, 33 bytes in total.
+    An append either reaches the disk completely or is cut off again.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Open or create the usage log
+
+        :param path: path of the log file
+        :type path: str
+        """
+        self._path = path
+        self._strings: List[str] = []
+        self._string_ids: Dict[str, int] = {}
+        # unbuffered, so that a failed append leaves nothing behind to be written later
+        self._file = open(path, 'ab', buffering=0)
+
+    @property
+    def path(self) -> str:
+        """Get the path of the log file
+
+        :return: path of the log file
+        :rtype: str
+        """
+        return self._path
+
+    @property
+    def strings(self) -> List[str]:
+        """Get the string table of the log
+
+        :return: strings, indexed by their id
+        :rtype: List[str]
+        """
+        return self._strings
+
+    def size(self) -> int:
+        """Get the size of the log
+
+        :return: size in bytes
+        :rtype: int
+        """
+        return self._file.tell()
+
+    def load_strings(self, strings: List[str]) -> None:
+        """Restore the string table saved together with a read offset
+
+        :param strings: strings, indexed by their id
+        :type strings: List[str]
+        """
+        self._strings = list(strings)
+        self._string_ids = {string: id for id, string in enumerate(self._strings)}
+
+    def append(self, transitions: Iterable[Transition]) -> None:
+        """Append transitions and flush them to disk
+
+        New strings join the string table only once they are on disk. If
+        writing fails, the log is cut back to its previous size.
+
+        :param transitions: transitions to append
+        :type transitions: Iterable[Transition]
+        :raises OSError: if writing to the log fails, e.g. because the disk is full
+        """
+        chunks = []
+        new_string_ids: Dict[str, int] = {}
+        for transition in transitions:
+            values = (transition.instance_id, transition.status, transition.instance_type,
+                      transition.region, transition.name)
+            ids = [self._string_id(value, chunks, new_string_ids) for value in values]
+            chunks.append(_TRANSITION + _TRANSITION_BODY.pack(transition.timestamp, *ids,
+                                                              transition.price_cents_per_hour or 0))
+        size = self._file.tell()
+        try:
+            self._file.write(b''.join(chunks))
+            os.fsync(self._file.fileno())
+        except BaseException:
+            self.truncate(size)
+            raise
+        for value, id in sorted(new_string_ids.items(), key=lambda item: item[1]):
+            self._strings.append(value)
+            self._string_ids[value] = id
+
+    def read(self, offset: int = 0, strings: List[str] = None) -> Iterator[Tuple[Transition, int]]:
+        """Read the transitions after an offset.
+
+        A truncated record at the end of the log, left by a crash during an
+        append, ends the iteration. Strings are only added to the string table
+        once a transition following them has been read completely.
+
+        :param offset: byte offset to start reading at, defaults to 0
+        :type offset: int, optional
+        :param strings: string table of everything before the offset, extended in place
+                with the strings read, defaults to None (empty)
+        :type strings: List[str], optional
+        :raises ValueError: if the log is corrupt
+        :return: the transitions and the offset after each of them
+        :rtype: Iterator[Tuple[Transition, int]]
+        """
+        strings = strings if strings is not None else []
+        pending_strings = []
+        with open(self._path, 'rb') as log:
+            log.seek(offset)
+            data = log.read()
+
+        position = 0
+        while position < len(data):
+            tag = data[position:position + 1]
+            if tag == _STRING:
+                if position + 1 + _STRING_HEADER.size > len(data):
+                    return
+                id, length = _STRING_HEADER.unpack_from(data, position + 1)
+                end = position + 1 + _STRING_HEADER.size + length
+                if end > len(data):
+                    return
+                if id == len(strings) + len(pending_strings):
+                    pending_strings.append(data[end - length:end].decode('utf-8'))
+                position = end
+            elif tag == _TRANSITION:
+                end = position + 1 + _TRANSITION_BODY.size
+                if end > len(data):
+                    return
+                strings.extend(pending_strings)
+                pending_strings.clear()
+                timestamp, *ids, price = _TRANSITION_BODY.unpack_from(data, position + 1)
+                if max(ids) >= len(strings):
+                    raise ValueError(f'corrupt usage log {self._path} at offset {offset + position}')
+                instance_id, status, instance_type, region, name = [strings[id] or None for id in ids]
+                position = end
+                yield Transition(timestamp, instance_id, status, instance_type, region, name, price), offset + position
+            else:
+                raise ValueError(f'corrupt usage log {self._path} at offset {offset + position}')
+
+    def truncate(self, size: int) -> None:
+        """Cut off the log after the given size, e.g. a truncated last record
+
+        :param size: new size in bytes
+        :type size: int
+        """
+        self._file.truncate(size)
+        self._file.seek(size)
+
+    def close(self) -> None:
+        """Close the log file"""
+        self._file.close()
+
+    def _string_id(self, value: str, chunks: List[bytes], new_string_ids: Dict[str, int]) -> int:
+        value = value or ''
+        id = self._string_ids.get(value, new_string_ids.get(value))
+        if id is None:
+            id = len(self._strings) + len(new_string_ids)
+            encoded = value.encode('utf-8')
+            chunks.append(_STRING + _STRING_HEADER.pack(id, len(encoded)) + encoded)
+            new_string_ids[value] = id
+        return id
+
+
+class Budget:
+    """A spending limit with a callback fired once when it is exceeded"""
+
+    def __init__(self,
+                 limit_cents: float,
+                 callback: Callable[['Budget', float], None],
+                 month: str = None,
+                 instance_type: str = None,
+                 region: str = None,
+                 name_prefix: str = None
+                 ) -> None:
+        """Initialize the budget object
+
+        :param limit_cents: spending limit in cents
+        :type limit_cents: float
+        :param callback: called with the budget and the amount spent when the limit is exceeded
+        :type callback: Callable[[Budget, float], None]
+        :param month: only count this month, e.g. '2023-04', defaults to None (all time)
+        :type month: str, optional
+        :param instance_type: only count instances of this type, defaults to None
+        :type instance_type: str, optional
+        :param region: only count instances in this region, defaults to None
+        :type region: str, optional
+        :param name_prefix: only count instances whose name starts with this prefix, defaults to None
+        :type name_prefix: str, optional
+        """
+        self._limit_cents = limit_cents
+        self._callback = callback
+        self._month = month
+        self._instance_type = instance_type
+        self._region = region
+        self._name_prefix = name_prefix
+        self._exceeded = False
+
+    @property
+    def limit_cents(self) -> float:
+        """Get the spending limit
+
+        :return: spending limit in cents
+        :rtype: float
+        """
+        return self._limit_cents
+
+    @property
+    def exceeded(self) -> bool:
+        """Get whether the limit was exceeded
+
+        :return: True once the limit was exceeded
+        :rtype: bool
+        """
+        return self._exceeded
+
+    def _check(self, tracker: 'UsageTracker', now: float) -> None:
+        if self._exceeded:
+            return
+        spent = sum(tracker.cost(group_by=None, month=self._month, instance_type=self._instance_type,
+                                 region=self._region, name_prefix=self._name_prefix, now=now).values())
+        if spent > self._limit_cents:
+            self._exceeded = True
+            self._callback(self, spent)
+
+
+class UsageTracker:
+    """Accounts the cost of instances from successive instance snapshots.
+
+    Status changes are appended to a UsageLog. The cost accrued by every
+    instance is kept in per-month rollups, which are checkpointed next to
+    the log (`<path>.rollup`), so opening the tracker only replays the log
+    written since the last checkpoint and queries never scan the history.
+    """
+
+    def __init__(self, path: str, checkpoint_every: int = 100) -> None:
+        """Open or create the usage tracker
+
+        :param path: path of the usage log
+        :type path: str
+        :param checkpoint_every: number of recorded snapshots between rollup checkpoints, defaults to 100
+        :type checkpoint_every: int, optional
+        """
+        self._log = UsageLog(path)
+        self._rollup_path = path + '.rollup'
+        self._checkpoint_every = checkpoint_every
+        self._records_since_checkpoint = 0
+        self._offset = 0
+        self._instances: Dict[str, dict] = {}
+        self._budgets: List[Budget] = []
+        self._lock = threading.Lock()
+
+        strings = self._load_rollup()
+        for transition, offset in self._log.read(self._offset, strings):
+            self._apply(transition)
+            self._offset = offset
+        self._log.load_strings(strings)
+        if self._offset < self._log.size():
+            self._log.truncate(self._offset)
+
+    def record(self, snapshot: Iterable[Instance], timestamp: float = None) -> List[Transition]:
+        """Record the status changes of an instances snapshot.
+
+        Instances missing from the snapshot are recorded as terminated.
+
+        :param snapshot: all instances of the account, e.g. from InstancesService.get()
+        :type snapshot: Iterable[Instance]
+        :param timestamp: unix time of the snapshot, defaults to None (now)
+        :type timestamp: float, optional
+        :return: the recorded transitions
+        :rtype: List[Transition]
+        """
+        timestamp = timestamp if timestamp is not None else time.time()
+        with self._lock:
+            transitions = []
+            seen = set()
+            for instance in snapshot:
+                seen.add(instance.id)
+                state = self._instances.get(instance.id)
+                if state is None or state['status'] != instance.status:
+                    region = instance.region.get('name') if isinstance(instance.region, dict) else instance.region
+                    instance_type_name = None
+                    price_cents_per_hour = 0
+                    if instance.instance_type is not None:
+                        instance_type_name = instance.instance_type.name
+                        price_cents_per_hour = instance.instance_type.price_cents_per_hour or 0
+                    transitions.append(Transition(timestamp, instance.id, instance.status, instance_type_name,
+                                                  region, instance.name, price_cents_per_hour))
+            for id, state in self._instances.items():
+                if id not in seen and state['status'] not in NON_BILLABLE_STATUSES:
+                    transitions.append(Transition(timestamp, id, 'terminated', state['instance_type'],
+                                                  state['region'], state['name'], state['price_cents_per_hour']))
+
+            if transitions:
+                self._log.append(transitions)
+                for transition in transitions:
+                    self._apply(transition)
+                self._offset = self._log.size()
+
+            self._records_since_checkpoint += 1
+            if self._records_since_checkpoint >= self._checkpoint_every:
+                self._checkpoint()
+
+        for budget in self._budgets:
+            budget._check(self, timestamp)
+        return transitions
+
+    def cost(self,
+             group_by: str = 'instance',
+             month: str = None,
+             instance_type: str = None,
+             region: str = None,
+             name_prefix: str = None,
+             now: float = None
+             ) -> Dict[str, float]:
+        """Get the accrued cost, including instances that are still running
+
+        :param group_by: 'instance', 'instance_type', 'region', 'name', or None for a single 'total',
+                defaults to 'instance'
+        :type group_by: str, optional
+        :param month: only count this month, e.g. '2023-04', defaults to None (all time)
+        :type month: str, optional
+        :param instance_type: only count instances of this type, defaults to None
+        :type instance_type: str, optional
+        :param region: only count instances in this region, defaults to None
+        :type region: str, optional
+        :param name_prefix: only count instances whose name starts with this prefix, defaults to None
+        :type name_prefix: str, optional
+        :param now: unix time up to which running instances are counted, defaults to None (now)
+        :type now: float, optional
+        :return: cost in cents per group
+        :rtype: Dict[str, float]
+        """
+        now = now if now is not None else time.time()
+        costs: Dict[str, float] = {}
+        with self._lock:
+            for id, state in self._instances.items():
+                if not self._matches(state, instance_type, region, name_prefix):
+                    continue
+                months = dict(state['months'])
+                if state['status'] not in NON_BILLABLE_STATUSES:
+                    self._accrue(months, state['since'], now, state['price_cents_per_hour'])
+                amount = months.get(month, 0.0) if month is not None else sum(months.values())
+                key = 'total' if group_by is None else (id if group_by == 'instance' else state[group_by])
+                costs[key] = costs.get(key, 0.0) + amount
+        return costs
+
+    def burn_rate(self,
+                  group_by: str = 'instance_type',
+                  instance_type: str = None,
+                  region: str = None,
+                  name_prefix: str = None
+                  ) -> Dict[str, float]:
+        """Get the current cost per hour of the running instances
+
+        :param group_by: 'instance', 'instance_type', 'region', 'name', or None for a single 'total',
+                defaults to 'instance_type'
+        :type group_by: str, optional
+        :param instance_type: only count instances of this type, defaults to None
+        :type instance_type: str, optional
+        :param region: only count instances in this region, defaults to None
+        :type region: str, optional
+        :param name_prefix: only count instances whose name starts with this prefix, defaults to None
+        :type name_prefix: str, optional
+        :return: cents per hour per group
+        :rtype: Dict[str, float]
+        """
+        rates: Dict[str, float] = {}
+        with self._lock:
+            for id, state in self._instances.items():
+                if state['status'] in NON_BILLABLE_STATUSES:
+                    continue
+                if not self._matches(state, instance_type, region, name_prefix):
+                    continue
+                key = 'total' if group_by is None else (id if group_by == 'instance' else state[group_by])
+                rates[key] = rates.get(key, 0.0) + state['price_cents_per_hour']
+        return rates
+
+    def add_budget(self, budget: Budget) -> None:
+        """Add a budget, checked after every recorded snapshot
+
+        :param budget: the budget
+        :type budget: Budget
+        """
+        self._budgets.append(budget)
+
+    def transitions(self) -> Iterator[Transition]:
+        """Read the full transition history from the log
+
+        :return: all recorded transitions
+        :rtype: Iterator[Transition]
+        """
+        for transition, _ in self._log.read():
+            yield transition
+
+    def close(self) -> None:
+        """Checkpoint the rollups and close the log"""
+        with self._lock:
+            self._checkpoint()
+            self._log.close()
+
+    def _matches(self, state: dict, instance_type: str, region: str, name_prefix: str) -> bool:
+        return ((instance_type is None or state['instance_type'] == instance_type)
+                and (region is None or state['region'] == region)
+                and (name_prefix is None or (state['name'] or '').startswith(name_prefix)))
+
+    def _apply(self, transition: Transition) -> None:
+        state = self._instances.get(transition.instance_id)
+        if state is None:
+            state = self._instances[transition.instance_id] = {'months': {}}
+        elif state['status'] not in NON_BILLABLE_STATUSES:
+            self._accrue(state['months'], state['since'], transition.timestamp, state['price_cents_per_hour'])
+        state.update(status=transition.status,
+                     since=transition.timestamp,
+                     instance_type=transition.instance_type,
+                     region=transition.region,
+                     name=transition.name,
+                     price_cents_per_hour=transition.price_cents_per_hour)
+
+    def _accrue(self, months: Dict[str, float], start: float, end: float, price_cents_per_hour: int) -> None:
+        while start < end:
+            boundary = min(end, _month_start_after(start))
+            month = _month(start)
+            months[month] = months.get(month, 0.0) + price_cents_per_hour * (boundary - start) / 3600
+            start = boundary
+
+    def _load_rollup(self) -> List[str]:
+        if not os.path.exists(self._rollup_path):
+            return []
+        with open(self._rollup_path) as rollup_file:
+            rollup = json.load(rollup_file)
+        if rollup['offset'] > self._log.size():
+            # the log was replaced, replay it from the start
+            return []
+        self._offset = rollup['offset']
+        self._instances = rollup['instances']
+        return rollup['strings']
+
+    def _checkpoint(self) -> None:
+        rollup = {'offset': self._offset, 'strings': self._log.strings, 'instances': self._instances}
+        temporary_path = self._rollup_path + '.tmp'
+        with open(temporary_path, 'w') as rollup_file:
+            json.dump(rollup, rollup_file)
+            rollup_file.flush()
+            os.fsync(rollup_file.fileno())
+        os.replace(temporary_path, self._rollup_path)
+        self._records_since_checkpoint = 0
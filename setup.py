@@ -18,8 +18,13 @@ setuptools.setup(
     url="https://lambdalabs.com/",
     packages=setuptools.find_packages(),
     install_requires=['requests>=2.25.1,<3'],
+    entry_points={
+        'console_scripts': ['lambdalabs=lambdalabs.cli.cli:main'],
+    },
     extras_require={
         'dev': [''],
+        'http2': ['httpx[http2]>=0.18,<1'],
+        'compression': ['brotli>=1.0.9', 'zstandard>=0.18.0'],
         'test': ['pytest>=6.2.1,<7',
                  'pytest-cov>=2.10.1,<3',
                  'pytest-responses>=0.4.0,<1',
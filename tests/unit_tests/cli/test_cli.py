@@ -0,0 +1,159 @@
+import json
+import socket
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from lambdalabs.cli import cli, commands, daemon, daemon_client
+from lambdalabs.exceptions import APIException
+
+
+class FakeDaemon:
+    """Listens on a Unix socket and answers every request with `reply`, or closes the connection if it is None"""
+
+    def __init__(self, socket_path, reply):
+        self.reply = reply
+        self.requests = []
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(socket_path)
+        self._server.listen()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                connection, _ = self._server.accept()
+            except OSError:
+                return
+            with connection, connection.makefile('rb') as stream:
+                self.requests.append(json.loads(stream.readline()))
+                if self.reply is not None:
+                    connection.sendall(json.dumps(self.reply).encode('utf-8') + b'\n')
+
+    def close(self):
+        # wakes up the blocked accept(), close() alone leaves the socket listening
+        self._server.shutdown(socket.SHUT_RDWR)
+        self._server.close()
+        self._thread.join()
+
+
+@pytest.fixture
+def local_commands(monkeypatch):
+    """Record the commands run locally instead of calling the API"""
+    calls = []
+
+    def run_command(client, command, args):
+        calls.append(command)
+        return [{'id': 'local', 'name': 'worker'}]
+
+    monkeypatch.setattr(commands, 'run_command', run_command)
+    monkeypatch.setenv('LAMBDALABS_API_KEY', 'key')
+    return calls
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    return str(tmp_path / 'daemon.sock')
+
+
+class TestCLI:
+
+    def test_answered_by_the_daemon(self, socket_path, local_commands, capsys):
+        fake = FakeDaemon(socket_path, {'ok': True, 'data': [{'id': 'remote', 'name': 'worker'}]})
+
+        exit_code = cli.main(['--socket', socket_path, '-o', 'json', 'instances', 'ls'])
+        fake.close()
+
+        assert exit_code == 0
+        assert json.loads(capsys.readouterr().out) == [{'id': 'remote', 'name': 'worker'}]
+        assert local_commands == []
+        request, = fake.requests
+        assert request['command'] == 'instances.ls'
+        assert request['key'] == daemon_client.key_digest('key', daemon_client.DEFAULT_BASE_URL)
+
+    def test_wrong_account_runs_locally(self, socket_path, local_commands, capsys):
+        fake = FakeDaemon(socket_path, {'ok': False, 'error': {'code': 'daemon/wrong-account', 'message': ''}})
+
+        exit_code = cli.main(['--socket', socket_path, '-o', 'json', 'instances', 'ls'])
+        fake.close()
+
+        assert exit_code == 0
+        assert json.loads(capsys.readouterr().out) == [{'id': 'local', 'name': 'worker'}]
+        assert local_commands == ['instances.ls']
+
+    def test_stale_socket_runs_locally(self, socket_path, local_commands):
+        # left behind by a daemon that didn't exit cleanly
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(socket_path)
+        stale.close()
+
+        assert cli.main(['--socket', socket_path, 'instances', 'ls']) == 0
+        assert local_commands == ['instances.ls']
+
+    def test_no_reply_is_not_run_again(self, socket_path, local_commands, capsys):
+        fake = FakeDaemon(socket_path, None)
+
+        exit_code = cli.main(['--socket', socket_path, 'instances', 'terminate', 'i1'])
+        fake.close()
+
+        assert exit_code == 1
+        assert 'may have run' in capsys.readouterr().err
+        assert local_commands == []
+
+    def test_daemon_error_is_reported(self, socket_path, local_commands, capsys):
+        fake = FakeDaemon(socket_path, {'ok': False, 'error': {'code': 'global/invalid', 'message': 'bad id'}})
+
+        exit_code = cli.main(['--socket', socket_path, 'instances', 'get', 'i1'])
+        fake.close()
+
+        assert exit_code == 1
+        assert 'bad id' in capsys.readouterr().err
+        assert local_commands == []
+
+    def test_missing_action(self, capsys):
+        with pytest.raises(SystemExit):
+            cli.main(['instances'])
+
+    def test_import_does_not_load_the_sdk(self):
+        code = 'import sys, lambdalabs.cli.cli; print(sorted({"requests", "lambdalabs.lambdalabs"} & set(sys.modules)))'
+
+        output = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, check=True).stdout
+
+        assert output.strip() == b'[]'
+
+
+class TestDaemon:
+
+    def test_handle(self, socket_path, monkeypatch):
+        monkeypatch.setattr(daemon, 'run_command', lambda client, command, args: {'command': command, 'args': args})
+        server = daemon.Daemon('key', base_url='https://api', socket_path=socket_path)
+        key = daemon_client.key_digest('key', 'https://api')
+
+        assert server.handle({'command': 'daemon.ping'})['data']['socket'] == socket_path
+        assert server.handle({'command': 'instances.ls', 'key': 'other'})['error']['code'] == 'daemon/wrong-account'
+        assert server.handle({'command': 'instances.get', 'args': {'id': 'i1'}, 'key': key}) == {
+            'ok': True, 'data': {'command': 'instances.get', 'args': {'id': 'i1'}}}
+
+    def test_handle_errors(self, socket_path, monkeypatch):
+        def run_command(client, command, args):
+            if command == 'instances.get':
+                raise APIException('global/object-does-not-exist', 'not found', 404)
+            raise KeyError(command)
+
+        monkeypatch.setattr(daemon, 'run_command', run_command)
+        server = daemon.Daemon('key', base_url='https://api', socket_path=socket_path)
+        key = daemon_client.key_digest('key', 'https://api')
+
+        assert server.handle({'command': 'instances.get', 'key': key})['error'] == {
+            'code': 'global/object-does-not-exist', 'message': 'not found'}
+        assert server.handle({'command': 'unknown', 'key': key})['error']['code'] == 'daemon/error'
+
+    def test_refuses_a_second_daemon(self, socket_path):
+        fake = FakeDaemon(socket_path, {'ok': True, 'data': {'pid': 1}})
+
+        with pytest.raises(RuntimeError):
+            daemon.Daemon('key', base_url='https://api', socket_path=socket_path).serve_forever()
+        fake.close()
@@ -0,0 +1,165 @@
+import json
+import time
+
+import pytest
+import requests
+
+from lambdalabs.exceptions import APIException, CircuitOpenException
+from lambdalabs.http_client import http_client
+from lambdalabs.http_client.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from lambdalabs.http_client.http_client import HTTPClient
+from lambdalabs.http_client.transport import Transport, build_response
+
+
+RECOVERY_TIMEOUT = 0.05
+
+
+class FakeTransport(Transport):
+    """Answers with the next queued status code or exception, 200 once the queue is empty"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.urls = []
+
+    def send(self, method, url, headers, **kwargs):
+        self.urls.append(url)
+        outcome = self.outcomes.pop(0) if self.outcomes else 200
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return build_response(outcome, {}, json.dumps({'data': url}).encode('utf-8'), url)
+
+
+def _client(transport, **kwargs):
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=RECOVERY_TIMEOUT)
+    return HTTPClient('key', 'https://api', circuit_breaker=breaker, transport=transport, **kwargs), breaker
+
+
+class TestCircuitBreaker:
+
+    def test_opens_after_threshold(self):
+        breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=RECOVERY_TIMEOUT)
+
+        breaker.record_failure('GET /instances')
+        assert breaker.state('GET /instances') == CLOSED
+        breaker.record_failure('GET /instances')
+
+        assert breaker.state('GET /instances') == OPEN
+        with pytest.raises(CircuitOpenException):
+            breaker.before_call('GET /instances')
+        assert breaker.state('GET /ssh-keys') == CLOSED
+
+    def test_success_resets_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=RECOVERY_TIMEOUT)
+
+        breaker.record_failure('GET /instances')
+        breaker.record_success('GET /instances')
+        breaker.record_failure('GET /instances')
+
+        assert breaker.state('GET /instances') == CLOSED
+
+    def test_half_open_trial(self):
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=RECOVERY_TIMEOUT)
+        breaker.record_failure('GET /instances')
+        time.sleep(RECOVERY_TIMEOUT)
+
+        assert breaker.state('GET /instances') == HALF_OPEN
+        breaker.before_call('GET /instances')
+        with pytest.raises(CircuitOpenException):
+            breaker.before_call('GET /instances')
+        breaker.record_success('GET /instances')
+
+        assert breaker.state('GET /instances') == CLOSED
+
+    def test_failed_trial_reopens(self):
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=RECOVERY_TIMEOUT)
+        breaker.record_failure('GET /instances')
+        time.sleep(RECOVERY_TIMEOUT)
+
+        breaker.before_call('GET /instances')
+        breaker.record_failure('GET /instances')
+
+        assert breaker.state('GET /instances') == OPEN
+
+    def test_release_gives_trial_back(self):
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=RECOVERY_TIMEOUT)
+        breaker.record_failure('GET /instances')
+        time.sleep(RECOVERY_TIMEOUT)
+
+        breaker.before_call('GET /instances')
+        breaker.release('GET /instances')
+        breaker.before_call('GET /instances')
+
+        assert breaker.state('GET /instances') == HALF_OPEN
+
+
+class TestHTTPClientCircuitBreaker:
+
+    def test_routes_share_a_circuit(self):
+        client, breaker = _client(FakeTransport(503, 503))
+
+        for id in ('a', 'b'):
+            with pytest.raises(APIException):
+                client.get(f'/instances/{id}')
+
+        assert breaker.state('GET /instances/{id}') == OPEN
+        with pytest.raises(CircuitOpenException):
+            client.get('/instances/c')
+        assert breaker.state('GET /instances') == CLOSED
+
+    def test_connection_error_is_a_failure(self):
+        client, breaker = _client(FakeTransport(requests.exceptions.ConnectionError(), requests.exceptions.Timeout()))
+
+        for _ in range(2):
+            with pytest.raises(requests.exceptions.RequestException):
+                client.get('/instances')
+
+        assert breaker.state('GET /instances') == OPEN
+
+    def test_other_error_releases_trial(self):
+        transport = FakeTransport(503, 503, LookupError('no recorded response'))
+        client, breaker = _client(transport)
+        for _ in range(2):
+            with pytest.raises(APIException):
+                client.get('/instances')
+        time.sleep(RECOVERY_TIMEOUT)
+
+        with pytest.raises(LookupError):
+            client.get('/instances')
+        response = client.get('/instances')
+
+        assert response.status_code == 200
+        assert breaker.state('GET /instances') == CLOSED
+
+    def test_interrupted_trial_is_released(self):
+        client, breaker = _client(FakeTransport(503, 503, KeyboardInterrupt()))
+        for _ in range(2):
+            with pytest.raises(APIException):
+                client.get('/instances')
+        time.sleep(RECOVERY_TIMEOUT)
+
+        with pytest.raises(KeyboardInterrupt):
+            client.get('/instances')
+
+        assert client.get('/instances').status_code == 200
+
+    def test_cached_response_served_while_open(self):
+        transport = FakeTransport(200, 503, 503)
+        client, breaker = _client(transport, cache_responses=True)
+        client.get('/instances')
+        for _ in range(2):
+            with pytest.raises(APIException):
+                client.get('/instances')
+
+        response = client.get('/instances')
+
+        assert response.json() == {'data': 'https://api/instances'}
+        assert len(transport.urls) == 3
+
+    def test_response_cache_is_bounded(self, monkeypatch):
+        monkeypatch.setattr(http_client, 'RESPONSE_CACHE_SIZE', 2)
+        client, breaker = _client(FakeTransport(), cache_responses=True)
+
+        for id in ('a', 'b', 'a', 'c'):
+            client.get(f'/instances/{id}')
+
+        assert list(client._response_cache) == ['/instances/a', '/instances/c']
@@ -0,0 +1,39 @@
+import types
+
+import pytest
+
+from lambdalabs.http_client import transport as transport_module
+from lambdalabs.http_client.transport import HTTP2Transport
+
+
+@pytest.fixture
+def http2_transport():
+    pytest.importorskip('httpx')
+    pytest.importorskip('h2')
+    http2_transport = HTTP2Transport()
+    yield http2_transport
+    http2_transport.close()
+
+
+def _with_packages(monkeypatch, *modules):
+    monkeypatch.setattr(transport_module, '_installed', lambda module: module in modules)
+
+
+class TestHTTP2TransportAcceptEncoding:
+
+    def test_without_compression_packages(self, http2_transport, monkeypatch):
+        _with_packages(monkeypatch)
+
+        assert http2_transport.accept_encoding() == 'gzip, deflate'
+
+    def test_with_compression_packages(self, http2_transport, monkeypatch):
+        _with_packages(monkeypatch, 'brotlicffi', 'zstandard')
+        http2_transport._httpx = types.SimpleNamespace(__version__='0.28.1')
+
+        assert http2_transport.accept_encoding() == 'gzip, deflate, br, zstd'
+
+    def test_zstd_needs_a_recent_httpx(self, http2_transport, monkeypatch):
+        _with_packages(monkeypatch, 'brotli', 'zstandard')
+        http2_transport._httpx = types.SimpleNamespace(__version__='0.27.0')
+
+        assert http2_transport.accept_encoding() == 'gzip, deflate, br'
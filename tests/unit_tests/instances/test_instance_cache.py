@@ -0,0 +1,98 @@
+import threading
+import time
+
+from lambdalabs.exceptions import APIException
+from lambdalabs.instances.instance_cache import InstanceCache
+from lambdalabs.instances.instances import Instance
+
+
+def _instance(id: str, status: str = 'active') -> Instance:
+    return Instance(id, {'name': 'us-tx-1'}, '10.0.0.1', None, status, ['key'], [], None, None, None)
+
+
+class BlockingFetch:
+    """Fetches `result` once released, started is set when the fetch begins"""
+
+    def __init__(self, result):
+        self.result = result
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, id):
+        self.started.set()
+        self.release.wait(5)
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+class TestInstanceCache:
+
+    def test_refresh_started_before_terminate_keeps_optimistic_status(self):
+        cache = InstanceCache()
+        cache.put(_instance('i1'))
+        fetch = BlockingFetch(_instance('i1', 'active'))
+
+        cache.refresh('i1', fetch)
+        fetch.started.wait(5)
+        cache.put(_instance('i1', 'terminating'), optimistic=True)
+        fetch.release.set()
+        cache.close()
+
+        instance, needs_refresh = cache.get('i1')
+        assert instance.status == 'terminating'
+        assert needs_refresh
+
+    def test_refresh_started_after_terminate_confirms_status(self):
+        cache = InstanceCache()
+        cache.put(_instance('i1', 'terminating'), optimistic=True)
+        fetch = BlockingFetch(_instance('i1', 'terminating'))
+        fetch.release.set()
+
+        cache.refresh('i1', fetch)
+        cache.close()
+
+        instance, needs_refresh = cache.get('i1')
+        assert instance.status == 'terminating'
+        assert not needs_refresh
+
+    def test_snapshot_requested_before_terminate_keeps_optimistic_status(self):
+        cache = InstanceCache()
+        fetched_at = time.monotonic()
+        cache.put(_instance('i1', 'terminating'), optimistic=True)
+
+        cache.put_snapshot([_instance('i1', 'active')], fetched_at)
+
+        assert cache.get('i1')[0].status == 'terminating'
+
+    def test_refresh_of_deleted_instance_evicts(self):
+        cache = InstanceCache()
+        cache.put(_instance('i1', 'terminating'), optimistic=True)
+        fetch = BlockingFetch(APIException('global/object-does-not-exist', 'not found', 404))
+        fetch.release.set()
+
+        cache.refresh('i1', fetch)
+        cache.close()
+
+        assert cache.get('i1') == (None, False)
+        assert cache._entries == {}
+
+    def test_snapshot_drops_stale_optimistic_entries(self):
+        cache = InstanceCache(max_staleness=0.05)
+        cache.put(_instance('i1', 'terminating'), optimistic=True)
+        cache.put(_instance('i2', 'booting'), optimistic=True)
+        time.sleep(0.1)
+        cache.put(_instance('i3', 'booting'), optimistic=True)
+
+        cache.put_snapshot([_instance('i2')])
+
+        assert sorted(cache._entries) == ['i2', 'i3']
+        assert cache.get('i2')[0].status == 'active'
+
+    def test_stale_entry_is_evicted_on_read(self):
+        cache = InstanceCache(max_staleness=0.05)
+        cache.put(_instance('i1'))
+        time.sleep(0.1)
+
+        assert cache.get('i1') == (None, False)
+        assert cache._entries == {}
@@ -0,0 +1,204 @@
+import threading
+import time
+
+import pytest
+
+from lambdalabs.instances.instances import Instance
+from lambdalabs.instances.instance_index import InstanceList
+from lambdalabs.launch_journal.launch_journal import (COMMITTED, FAILED, PENDING, IdempotentLauncher, LaunchJournal,
+                                                      LaunchPendingError)
+
+
+class FakeInstancesService:
+    """Creates instances on launch, which are listed only once `visible` is set"""
+
+    def __init__(self, fail_launch: Exception = None, launch_delay: float = 0.0):
+        self.fail_launch = fail_launch
+        self.launch_delay = launch_delay
+        self.visible = True
+        self.instances = []
+        self.launches = 0
+        self.terminated = []
+
+    def launch(self, region_name, instance_type_name, ssh_key_names, file_system_names, quantity, name):
+        self.launches += 1
+        time.sleep(self.launch_delay)
+        ids = [f'{name}-{index}' for index in range(quantity)]
+        self.instances += [Instance(id, {'name': region_name}, None, None, 'booting', ssh_key_names,
+                                    file_system_names, None, None, None, name) for id in ids]
+        if self.fail_launch is not None:
+            raise self.fail_launch
+        return ids
+
+    def get(self):
+        return InstanceList(self.instances if self.visible else [])
+
+    def terminate(self, ids):
+        self.terminated += ids
+
+
+def _launch(launcher, client_token='tok', quantity=1):
+    return launcher.launch('us-tx-1', 'gpu_1x_a100', ['key'], quantity=quantity, name='worker',
+                           client_token=client_token)
+
+
+class TestLaunchJournal:
+
+    def test_reopen(self, tmp_path):
+        path = str(tmp_path / 'journal.jsonl')
+        journal = LaunchJournal(path)
+        journal.append('tok', PENDING, name='worker-tok', instance_ids=None)
+        journal.append('tok', COMMITTED, instance_ids=['i1'])
+        journal.close()
+
+        entry = LaunchJournal(path).get('tok')
+
+        assert entry.status == COMMITTED
+        assert entry.name == 'worker-tok'
+        assert entry.instance_ids == ['i1']
+
+    def test_truncated_last_line_is_dropped(self, tmp_path):
+        path = tmp_path / 'journal.jsonl'
+        journal = LaunchJournal(str(path))
+        journal.append('tok', PENDING, name='worker-tok', instance_ids=None)
+        journal.close()
+        with open(path, 'ab') as journal_file:
+            journal_file.write(b'{"client_token": "tok", "sta')
+
+        journal = LaunchJournal(str(path))
+        journal.append('tok', COMMITTED, instance_ids=['i1'])
+        journal.close()
+
+        assert LaunchJournal(str(path)).get('tok').status == COMMITTED
+        assert len(path.read_bytes().splitlines()) == 2
+
+    def test_corrupt_middle_line_raises(self, tmp_path):
+        path = tmp_path / 'journal.jsonl'
+        path.write_bytes(b'{"client_token": "a", "status": "pending", "timestamp": 1}\n'
+                         b'garbage\n'
+                         b'{"client_token": "b", "status": "pending", "timestamp": 1}\n')
+
+        with pytest.raises(ValueError, match='line 2'):
+            LaunchJournal(str(path))
+
+    def test_compact_keeps_pending(self, tmp_path):
+        path = str(tmp_path / 'journal.jsonl')
+        journal = LaunchJournal(path)
+        journal.append('a', PENDING, name='worker-a', instance_ids=None)
+        journal.append('b', PENDING, name='worker-b', instance_ids=None)
+        journal.append('b', COMMITTED, instance_ids=['i1'])
+
+        journal.compact()
+        journal.close()
+
+        assert [entry.client_token for entry in LaunchJournal(path).entries()] == ['a']
+
+
+class TestIdempotentLauncher:
+
+    def test_retry_returns_first_launch(self, tmp_path):
+        service = FakeInstancesService()
+        launcher = IdempotentLauncher(service, LaunchJournal(str(tmp_path / 'journal.jsonl')))
+
+        first = _launch(launcher, quantity=2)
+        second = _launch(launcher, quantity=2)
+
+        assert first == second == ['worker-tok-0', 'worker-tok-1']
+        assert service.launches == 1
+
+    def test_pending_retry_raises_until_listed(self, tmp_path):
+        service = FakeInstancesService(fail_launch=TimeoutError('read timed out'))
+        service.visible = False
+        launcher = IdempotentLauncher(service, LaunchJournal(str(tmp_path / 'journal.jsonl')))
+        with pytest.raises(TimeoutError):
+            _launch(launcher)
+
+        with pytest.raises(LaunchPendingError):
+            _launch(launcher)
+        service.visible = True
+        instance_ids = _launch(launcher)
+
+        assert instance_ids == ['worker-tok-0']
+        assert service.launches == 1
+
+    def test_recover_leaves_recent_launch_pending(self, tmp_path):
+        service = FakeInstancesService(fail_launch=TimeoutError('read timed out'))
+        service.visible = False
+        journal = LaunchJournal(str(tmp_path / 'journal.jsonl'))
+        launcher = IdempotentLauncher(service, journal)
+        with pytest.raises(TimeoutError):
+            _launch(launcher)
+
+        result = launcher.recover()
+
+        assert result.waiting == ['tok']
+        assert result.missing == []
+        assert journal.get('tok').status == PENDING
+        with pytest.raises(LaunchPendingError):
+            _launch(launcher)
+        assert service.launches == 1
+
+        service.visible = True
+        result = launcher.recover()
+
+        assert result.adopted == {'tok': ['worker-tok-0']}
+        assert journal.get('tok').status == COMMITTED
+
+    def test_recover_fails_launch_after_grace_period(self, tmp_path):
+        service = FakeInstancesService(fail_launch=TimeoutError('read timed out'))
+        service.visible = False
+        journal = LaunchJournal(str(tmp_path / 'journal.jsonl'))
+        launcher = IdempotentLauncher(service, journal)
+        with pytest.raises(TimeoutError):
+            _launch(launcher)
+
+        result = launcher.recover(grace_period=0.0)
+
+        assert result.missing == ['tok']
+        assert journal.get('tok').status == FAILED
+
+        # instances showing up late are adopted by the retry instead of launched again
+        service.visible = True
+        assert _launch(launcher) == ['worker-tok-0']
+        assert service.launches == 1
+
+    def test_recover_terminates_orphans(self, tmp_path):
+        service = FakeInstancesService(fail_launch=TimeoutError('read timed out'))
+        launcher = IdempotentLauncher(service, LaunchJournal(str(tmp_path / 'journal.jsonl')))
+        with pytest.raises(TimeoutError):
+            _launch(launcher, quantity=2)
+
+        result = launcher.recover(adopt=False)
+
+        assert result.terminated == ['worker-tok-0', 'worker-tok-1']
+        assert service.terminated == ['worker-tok-0', 'worker-tok-1']
+
+    def test_concurrent_launches_with_one_token(self, tmp_path):
+        service = FakeInstancesService(launch_delay=0.2)
+        launcher = IdempotentLauncher(service, LaunchJournal(str(tmp_path / 'journal.jsonl')))
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(_launch(launcher))) for _ in range(5)]
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results == [['worker-tok-0']] * 5
+        assert service.launches == 1
+
+    def test_recover_skips_launch_in_flight(self, tmp_path):
+        service = FakeInstancesService(launch_delay=0.5)
+        service.visible = False
+        journal = LaunchJournal(str(tmp_path / 'journal.jsonl'))
+        launcher = IdempotentLauncher(service, journal)
+        thread = threading.Thread(target=_launch, args=(launcher,))
+        thread.start()
+        while journal.get('tok') is None:
+            time.sleep(0.01)
+
+        result = launcher.recover(grace_period=0.0)
+        thread.join()
+
+        assert result.missing == [] and result.waiting == []
+        assert journal.get('tok').status == COMMITTED
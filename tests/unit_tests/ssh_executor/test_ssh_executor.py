@@ -0,0 +1,130 @@
+import stat
+
+import pytest
+
+from lambdalabs.instances.instances import Instance
+from lambdalabs.instances.instance_index import InstanceList
+from lambdalabs.ssh_executor.ssh_executor import SSHExecutor
+
+
+# runs the remote command locally, with the host in $SSH_HOST
+FAKE_SSH = '''#!/bin/sh
+for arg; do host=$command; command=$arg; done
+case "$*" in *"-O exit"*) exit 0;; esac
+SSH_HOST=${host#*@} exec sh -c "$command"
+'''
+
+# copies to the remote path locally
+FAKE_SCP = '''#!/bin/sh
+for arg; do source=$destination; destination=$arg; done
+exec cp -r "$source" "${destination#*:}"
+'''
+
+
+def _instance(id: str, ip: str, status: str = 'active') -> Instance:
+    return Instance(id, {'name': 'us-tx-1'}, ip, None, status, ['key'], [], None, None, None)
+
+
+def _script(path, content: str) -> str:
+    path.write_text(content)
+    path.chmod(path.stat().st_mode | stat.S_IXUSR)
+    return str(path)
+
+
+class FakeInstancesService:
+    def __init__(self, instances):
+        self.instances = instances
+        self.calls = 0
+
+    def get(self):
+        self.calls += 1
+        return InstanceList(self.instances)
+
+
+@pytest.fixture
+def executor_factory(tmp_path):
+    ssh_command = _script(tmp_path / 'ssh', FAKE_SSH)
+    scp_command = _script(tmp_path / 'scp', FAKE_SCP)
+    executors = []
+
+    def factory(**kwargs):
+        executor = SSHExecutor(ssh_command=ssh_command, scp_command=scp_command, **kwargs)
+        executors.append(executor)
+        return executor
+
+    yield factory
+    for executor in executors:
+        executor.close()
+
+
+class TestSSHExecutor:
+
+    def test_run_on_every_instance(self, executor_factory):
+        # arrange
+        lines = []
+        executor = executor_factory(on_output=lambda host, stream, line: lines.append((host, stream, line)))
+        instances = [_instance('i1', '10.0.0.1'), _instance('i2', '10.0.0.2')]
+
+        # act
+        results = executor.run(instances, 'echo "hello $SSH_HOST"; echo oops >&2')
+
+        # assert
+        assert [result.instance_id for result in results] == ['i1', 'i2']
+        assert all(result.ok for result in results)
+        assert results[0].stdout == 'hello 10.0.0.1\n'
+        assert results[1].stderr == 'oops\n'
+        assert ('10.0.0.2', 'stdout', 'hello 10.0.0.2') in lines
+        assert ('10.0.0.1', 'stderr', 'oops') in lines
+
+    def test_run_exit_code(self, executor_factory):
+        executor = executor_factory()
+
+        result, = executor.run([_instance('i1', '10.0.0.1')], 'exit 3')
+
+        assert result.exit_code == 3
+        assert not result.ok
+        assert not result.timed_out
+
+    def test_run_timeout(self, executor_factory):
+        executor = executor_factory(timeout=0.5)
+
+        result, = executor.run([_instance('i1', '10.0.0.1')], 'sleep 10')
+
+        assert result.timed_out
+        assert result.exit_code is None
+        assert result.duration < 5
+
+    def test_run_instance_without_ip(self, executor_factory):
+        executor = executor_factory()
+
+        booting, active = executor.run([_instance('i1', None, 'booting'), _instance('i2', '10.0.0.2')], 'true')
+
+        assert booting.exit_code == 255
+        assert 'no ip address' in booting.stderr
+        assert active.ok
+
+    def test_run_resolves_ids_with_one_call(self, executor_factory):
+        service = FakeInstancesService([_instance('i1', '10.0.0.1'), _instance('i2', '10.0.0.2')])
+        executor = executor_factory(instances_service=service)
+
+        results = executor.run(['i2', 'i1'], 'echo $SSH_HOST')
+
+        assert [result.stdout for result in results] == ['10.0.0.2\n', '10.0.0.1\n']
+        assert service.calls == 1
+
+    def test_run_unknown_id(self, executor_factory):
+        executor = executor_factory(instances_service=FakeInstancesService([]))
+
+        with pytest.raises(ValueError):
+            executor.run(['i1'], 'true')
+
+    def test_copy(self, executor_factory, tmp_path):
+        executor = executor_factory()
+        source = tmp_path / 'source.txt'
+        source.write_text('data')
+        destination = tmp_path / 'destination.txt'
+
+        result, = executor.copy([_instance('i1', '10.0.0.1')], str(source), str(destination))
+
+        assert result.ok
+        assert destination.read_text() == 'data'
@@ -0,0 +1,121 @@
+import base64
+import json
+import struct
+import threading
+
+from lambdalabs import LambdaLabsClient
+from lambdalabs.http_client.transport import Transport, build_response
+from lambdalabs.ssh_keys.ssh_keys import public_key_fingerprint
+
+
+def _public_key(seed: bytes, comment: str) -> str:
+    blob = b''.join(struct.pack('>I', len(part)) + part for part in (b'ssh-ed25519', seed * 32))
+    return f"ssh-ed25519 {base64.b64encode(blob).decode('ascii')} {comment}"
+
+
+ALICE = _public_key(b'a', 'alice')
+BOB = _public_key(b'b', 'bob')
+
+
+class FakeSSHKeysTransport(Transport):
+    """Keeps the ssh-keys of an account in memory, failing POSTs of the names in `fail_add`"""
+
+    def __init__(self, keys, fail_add=()):
+        self.keys = {f'k-{name}': {'id': f'k-{name}', 'name': name, 'public_key': public_key}
+                     for name, public_key in keys.items()}
+        self.fail_add = set(fail_add)
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def send(self, method, url, headers, **kwargs):
+        path = url.split('/api/v1', 1)[1]
+        with self._lock:
+            self.requests.append(f'{method} {path}')
+            if method == 'GET':
+                return self._response(200, {'data': list(self.keys.values())})
+            if method == 'DELETE':
+                del self.keys[path.rsplit('/', 1)[1]]
+                return self._response(200, {})
+            name = kwargs['json']['name']
+            if name in self.fail_add:
+                return self._response(400, {'code': 'ssh-key/invalid', 'message': 'rejected'})
+            key = {'id': f'k-{name}', 'name': name, 'public_key': kwargs['json'].get('public_key', 'generated')}
+            self.keys[key['id']] = key
+            return self._response(200, {'data': dict(key, private_key='secret')})
+
+    def _response(self, status_code, body):
+        return build_response(status_code, {}, json.dumps(body).encode('utf-8'), '')
+
+    def names(self):
+        return sorted((key['name'], key['public_key']) for key in self.keys.values())
+
+
+def _sync(keys, desired, fail_add=(), **kwargs):
+    transport = FakeSSHKeysTransport(keys, fail_add)
+    client = LambdaLabsClient('key', base_url='https://api/api/v1', transport=transport)
+    results = client.ssh_keys.sync(desired, **kwargs)
+    return {result.name: result for result in results}, transport
+
+
+class TestSSHKeysSync:
+
+    def test_add_replace_delete_unchanged(self):
+        results, transport = _sync({'alice': ALICE, 'bob': ALICE, 'carol': BOB},
+                                   {'alice': ALICE, 'bob': BOB, 'dave': 'ssh-rsa AAAAB3NzaC1yc2E dave'})
+
+        assert {name: result.action for name, result in results.items()} == {
+            'alice': 'unchanged', 'bob': 'replace', 'dave': 'add', 'carol': 'delete'}
+        assert all(result.ok for result in results.values())
+        assert transport.names() == [('alice', ALICE), ('bob', BOB), ('dave', 'ssh-rsa AAAAB3NzaC1yc2E dave')]
+
+    def test_dry_run(self):
+        results, transport = _sync({'alice': ALICE}, {'bob': BOB}, dry_run=True)
+
+        assert {name: result.action for name, result in results.items()} == {'bob': 'add', 'alice': 'delete'}
+        assert transport.requests == ['GET /ssh-keys']
+
+    def test_same_key_under_another_name_is_renamed(self):
+        results, transport = _sync({'old': ALICE}, {'alice': ALICE})
+
+        assert list(results) == ['alice']
+        assert results['alice'].action == 'rename'
+        assert results['alice'].deleted
+        assert transport.names() == [('alice', ALICE)]
+
+    def test_same_key_under_another_name_kept_without_delete_extra(self):
+        results, transport = _sync({'old': ALICE}, {'alice': ALICE}, delete_extra=False)
+
+        assert results['alice'].action == 'add'
+        assert transport.names() == [('alice', ALICE), ('old', ALICE)]
+
+    def test_none_keeps_the_existing_key(self):
+        results, transport = _sync({'ci': ALICE}, {'ci': None, 'deploy': None})
+
+        assert results['ci'].action == 'unchanged'
+        assert results['deploy'].action == 'add'
+        assert results['deploy'].ssh_key.private_key == 'secret'
+        assert transport.requests.count('DELETE /ssh-keys/k-ci') == 0
+
+        results, transport = _sync(dict(transport.names()), {'ci': None, 'deploy': None})
+
+        assert {result.action for result in results.values()} == {'unchanged'}
+
+    def test_failed_replace_reports_the_deleted_key(self):
+        results, transport = _sync({'bob': ALICE}, {'bob': BOB}, fail_add={'bob'})
+
+        result = results['bob']
+        assert result.action == 'replace'
+        assert not result.ok
+        assert result.deleted
+        assert result.ssh_key.public_key == ALICE
+        assert transport.names() == []
+
+    def test_failed_add_deletes_nothing(self):
+        results, transport = _sync({}, {'bob': BOB}, fail_add={'bob'})
+
+        assert not results['bob'].ok
+        assert not results['bob'].deleted
+
+    def test_fingerprint(self):
+        assert public_key_fingerprint(ALICE) == public_key_fingerprint(ALICE.rsplit(' ', 1)[0] + ' other comment')
+        assert public_key_fingerprint(ALICE) != public_key_fingerprint(BOB)
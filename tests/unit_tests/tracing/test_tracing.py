@@ -0,0 +1,118 @@
+import json
+import threading
+
+import pytest
+import requests
+
+from lambdalabs import LambdaLabsClient
+from lambdalabs.exceptions import APIException
+from lambdalabs.http_client.transport import Transport, build_response
+from lambdalabs.tracing.tracing import InMemoryTracer
+
+
+INSTANCE = {'id': 'i1', 'name': 'worker', 'ip': '10.0.0.1', 'status': 'active', 'hostname': None,
+            'region': {'name': 'us-tx-1', 'description': 'Austin, Texas'},
+            'instance_type': {'name': 'gpu_1x_a100', 'price_cents_per_hour': 110, 'description': '1x A100 (40 GB)',
+                              'specs': {'vcpus': 30, 'memory_gib': 200, 'storage_gib': 512}},
+            'ssh_key_names': ['key'], 'file_system_names': [], 'jupyter_token': None, 'jupyter_url': None}
+
+
+class FakeTransport(Transport):
+    """Answers with the (status code, body) or exception registered for the method and path"""
+
+    def __init__(self, routes):
+        self.routes = routes
+
+    def send(self, method, url, headers, **kwargs):
+        path = url.split('/api/v1', 1)[1]
+        outcome = self.routes[f'{method} {path}']
+        if isinstance(outcome, Exception):
+            raise outcome
+        status_code, body = outcome
+        return build_response(status_code, {}, json.dumps(body).encode('utf-8'), url)
+
+
+def _client(routes):
+    tracer = InMemoryTracer()
+    return LambdaLabsClient('key', base_url='https://api/api/v1', transport=FakeTransport(routes), tracer=tracer), tracer
+
+
+def _children(tracer, parent):
+    return [span.name for span in tracer.spans if span.parent is parent]
+
+
+class TestTracing:
+
+    def test_service_span_tree(self):
+        body = {'data': [INSTANCE, dict(INSTANCE, id='i2')]}
+        client, tracer = _client({'GET /instances': (200, body)})
+
+        client.instances.get()
+
+        service, = [span for span in tracer.spans if span.parent is None]
+        assert service.name == 'InstancesService.get'
+        assert _children(tracer, service) == ['http.send', 'http.download', 'json.decode', 'model.build']
+        spans = {span.name: span for span in tracer.spans}
+        assert spans['http.send'].attributes['http.status_code'] == 200
+        assert spans['http.send'].attributes['http.method'] == 'GET'
+        assert spans['http.download'].attributes['bytes'] == len(json.dumps(body))
+        assert spans['json.decode'].attributes['bytes'] == len(json.dumps(body))
+        assert spans['model.build'].attributes['item_count'] == 2
+        assert all(span.duration is not None for span in tracer.spans)
+
+    def test_error_response(self):
+        client, tracer = _client({'GET /instances': (500, {'code': 'global/unknown', 'message': 'boom'})})
+
+        with pytest.raises(APIException):
+            client.instances.get()
+
+        spans = {span.name: span for span in tracer.spans}
+        assert spans['InstancesService.get'].attributes['error'] == 'APIException'
+        assert spans['http.send'].attributes['http.status_code'] == 500
+        assert 'error' not in spans['http.send'].attributes
+
+    def test_connection_error(self):
+        client, tracer = _client({'GET /instances': requests.exceptions.ConnectionError('refused')})
+
+        with pytest.raises(requests.exceptions.ConnectionError):
+            client.instances.get()
+
+        spans = {span.name: span for span in tracer.spans}
+        assert spans['http.send'].attributes['error'] == 'ConnectionError'
+        assert spans['http.send'].parent is spans['InstancesService.get']
+        assert spans['InstancesService.get'].attributes['error'] == 'ConnectionError'
+
+    def test_sync_workers_continue_the_sync_span(self):
+        public_key = 'ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAIDWZ4b1+AAAA new'
+        client, tracer = _client({
+            'GET /ssh-keys': (200, {'data': [{'id': 'k1', 'name': 'old', 'public_key': public_key}]}),
+            'POST /ssh-keys': (200, {'data': {'id': 'k2', 'name': 'new', 'public_key': public_key}}),
+            'DELETE /ssh-keys/k1': (200, {}),
+        })
+
+        client.ssh_keys.sync({'new': public_key})
+
+        sync, = [span for span in tracer.spans if span.parent is None]
+        assert sync.name == 'SSHKeysService.sync'
+        assert sorted(_children(tracer, sync)) == ['SSHKeysService.add', 'SSHKeysService.delete',
+                                                   'SSHKeysService.get']
+
+    def test_activate_restores_the_previous_context(self):
+        tracer = InMemoryTracer()
+        with tracer.span('outer') as outer:
+            context = tracer.context()
+        spans = []
+
+        def worker():
+            with tracer.activate(context):
+                with tracer.span('inner') as inner:
+                    spans.append(inner)
+            spans.append(tracer.context())
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+
+        inner, after = spans
+        assert inner.parent is outer
+        assert after is None
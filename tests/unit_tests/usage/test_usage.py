@@ -0,0 +1,149 @@
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+from lambdalabs.instance_types.instance_types import InstanceType
+from lambdalabs.instances.instances import Instance
+from lambdalabs.usage import usage
+from lambdalabs.usage.usage import Transition, UsageLog, UsageTracker
+
+
+def _timestamp(*date) -> float:
+    return datetime(*date, tzinfo=timezone.utc).timestamp()
+
+
+def _instance(id: str, status: str = 'active', price_cents_per_hour: int = 100) -> Instance:
+    instance_type = InstanceType('gpu_1x_a100', price_cents_per_hour, '1x A100', 30, 200, 512, [])
+    return Instance(id, {'name': 'us-tx-1'}, '10.0.0.1', instance_type, status, ['key'], [], None, None, None,
+                    f'worker-{id}')
+
+
+def _fields(transition: Transition) -> tuple:
+    return (transition.timestamp, transition.instance_id, transition.status, transition.instance_type,
+            transition.region, transition.name, transition.price_cents_per_hour)
+
+
+class TestUsageLog:
+
+    def test_round_trip(self, tmp_path):
+        log = UsageLog(str(tmp_path / 'usage.log'))
+        transitions = [Transition(1.5, 'i1', 'booting', 'gpu_1x_a100', 'us-tx-1', 'worker', 110),
+                       Transition(2.5, 'i1', 'active', 'gpu_1x_a100', 'us-tx-1', 'worker', 110),
+                       Transition(3.5, 'i2', 'active', None, 'us-tx-1', None, 0)]
+
+        log.append(transitions[:2])
+        log.append(transitions[2:])
+        read = list(log.read())
+
+        assert [_fields(transition) for transition, _ in read] == [_fields(transition) for transition in transitions]
+        assert read[-1][1] == log.size()
+        assert log.strings == ['i1', 'booting', 'gpu_1x_a100', 'us-tx-1', 'worker', 'active', 'i2', '']
+
+    def test_read_after_offset(self, tmp_path):
+        log = UsageLog(str(tmp_path / 'usage.log'))
+        log.append([Transition(1.0, 'i1', 'active', 'gpu_1x_a100', 'us-tx-1', 'worker', 110)])
+        offset = log.size()
+        strings = list(log.strings)
+        log.append([Transition(2.0, 'i1', 'terminated', 'gpu_1x_a100', 'us-tx-1', 'worker', 110)])
+
+        (transition, _), = log.read(offset, strings)
+
+        assert transition.status == 'terminated'
+        assert transition.instance_id == 'i1'
+
+    def test_truncated_tail_ends_read(self, tmp_path):
+        path = tmp_path / 'usage.log'
+        log = UsageLog(str(path))
+        log.append([Transition(1.0, 'i1', 'active', 'gpu_1x_a100', 'us-tx-1', 'worker', 110)])
+        complete_size = log.size()
+        log.append([Transition(2.0, 'i2', 'active', 'gpu_1x_a100', 'us-tx-1', 'worker', 110)])
+        log.close()
+        with open(path, 'r+b') as log_file:
+            log_file.truncate(os.path.getsize(path) - 3)
+
+        read = list(UsageLog(str(path)).read())
+
+        assert [transition.instance_id for transition, _ in read] == ['i1']
+        assert read[-1][1] == complete_size
+
+    def test_corrupt_record_raises(self, tmp_path):
+        path = tmp_path / 'usage.log'
+        path.write_bytes(b'X' * 40)
+
+        with pytest.raises(ValueError):
+            list(UsageLog(str(path)).read())
+
+    def test_failed_append_keeps_string_table(self, tmp_path, monkeypatch):
+        log = UsageLog(str(tmp_path / 'usage.log'))
+        log.append([Transition(1.0, 'i1', 'active', 'gpu_1x_a100', 'us-tx-1', 'worker', 110)])
+        size = log.size()
+
+        def fsync(fd):
+            raise OSError(28, 'No space left on device')
+
+        with monkeypatch.context() as patch:
+            patch.setattr(usage.os, 'fsync', fsync)
+            with pytest.raises(OSError):
+                log.append([Transition(2.0, 'i2', 'booting', 'gpu_1x_a100', 'us-tx-1', 'other', 110)])
+        log.append([Transition(3.0, 'i3', 'booting', 'gpu_1x_a100', 'us-tx-1', 'worker', 110)])
+
+        assert log.size() > size
+        assert [(transition.instance_id, transition.status) for transition, _ in log.read()] == [
+            ('i1', 'active'), ('i3', 'booting')]
+
+
+class TestUsageTracker:
+
+    def test_cost_across_month_boundary(self, tmp_path):
+        tracker = UsageTracker(str(tmp_path / 'usage.log'))
+
+        tracker.record([_instance('i1')], timestamp=_timestamp(2023, 1, 31, 23))
+        tracker.record([], timestamp=_timestamp(2023, 2, 1, 1))
+
+        assert tracker.cost(month='2023-01') == {'i1': pytest.approx(100.0)}
+        assert tracker.cost(month='2023-02') == {'i1': pytest.approx(100.0)}
+        assert tracker.cost(group_by=None) == {'total': pytest.approx(200.0)}
+        assert tracker.burn_rate() == {}
+
+    def test_running_instance_accrues_until_now(self, tmp_path):
+        tracker = UsageTracker(str(tmp_path / 'usage.log'))
+
+        tracker.record([_instance('i1', price_cents_per_hour=60)], timestamp=_timestamp(2023, 3, 1))
+
+        assert tracker.cost(now=_timestamp(2023, 3, 1, 2)) == {'i1': pytest.approx(120.0)}
+        assert tracker.burn_rate() == {'gpu_1x_a100': 60}
+
+    def test_replay_with_and_without_rollup(self, tmp_path):
+        path = str(tmp_path / 'usage.log')
+        tracker = UsageTracker(path, checkpoint_every=2)
+        tracker.record([_instance('i1'), _instance('i2', 'booting')], timestamp=_timestamp(2023, 4, 1))
+        tracker.record([_instance('i1'), _instance('i2')], timestamp=_timestamp(2023, 4, 1, 1))
+        tracker.record([_instance('i2')], timestamp=_timestamp(2023, 4, 1, 2))
+        now = _timestamp(2023, 4, 1, 3)
+        expected = tracker.cost(now=now)
+        tracker.close()
+
+        from_rollup = UsageTracker(path)
+        assert from_rollup.cost(now=now) == pytest.approx(expected)
+        from_rollup.close()
+
+        os.remove(path + '.rollup')
+        replayed = UsageTracker(path)
+        assert replayed.cost(now=now) == pytest.approx(expected)
+        assert expected == pytest.approx({'i1': 200.0, 'i2': 300.0})
+
+    def test_truncated_tail_is_cut_off(self, tmp_path):
+        path = str(tmp_path / 'usage.log')
+        tracker = UsageTracker(path)
+        tracker.record([_instance('i1')], timestamp=_timestamp(2023, 5, 1))
+        tracker._log.close()
+        complete_size = os.path.getsize(path)
+        with open(path, 'ab') as log_file:
+            log_file.write(b'T\x00\x01')
+
+        reopened = UsageTracker(path)
+        reopened.record([], timestamp=_timestamp(2023, 5, 1, 1))
+
+        assert os.path.getsize(path) > complete_size
+        assert [transition.status for transition in reopened.transitions()] == ['active', 'terminated']